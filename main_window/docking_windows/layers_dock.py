@@ -675,11 +675,7 @@ class LayersDock(QDockWidget):
         """Refresh layer order from current canvas z-values (top row = highest z)."""
         if not self.current_canvas or not hasattr(self.current_canvas, 'scene'):
             return
-        canvas_objects = [
-            item for item in self.current_canvas.scene.items()
-            if isinstance(item, BaseGraphicObject)
-        ]
-        self._rebuild_layers_from_canvas_objects(canvas_objects)
+        self._rebuild_layers_from_canvas_objects(self.current_canvas.graphic_items())
 
     def _on_undo_stack_index_changed(self, _index):
         """Keep layers tree synchronized after undo/redo and z-order commands."""
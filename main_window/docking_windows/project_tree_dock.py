@@ -1,7 +1,6 @@
 # main_window\docking_windows\project_tree_dock.py
 import copy
-import json
-import csv
+import os
 from PySide6.QtWidgets import QDockWidget, QTreeWidgetItem, QMenu, QDialog, QMessageBox, QFileDialog
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QKeySequence
@@ -21,6 +20,7 @@ from ..dialogs.project_tree.image_dialog import ImageDialog
 from ..dialogs.project_tree.animation_dialog import AnimationDialog
 from project.comment.comment_table import CommentTable
 from project.tag.tag_table import TagTable
+from services.batch_jobs import BatchJobThread, batch_file_path, read_import_file, write_export_file
 
 
 class ProjectTreeDock(QDockWidget):
@@ -40,6 +40,9 @@ class ProjectTreeDock(QDockWidget):
         self.comment_service = comment_service
         self.setObjectName("project_tree")
         self._clipboard = None
+        self._batch_job = None
+        self._batch_label = None
+        self._batch_files = []
 
         self.tree_widget = CustomTreeWidget()
         self.setWidget(self.tree_widget)
@@ -167,6 +170,13 @@ class ProjectTreeDock(QDockWidget):
             paste_action.triggered.connect(lambda: self.paste_item(item))
             import_action = menu.addAction(IconService.get_icon('common-import'), "Import")
             import_action.triggered.connect(self.import_tags)
+            export_action = menu.addAction(IconService.get_icon('common-export'), "Export")
+            export_action.triggered.connect(self.export_tags)
+            if self.is_batch_job_running():
+                import_action.setEnabled(False)
+                export_action.setEnabled(False)
+                cancel_action = menu.addAction(f"Cancel {self._batch_label}")
+                cancel_action.triggered.connect(self.cancel_batch_job)
         elif parent == self.tag_item:
             open_action = menu.addAction(IconService.get_icon('screen-open'), "Open")
             open_action.triggered.connect(lambda: self.open_tag(item))
@@ -193,6 +203,13 @@ class ProjectTreeDock(QDockWidget):
             paste_action.triggered.connect(lambda: self.paste_item(item))
             import_action = menu.addAction(IconService.get_icon('common-import'), "Import")
             import_action.triggered.connect(self.import_comments)
+            export_action = menu.addAction(IconService.get_icon('common-export'), "Export")
+            export_action.triggered.connect(self.export_comments)
+            if self.is_batch_job_running():
+                import_action.setEnabled(False)
+                export_action.setEnabled(False)
+                cancel_action = menu.addAction(f"Cancel {self._batch_label}")
+                cancel_action.triggered.connect(self.cancel_batch_job)
         elif parent == self.comment_item:
             open_action = menu.addAction(IconService.get_icon('screen-open'), "Open")
             open_action.triggered.connect(lambda: self.open_comment(item))
@@ -258,7 +275,7 @@ class ProjectTreeDock(QDockWidget):
             if comment_data:
                 # Add to service first
                 self.comment_service.add_comment(comment_data)
-                self.main_window.project_modified()
+                self.main_window.project_modified('comments', comment_data.get('number'))
 
                 # Add item to tree
                 comment_text = f"{comment_data['number']} - {comment_data['name']}"
@@ -290,7 +307,7 @@ class ProjectTreeDock(QDockWidget):
                     self.main_window.project_service.project_data['tag_lists'] = {}
                 
                 self.main_window.project_service.project_data['tag_lists'][str(tag_data['number'])] = tag_data
-                self.main_window.project_modified()
+                self.main_window.project_modified('tag_lists', tag_data['number'])
                 
                 # Add item to tree
                 tag_text = f"{tag_data['number']} - {tag_data['name']}"
@@ -342,6 +359,10 @@ class ProjectTreeDock(QDockWidget):
         if item_type:
             self._clipboard = copy.deepcopy(data)
             self._clipboard['type'] = item_type
+            if item_type == 'tag':
+                tags = self.main_window.project_service.load_entry_payload('tag_lists', data.get('number'))
+                if tags is not None:
+                    self._clipboard['tags'] = copy.deepcopy(tags)
             # For comments, also copy the table data
             if item_type == 'comment':
                 comment_number = data.get('number')
@@ -369,7 +390,7 @@ class ProjectTreeDock(QDockWidget):
             if 'tag_lists' not in self.main_window.project_service.project_data:
                  self.main_window.project_service.project_data['tag_lists'] = {}
             self.main_window.project_service.project_data['tag_lists'][str(new_number)] = pasted_data
-            self.main_window.project_modified()
+            self.main_window.project_modified('tag_lists', new_number)
 
             tag_text = f"{pasted_data['number']} - {pasted_data['name']}"
             new_item = QTreeWidgetItem(self.tag_item, [tag_text])
@@ -390,7 +411,7 @@ class ProjectTreeDock(QDockWidget):
             # If table_data was copied, update it for the new comment
             if 'table_data' in self._clipboard:
                 self.comment_service.update_table_data(new_number, self._clipboard['table_data'])
-            self.main_window.project_modified()
+            self.main_window.project_modified('comments', new_number)
 
             comment_text = f"{pasted_data['number']} - {pasted_data['name']}"
             new_item = QTreeWidgetItem(self.comment_item, [comment_text])
@@ -412,12 +433,13 @@ class ProjectTreeDock(QDockWidget):
         if dialog.exec():
             updated_data = dialog.get_tag_data()
             # Preserve existing tags rows
-            updated_data['tags'] = tag_data.get('tags', [])
+            tags = self.main_window.project_service.load_entry_payload('tag_lists', current_number)
+            updated_data['tags'] = tags if tags is not None else tag_data.get('tags', [])
             updated_data['number'] = current_number # Keep original number
             
             # Update Service
             self.main_window.project_service.project_data['tag_lists'][str(current_number)] = updated_data
-            self.main_window.project_modified()
+            self.main_window.project_modified('tag_lists', current_number)
 
             item.setData(0, Qt.ItemDataRole.UserRole, updated_data)
             item.setText(0, f"{updated_data['number']} - {updated_data['name']}")
@@ -443,7 +465,7 @@ class ProjectTreeDock(QDockWidget):
             item.setText(0, f"{updated_data['number']} - {updated_data['name']}")
             
             self.comment_service.update_comment_metadata(updated_data)
-            self.main_window.project_modified()
+            self.main_window.project_modified('comments', current_number)
             
             self.main_window.close_comment_tab_by_number(current_number)
             self.main_window.open_comment_table(updated_data)
@@ -474,12 +496,12 @@ class ProjectTreeDock(QDockWidget):
                 if 'tag_lists' in self.main_window.project_service.project_data:
                      if str(item_number) in self.main_window.project_service.project_data['tag_lists']:
                          del self.main_window.project_service.project_data['tag_lists'][str(item_number)]
-                         self.main_window.project_modified()
+                         self.main_window.project_modified('tag_lists', item_number)
 
             elif parent == self.comment_item:
                 self.main_window.close_comment_tab_by_number(item_number)
                 self.comment_service.remove_comment(item_number)
-                self.main_window.project_modified()
+                self.main_window.project_modified('comments', item_number)
             
     def open_dialog(self, dialog_class):
         dialog = dialog_class(self)
@@ -490,37 +512,25 @@ class ProjectTreeDock(QDockWidget):
         print("Paste Tag action triggered.")
 
     def import_tags(self):
-        """Import tags from a JSON or CSV file."""
-        file_path, _ = QFileDialog.getOpenFileName(
+        """Import tags from JSON or CSV files, reading the files in parallel."""
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self, "Import Tags", "", 
             "Tag Files (*.json *.csv);;JSON Files (*.json);;CSV Files (*.csv);;All Files (*)"
         )
-        if not file_path:
+        if not file_paths:
             return
-        
+        if any(not path.endswith(('.json', '.csv')) for path in file_paths):
+            QMessageBox.warning(self, "Import Error", "Unsupported file format.")
+            return
+
+        self._start_batch_job(
+            read_import_file, [(path, 'tags') for path in file_paths],
+            "Importing tags", self._finish_tag_import,
+        )
+
+    def _finish_tag_import(self, results, errors):
+        tags_list = [tag_data for entries in results if entries for tag_data in entries]
         try:
-            if file_path.endswith('.json'):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    imported_data = json.load(f)
-                    if isinstance(imported_data, list):
-                        tags_list = imported_data
-                    elif isinstance(imported_data, dict) and 'tags' in imported_data:
-                        tags_list = imported_data['tags']
-                    else:
-                        tags_list = [imported_data]
-            elif file_path.endswith('.csv'):
-                tags_list = []
-                with open(file_path, 'r', encoding='utf-8', newline='') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        # Convert number to int if present
-                        if 'number' in row:
-                            row['number'] = int(row['number'])
-                        tags_list.append(row)
-            else:
-                QMessageBox.warning(self, "Import Error", "Unsupported file format.")
-                return
-            
             existing_numbers = self.get_existing_tag_numbers()
             imported_count = 0
             
@@ -549,14 +559,17 @@ class ProjectTreeDock(QDockWidget):
                 imported_count += 1
             
             self.tag_item.setExpanded(True)
-            self.main_window.project_modified()
-            QMessageBox.information(self, "Import Complete", f"Successfully imported {imported_count} tag(s).")
+            if imported_count:
+                self.main_window.project_modified('tag_lists')
+            self.main_window.status_message_label.setText(f"Imported {imported_count} tag list(s)")
+            if errors:
+                self._show_batch_errors("Import Error", "Failed to import", errors, self._batch_files)
             
         except Exception as e:
             QMessageBox.warning(self, "Import Error", f"Failed to import tags: {str(e)}")
 
     def export_tags(self):
-        """Export tags to a JSON or CSV file."""
+        """Export each tag list to its own JSON or CSV file, in parallel."""
         file_path, selected_filter = QFileDialog.getSaveFileName(
             self, "Export Tags", "", 
             "JSON Files (*.json);;CSV Files (*.csv);;All Files (*)"
@@ -564,66 +577,53 @@ class ProjectTreeDock(QDockWidget):
         if not file_path:
             return
         
-        try:
-            # Collect all tags
-            tags_list = []
-            for i in range(self.tag_item.childCount()):
-                child = self.tag_item.child(i)
-                tag_data = child.data(0, Qt.ItemDataRole.UserRole)
-                if tag_data:
-                    tags_list.append(tag_data)
-            
-            if not tags_list:
-                QMessageBox.warning(self, "Export Error", "No tags to export.")
-                return
-            
-            if file_path.endswith('.csv') or 'CSV' in selected_filter:
-                if not file_path.endswith('.csv'):
-                    file_path += '.csv'
-                # Get all unique keys for CSV header
-                all_keys = set()
-                for tag in tags_list:
-                    all_keys.update(tag.keys())
-                all_keys = sorted(list(all_keys))
-                
-                with open(file_path, 'w', encoding='utf-8', newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=all_keys)
-                    writer.writeheader()
-                    writer.writerows(tags_list)
-            else:
-                if not file_path.endswith('.json'):
-                    file_path += '.json'
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump({'tags': tags_list}, f, indent=2, ensure_ascii=False)
-            
-            QMessageBox.information(self, "Export Complete", f"Successfully exported {len(tags_list)} tag(s).")
-            
-        except Exception as e:
-            QMessageBox.warning(self, "Export Error", f"Failed to export tags: {str(e)}")
+        file_format = 'csv' if file_path.endswith('.csv') or 'CSV' in selected_filter else 'json'
+        if not file_path.endswith('.' + file_format):
+            file_path += '.' + file_format
+
+        project_service = self.main_window.project_service
+        tasks = []
+        for i in range(self.tag_item.childCount()):
+            child = self.tag_item.child(i)
+            tag_data = child.data(0, Qt.ItemDataRole.UserRole)
+            if tag_data:
+                number = tag_data.get('number')
+                source = project_service.deferred_payload_source('tag_lists', number)
+                if source is None:
+                    tags = project_service.load_entry_payload('tag_lists', number)
+                    if tags is not None:
+                        tag_data = dict(tag_data, tags=tags)
+                tasks.append((batch_file_path(file_path, number), 'tags', dict(tag_data),
+                              'tags', source, file_format))
+
+        if not tasks:
+            QMessageBox.warning(self, "Export Error", "No tags to export.")
+            return
+
+        self._start_batch_job(write_export_file, tasks, "Exporting tags",
+                              lambda results, errors: self._finish_export("tag list", results, errors))
 
     def paste_comment(self):
         # Placeholder for future implementation
         print("Paste Comment action triggered.")
 
     def import_comments(self):
-        """Import comments from a JSON file."""
-        file_path, _ = QFileDialog.getOpenFileName(
+        """Import comments from JSON files, reading the files in parallel."""
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self, "Import Comments", "", 
             "JSON Files (*.json);;All Files (*)"
         )
-        if not file_path:
+        if not file_paths:
             return
-        
+
+        self._start_batch_job(
+            read_import_file, [(path, 'comments') for path in file_paths],
+            "Importing comments", self._finish_comment_import,
+        )
+
+    def _finish_comment_import(self, results, errors):
+        comments_list = [comment_data for entries in results if entries for comment_data in entries]
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                imported_data = json.load(f)
-                if isinstance(imported_data, list):
-                    comments_list = imported_data
-                elif isinstance(imported_data, dict) and 'comments' in imported_data:
-                    comments_list = imported_data['comments']
-                else:
-                    comments_list = [imported_data]
-            
             existing_numbers = self.get_existing_comment_numbers()
             imported_count = 0
             
@@ -653,14 +653,17 @@ class ProjectTreeDock(QDockWidget):
                 imported_count += 1
             
             self.comment_item.setExpanded(True)
-            self.main_window.project_modified()
-            QMessageBox.information(self, "Import Complete", f"Successfully imported {imported_count} comment(s).")
+            if imported_count:
+                self.main_window.project_modified('comments')
+            self.main_window.status_message_label.setText(f"Imported {imported_count} comment(s)")
+            if errors:
+                self._show_batch_errors("Import Error", "Failed to import", errors, self._batch_files)
             
         except Exception as e:
             QMessageBox.warning(self, "Import Error", f"Failed to import comments: {str(e)}")
 
     def export_comments(self):
-        """Export comments to a JSON file."""
+        """Export each comment table to its own JSON file, in parallel."""
         file_path, _ = QFileDialog.getSaveFileName(
             self, "Export Comments", "", 
             "JSON Files (*.json);;All Files (*)"
@@ -668,31 +671,85 @@ class ProjectTreeDock(QDockWidget):
         if not file_path:
             return
         
-        try:
-            # Collect all comments with their table data
-            comments_list = []
-            for i in range(self.comment_item.childCount()):
-                child = self.comment_item.child(i)
-                comment_data = child.data(0, Qt.ItemDataRole.UserRole)
-                if comment_data:
-                    export_data = copy.deepcopy(comment_data)
+        if not file_path.endswith('.json'):
+            file_path += '.json'
+
+        # Tables still in the project file are read by the workers
+        project_service = self.main_window.project_service
+        tasks = []
+        for i in range(self.comment_item.childCount()):
+            child = self.comment_item.child(i)
+            comment_data = child.data(0, Qt.ItemDataRole.UserRole)
+            if comment_data:
+                number = comment_data.get('number')
+                export_data = copy.deepcopy(comment_data)
+                source = project_service.deferred_payload_source('comments', number)
+                if source is None:
                     # Include table data from service
-                    table_data = self.comment_service.get_table_data(comment_data.get('number'))
+                    table_data = self.comment_service.get_table_data(number)
                     if table_data:
                         export_data['table_data'] = table_data
-                    comments_list.append(export_data)
-            
-            if not comments_list:
-                QMessageBox.warning(self, "Export Error", "No comments to export.")
+                tasks.append((batch_file_path(file_path, number), 'comments', export_data,
+                              'table_data', source, 'json'))
+
+        if not tasks:
+            QMessageBox.warning(self, "Export Error", "No comments to export.")
+            return
+
+        self._start_batch_job(write_export_file, tasks, "Exporting comments",
+                              lambda results, errors: self._finish_export("comment", results, errors))
+
+    # --- Batch jobs ---
+
+    def is_batch_job_running(self):
+        return self._batch_job is not None
+
+    def cancel_batch_job(self):
+        if self._batch_job is not None:
+            self._batch_job.cancel()
+            self.main_window.status_message_label.setText(f"{self._batch_label} - cancelling...")
+
+    def _start_batch_job(self, function, tasks, label, on_finished):
+        """
+        Runs a BatchJobThread over tasks, showing its progress in the status
+        bar; on_finished(results, errors) is called on the UI thread unless
+        the job is cancelled.
+        """
+        if self._batch_job is not None:
+            QMessageBox.information(self, label, f"{self._batch_label} is still running.")
+            return
+
+        thread = BatchJobThread(function, tasks)
+        self._batch_job = thread
+        self._batch_label = label
+        self._batch_files = [task[0] for task in tasks]
+
+        def finished(results, errors):
+            self._batch_job = None
+            thread.wait()
+            thread.deleteLater()
+            if thread.cancelled:
+                # Files written so far are complete; nothing read is imported
+                done = sum(result is not None for result in results)
+                self.main_window.status_message_label.setText(
+                    f"{label} cancelled after {done} of {len(results)} file(s)")
                 return
-            
-            if not file_path.endswith('.json'):
-                file_path += '.json'
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump({'comments': comments_list}, f, indent=2, ensure_ascii=False)
-            
-            QMessageBox.information(self, "Export Complete", f"Successfully exported {len(comments_list)} comment(s).")
-            
-        except Exception as e:
-            QMessageBox.warning(self, "Export Error", f"Failed to export comments: {str(e)}")
\ No newline at end of file
+            on_finished(results, errors)
+
+        thread.progress.connect(
+            lambda done, total: self.main_window.status_message_label.setText(f"{label}... {done}/{total}"))
+        thread.job_finished.connect(finished)
+        self.main_window.status_message_label.setText(f"{label}... 0/{len(tasks)}")
+        thread.start()
+
+    def _finish_export(self, noun, results, errors):
+        exported = sum(result is not None for result in results)
+        self.main_window.status_message_label.setText(f"Exported {exported} {noun}(s)")
+        if errors:
+            self._show_batch_errors("Export Error", "Failed to export", errors, self._batch_files)
+
+    def _show_batch_errors(self, title, text, errors, files):
+        details = "\n".join(f"{os.path.basename(files[index])}: {message}" for index, message in errors[:10])
+        if len(errors) > 10:
+            details += f"\n... and {len(errors) - 10} more"
+        QMessageBox.warning(self, title, f"{text} {len(errors)} file(s):\n{details}")
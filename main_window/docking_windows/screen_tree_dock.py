@@ -257,7 +257,11 @@ class ScreenTreeDock(QDockWidget):
     def copy_screen(self, item):
         screen_data = item.data(0, Qt.ItemDataRole.UserRole)
         if screen_data:
+            # A screen that was never opened has its items only in the project file
+            items = self.main_window.project_service.load_entry_payload('screens', screen_data)
             self._clipboard = copy.deepcopy(screen_data)
+            if items is not None:
+                self._clipboard['items'] = copy.deepcopy(items)
 
     def paste_screen(self, item):
         if not self._clipboard:
@@ -310,7 +314,12 @@ class ScreenTreeDock(QDockWidget):
 
         if dialog.exec():
             updated_data = dialog.get_screen_data()
+            # Keep the items, read under the screen's number before it changes
+            items = self.main_window.project_service.load_entry_payload('screens', screen_data)
+            if items is not None:
+                updated_data['items'] = items
             item.setData(0, Qt.ItemDataRole.UserRole, updated_data)
+            self.main_window.project_modified('screens')
             prefix = "[B]" if updated_data.get('type') == 'base' else "[W]"
             item.setText(0, f"{prefix} - {updated_data['number']} - {updated_data['name']}")
             
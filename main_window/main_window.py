@@ -1,7 +1,8 @@
 # main_window\main_window.py
+import os
 import sys
-from PySide6.QtWidgets import QMainWindow, QCheckBox, QTextEdit, QMessageBox, QFileDialog, QTabWidget, QApplication, QLineEdit, QLabel, QStatusBar, QWidget, QHBoxLayout
-from PySide6.QtCore import Qt, QSize, QByteArray
+from PySide6.QtWidgets import QMainWindow, QCheckBox, QTextEdit, QMessageBox, QFileDialog, QTabWidget, QApplication, QLineEdit, QLabel, QStatusBar, QWidget, QHBoxLayout, QProgressDialog
+from PySide6.QtCore import Qt, QSize, QByteArray, QTimer
 from PySide6.QtGui import QAction, QActionGroup
 
 # Import the menu classes from the new modules
@@ -37,12 +38,20 @@ from styles import stylesheets
 from services.project_service import ProjectService
 from services.edit_service import EditService
 from services.comment_service import CommentService
+from services.autosave_service import (
+    AutosaveService, journal_path_for, read_journal, file_stamp,
+    find_untitled_journals, lock_journal
+)
+from services.project_writer import screen_entry_key
 from main_window.services.view_service import ViewService
 from screen.base.canvas_base_screen import CanvasBaseScreen
 from screen.base.base_graphic_object import BaseGraphicObject
 from project.comment.comment_table import CommentTable, Spreadsheet
 from project.tag.tag_table import TagTable
 
+# Delay after the last project change before the title compares the project with its saved state
+TITLE_REFRESH_DELAY_MS = 500
+
 class MainWindow(QMainWindow):
     """
     This is the main window of the application.
@@ -56,14 +65,28 @@ class MainWindow(QMainWindow):
         self.settings_service = settings_service
         self.project_service = ProjectService()
         self.comment_service = CommentService()
+        self.comment_service.set_table_data_loader(
+            lambda number: self.project_service.load_entry_payload('comments', number))
+        self.comment_service.set_change_listener(
+            lambda number: self.project_modified('comments', number))
         self.edit_service = EditService()
+        self.autosave_service = AutosaveService(self.project_service, self.edit_service, self)
+        self.autosave_service.fold_requested.connect(self._on_autosave_fold)
         self.view_service = ViewService(self)
         self.open_screens = {} # Dictionary to track open screens {(type, number): widget}
         self.open_comments = {} # Dictionary to track open comment tables {comment_number: widget}
         self.open_tags = {} # Dictionary to track open tag tables {tag_number: widget}
-
+        self._save_thread = None
+        self._save_progress = None
+        self._save_journal_seq = 0
+        self._save_quiet = False
 
         # Set the window title
+        self._title_timer = QTimer(self)
+        self._title_timer.setSingleShot(True)
+        self._title_timer.setInterval(TITLE_REFRESH_DELAY_MS)
+        self._title_timer.timeout.connect(self.update_window_title)
+        self.project_service.add_change_listener(self._on_project_changed)
         self.update_window_title()
 
         # Set the window icon
@@ -111,6 +134,7 @@ class MainWindow(QMainWindow):
         self._restore_ui_settings()
         
         self.new_project()
+        self._recover_untitled_journal()
 
     def _create_status_bar(self):
         """Creates the status bar and its widgets."""
@@ -153,22 +177,42 @@ class MainWindow(QMainWindow):
         self.statusBar().addPermanentWidget(obj_pos_widget)
         self.statusBar().addPermanentWidget(obj_size_widget)
 
-    def update_window_title(self):
-        """Updates the window title based on the project state."""
+    def update_window_title(self, modified=None):
+        """
+        Updates the window title based on the project state.
+
+        Args:
+            modified (bool, optional): Whether to mark the project as
+                modified; by default the project is compared with its saved
+                state.
+        """
         title = "HMI Designer"
         project_name = "untitled.hmi"
         if self.project_service.file_path:
             project_name = self.project_service.file_path.split('/')[-1]
         
-        if not self.project_service.is_saved:
+        if modified is None:
+            modified = not self.project_service.check_saved()
+        if modified:
             project_name += "*"
             
         self.setWindowTitle(f"{title} - {project_name}")
 
-    def project_modified(self):
-        """Slot to handle modifications to the project."""
-        self.project_service.mark_as_unsaved()
-        self.update_window_title()
+    def _on_project_changed(self, section, key):
+        # Comparing with the saved state hashes the changed entries, so it
+        # waits until the edits pause; until then the title shows a change
+        self.update_window_title(modified=True)
+        self._title_timer.start()
+
+    def project_modified(self, section=None, key=None):
+        """
+        Slot to handle modifications to the project.
+
+        Args:
+            section (str, optional): The project_data section that changed.
+            key (optional): The entry within the section that changed.
+        """
+        self.project_service.mark_as_unsaved(section, key)
 
     def get_project_content(self):
         """Gets the current project content. (Placeholder for multi-screen)"""
@@ -183,11 +227,11 @@ class MainWindow(QMainWindow):
             return
         self.project_service.new_project()
         self.comment_service.clear_data()
-        self.central_widget.clear()
-        self.open_screens.clear()
-        self.open_comments.clear()
-        self.open_tags.clear()
+        # Share one dict so project changes and the journal see the same comments
+        self.project_service.project_data['comments'] = self.comment_service.get_all_data()
+        self._close_all_tabs()
         self.project_tree.clear_project_items()
+        self.autosave_service.start_session()
         self.update_window_title()
 
     def prepare_project_data(self):
@@ -207,52 +251,217 @@ class MainWindow(QMainWindow):
             success, message = self.project_service.load_project(file_path)
             if success:
                 # Clear existing state
-                self.central_widget.clear()
-                self.open_screens.clear()
-                self.open_comments.clear()
-                self.open_tags.clear()
+                self.autosave_service.end_session()
+                self._close_all_tabs()
+
+                # Replay changes left in the journal by a crashed session
+                recovered = self._offer_journal_recovery(journal_path_for(file_path, None))
 
                 # Load data into services and UI
-                project_data = self.project_service.project_data
-                self.comment_service.load_data(project_data.get('comments', {}))
-                self.project_tree.load_project_data(project_data)
-                
-                if project_data and 'content' in project_data:
-                    self.set_project_content(project_data['content'])
-                self.update_window_title()
+                self._reload_project_views()
+                self.autosave_service.start_session(resume_records=recovered)
             else:
                 QMessageBox.warning(self, "Load Error", message)
 
+    def _reload_project_views(self):
+        """Loads the current project_data into the services and the project tree."""
+        project_data = self.project_service.project_data
+        self.comment_service.load_data(project_data.get('comments', {}))
+        self.project_tree.load_project_data(project_data)
+
+        if project_data and 'content' in project_data:
+            self.set_project_content(project_data['content'])
+        self.update_window_title()
+
+    def _offer_journal_recovery(self, journal_path):
+        """
+        Offers to replay an autosave journal left behind by a crashed session.
+
+        Returns:
+            list or None: The replayed journal records, or None if nothing was
+                recovered.
+        """
+        if not os.path.exists(journal_path):
+            return None
+        lock = lock_journal(journal_path)
+        if lock is None:
+            # Another running instance is journaling this project
+            return None
+        lock.unlock()
+
+        try:
+            header, records = read_journal(journal_path)
+        except OSError:
+            return None
+        if header is None or not records:
+            return None
+        base_path = header.get('file_path')
+        if base_path and header.get('base_stamp') != file_stamp(base_path):
+            # The project file was saved elsewhere since; the records no longer apply
+            return None
+
+        reply = QMessageBox.question(
+            self, "Recover Unsaved Changes",
+            f"HMI Designer did not close properly. {len(records)} unsaved change(s) "
+            f"were found in the autosave journal.\n\nWould you like to recover them?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply != QMessageBox.StandardButton.Yes:
+            return None
+
+        applied = self.autosave_service.replay(records)
+        self.status_message_label.setText(f"Recovered {applied} change(s) from the autosave journal")
+        return records
+
+    def _recover_untitled_journal(self):
+        """Offers to recover the most recent untitled project left by a crash."""
+        own_journal = self.autosave_service.journal_path
+        for journal_path in find_untitled_journals():
+            if journal_path == own_journal:
+                continue
+            lock = lock_journal(journal_path)
+            if lock is None:
+                # The live journal of another running instance
+                continue
+            lock.unlock()
+            try:
+                header, _ = read_journal(journal_path)
+            except OSError:
+                continue
+            if header is None:
+                continue
+
+            recovered = self._offer_journal_recovery(journal_path)
+            if recovered is None:
+                try:
+                    os.remove(journal_path)
+                except OSError:
+                    pass
+                return
+            # Continue the recovered journal instead of the fresh one
+            self.autosave_service.end_session()
+            self.project_service.project_id = header.get('project_id') or self.project_service.project_id
+            self._reload_project_views()
+            self.autosave_service.start_session(resume_records=recovered)
+            return
+
     def save_project(self):
-        """Saves the current project."""
+        """Saves the current project in the background."""
         if not self.project_service.file_path:
             return self.save_project_as()
-        else:
-            # Prepare project data before saving
-            self.prepare_project_data()
-
-            success, message = self.project_service.save_project()
-            if success:
-                self.update_window_title()
-                return True
-            else:
-                QMessageBox.warning(self, "Save Error", message)
-                return False
+        return self._start_background_save()
 
     def save_project_as(self):
         """Saves the project with a new file name."""
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Project As", "", "HMI Project Files (*.hmi)")
         if file_path:
-            # Prepare project data before saving
-            self.prepare_project_data()
+            return self._start_background_save(file_path)
+        return False
 
-            success, message = self.project_service.save_project(file_path)
-            if success:
-                self.update_window_title()
+    def _start_background_save(self, file_path=None, quiet=False):
+        """
+        Starts a ProjectSaveThread and shows its progress.
+
+        Args:
+            file_path (str, optional): Save under a new name.
+            quiet (bool): Autosave fold; no progress dialog or error boxes.
+        """
+        if self._save_thread is not None and self._save_thread.isRunning():
+            if not quiet:
+                self.status_message_label.setText("A save is already in progress")
+            return False
+
+        # Prepare project data before saving
+        self.prepare_project_data()
+        journal_seq = self.autosave_service.current_seq()
+
+        thread = self.project_service.create_save_thread(file_path)
+        if thread is None:
+            if not quiet:
+                QMessageBox.warning(self, "Save Error", "No file path specified")
+            return False
+
+        progress = None
+        if not quiet:
+            progress = QProgressDialog("Saving project...", "Cancel", 0, thread.snapshot.total_units, self)
+            progress.setWindowTitle("Save Project")
+            progress.setWindowModality(Qt.WindowModality.NonModal)
+            progress.setMinimumDuration(500)
+            progress.setAutoClose(False)
+            progress.setAutoReset(False)
+            progress.canceled.connect(thread.cancel)
+
+        thread.progress.connect(self._on_save_progress)
+        thread.save_finished.connect(self._on_save_finished)
+        self._save_thread = thread
+        self._save_progress = progress
+        self._save_journal_seq = journal_seq
+        self._save_quiet = quiet
+        self.status_message_label.setText("Saving project...")
+        thread.start()
+        return True
+
+    def _on_save_progress(self, done, total):
+        if self._save_progress is not None:
+            self._save_progress.setMaximum(total)
+            self._save_progress.setValue(done)
+
+    def _on_save_finished(self, success, message):
+        thread = self._save_thread
+        if self._save_progress is not None:
+            self._save_progress.close()
+            self._save_progress = None
+        self._save_thread = None
+
+        if success:
+            self.project_service.finish_save_thread(thread)
+            self.autosave_service.on_project_saved(self._save_journal_seq)
+            self.status_message_label.setText("Project autosaved" if self._save_quiet else "Project saved")
+        elif thread is not None and thread.cancelled:
+            self.status_message_label.setText(message)
+        elif self._save_quiet:
+            self.status_message_label.setText(f"Autosave failed: {message}")
+        else:
+            self.status_message_label.setText("Ready")
+            QMessageBox.warning(self, "Save Error", message)
+        self.update_window_title()
+        if thread is not None:
+            thread.wait()
+            thread.deleteLater()
+
+    def _on_autosave_fold(self):
+        """Saves into the project file while the editor is idle, keeping the journal short."""
+        if self.project_service.is_saved or not self.project_service.file_path:
+            return
+        if self._save_thread is not None and self._save_thread.isRunning():
+            return
+        if QApplication.activeModalWidget() is not None:
+            return
+        self._start_background_save(quiet=True)
+
+    def _save_project_blocking(self):
+        """Saves the project on the UI thread; used when the answer is needed immediately."""
+        if self._save_thread is not None and self._save_thread.isRunning():
+            self._save_thread.wait()
+            QApplication.processEvents()
+            if self.project_service.is_saved:
                 return True
-            else:
-                QMessageBox.warning(self, "Save Error", message)
+
+        file_path = self.project_service.file_path
+        if not file_path:
+            file_path, _ = QFileDialog.getSaveFileName(self, "Save Project As", "", "HMI Project Files (*.hmi)")
+            if not file_path:
                 return False
+
+        # Prepare project data before saving
+        self.prepare_project_data()
+        journal_seq = self.autosave_service.current_seq()
+
+        success, message = self.project_service.save_project(file_path)
+        if success:
+            self.autosave_service.on_project_saved(journal_seq)
+            self.update_window_title()
+            return True
+        QMessageBox.warning(self, "Save Error", message)
         return False
 
     def open_screen(self, screen_data):
@@ -274,7 +483,16 @@ class MainWindow(QMainWindow):
                 self.central_widget.setCurrentWidget(widget_to_activate)
             return
 
+        # Read the screen's items from the project file on first open
+        if 'items' not in screen_data:
+            items = self.project_service.load_entry_payload('screens', screen_data)
+            if items is not None:
+                screen_data['items'] = items
+
         screen_widget = CanvasBaseScreen(screen_data, self.project_service, self.view_service, parent=self)
+        self.autosave_service.watch_document(
+            screen_widget._stack_id, 'screens', screen_entry_key(None, screen_data),
+            payload_getter=screen_widget.items_data, items_getter=screen_widget.items_data)
         screen_widget.zoom_changed.connect(lambda zf, sw=screen_widget: self.sync_zoom_controls(sw))
         screen_widget.mouse_moved.connect(self.update_mouse_position)
         screen_widget.tool_reset.connect(self.on_tool_reset)
@@ -336,6 +554,9 @@ class MainWindow(QMainWindow):
             return
 
         comment_widget = CommentTable(comment_data, self, self.common_menu, self.comment_service)
+        self.autosave_service.watch_document(
+            comment_widget._stack_id, 'comments', comment_number,
+            payload_getter=lambda: self.comment_service.get_table_data(comment_number))
         
         tab_title = f"[C] - {comment_number} - {comment_data.get('name')}"
         icon = IconService.get_icon("common-comment")
@@ -360,7 +581,16 @@ class MainWindow(QMainWindow):
                 self.central_widget.setCurrentWidget(widget_to_activate)
             return
 
+        # Read the tag rows from the project file on first open
+        if 'tags' not in tag_data:
+            tags = self.project_service.load_entry_payload('tag_lists', tag_number)
+            if tags is not None:
+                tag_data['tags'] = tags
+
         tag_widget = TagTable(tag_data, self)
+        self.autosave_service.watch_document(
+            tag_widget._stack_id, 'tag_lists', tag_number,
+            payload_getter=lambda: tag_widget.tag_data.get('tags', []))
         
         tab_title = f"[T] - {tag_number} - {tag_data.get('name')}"
         icon = IconService.get_icon("common-tags")
@@ -380,6 +610,8 @@ class MainWindow(QMainWindow):
             widget_to_close = self.open_screens[screen_id]
             index = self.central_widget.indexOf(widget_to_close)
             if index != -1:
+                self._disconnect_screen_from_layers_dock(widget_to_close)
+                self._release_tab_widget(widget_to_close)
                 self.central_widget.removeTab(index)
             del self.open_screens[screen_id]
 
@@ -388,6 +620,7 @@ class MainWindow(QMainWindow):
             widget_to_close = self.open_tags[number]
             index = self.central_widget.indexOf(widget_to_close)
             if index != -1:
+                self._release_tab_widget(widget_to_close)
                 self.central_widget.removeTab(index)
             del self.open_tags[number]
 
@@ -398,9 +631,30 @@ class MainWindow(QMainWindow):
             if index != -1:
                 # Before removing, ensure data is saved
                 widget_to_close.table_widget.save_data_to_service()
+                self._release_tab_widget(widget_to_close)
                 self.central_widget.removeTab(index)
             del self.open_comments[number]
 
+    def _release_tab_widget(self, widget):
+        """Stops journaling an editor tab and unregisters its undo stack."""
+        stack_id = getattr(widget, '_stack_id', None)
+        if stack_id is not None:
+            self.autosave_service.unwatch_document(stack_id)
+        if hasattr(widget, 'cleanup'):
+            widget.cleanup()
+
+    def _close_all_tabs(self):
+        """Closes every editor tab, e.g. when another project is loaded."""
+        for index in range(self.central_widget.count()):
+            widget = self.central_widget.widget(index)
+            if isinstance(widget, CanvasBaseScreen):
+                self._disconnect_screen_from_layers_dock(widget)
+            self._release_tab_widget(widget)
+        self.central_widget.clear()
+        self.open_screens.clear()
+        self.open_comments.clear()
+        self.open_tags.clear()
+
     def get_screen_id_for_widget(self, widget):
         for screen_id, screen_widget in self.open_screens.items():
             if screen_widget is widget:
@@ -431,8 +685,7 @@ class MainWindow(QMainWindow):
             # Disconnect layers dock signals to prevent stale connections
             self._disconnect_screen_from_layers_dock(widget)
             # Clean up canvas resources (unregister undo stack)
-            if isinstance(widget, CanvasBaseScreen) and hasattr(widget, 'cleanup'):
-                widget.cleanup()
+            self._release_tab_widget(widget)
             del self.open_screens[screen_id_to_remove]
             self.central_widget.removeTab(index)
             return
@@ -440,12 +693,14 @@ class MainWindow(QMainWindow):
         # Check if it's a comment table
         if isinstance(widget, CommentTable):
             widget.table_widget.save_data_to_service()
+            self._release_tab_widget(widget)
             comment_number_to_remove = widget.comment_data.get('number')
             if comment_number_to_remove in self.open_comments:
                 del self.open_comments[comment_number_to_remove]
         
         # Check if it's a tag table
         if isinstance(widget, TagTable):
+            self._release_tab_widget(widget)
             tag_number_to_remove = widget.tag_data.get('number')
             if tag_number_to_remove in self.open_tags:
                 del self.open_tags[tag_number_to_remove]
@@ -453,7 +708,7 @@ class MainWindow(QMainWindow):
         self.central_widget.removeTab(index)
             
     def prompt_to_save(self):
-        if self.project_service.is_saved:
+        if self.project_service.check_saved():
             return True
         
         reply = QMessageBox.question(self, 'Save Project',
@@ -461,7 +716,7 @@ class MainWindow(QMainWindow):
                                      QMessageBox.StandardButton.Save | QMessageBox.StandardButton.Discard | QMessageBox.StandardButton.Cancel)
 
         if reply == QMessageBox.StandardButton.Save:
-            return self.save_project()
+            return self._save_project_blocking()
         elif reply == QMessageBox.StandardButton.Cancel:
             return False
         return True
@@ -655,11 +910,8 @@ class MainWindow(QMainWindow):
         self.update_status_bar(widget)
         
         # Set the active undo stack in EditService based on the active tab
-        if isinstance(widget, CanvasBaseScreen) and hasattr(widget, '_stack_id'):
-            self.edit_service.set_active_stack(widget._stack_id)
-        else:
-            # For other widgets, we don't have central undo stack management yet
-            self.edit_service.set_active_stack(None)
+        # (screens, comment tables and tag tables register their stacks)
+        self.edit_service.set_active_stack(getattr(widget, '_stack_id', None))
         
         # Sync layers panel with the new active screen
         layers_dock = self.dock_factory.get_dock("layers")
@@ -1204,6 +1456,8 @@ class MainWindow(QMainWindow):
                     screen_widget.scene.clearSelection()
             
             self.settings_service.save_settings(self)
+            # Closed cleanly; the crash recovery journal is no longer needed
+            self.autosave_service.end_session()
             event.accept()
         else:
             event.ignore()
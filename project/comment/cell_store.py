@@ -0,0 +1,837 @@
+# project\comment\cell_store.py
+"""
+Cell storage backends of the comment spreadsheet.
+
+LazyDataStore keeps one CellData per populated cell in a dict.
+ColumnarDataStore keeps one {row: value} map per column and stores each
+cell's formatting as a small integer id into a shared StyleTable, instead of
+one CellData object (with its own font dict) per populated cell. It exposes
+the same API as LazyDataStore; CellData objects are only built on access.
+
+Both stores address rows (and LazyDataStore also columns) through an
+IndexMap, so inserting or removing rows re-keys no cells: only the map and
+the cells of the removed rows are touched.
+"""
+
+import sys
+from array import array
+from itertools import repeat
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Set, Tuple
+
+from PySide6.QtCore import QMutex
+
+from .lru_cache import LRUCache
+from .performance_config import PerformanceConfig
+from services.table_codec import (
+    PLAIN_STYLE, SparseTableEncoder, is_sparse_table, iter_cells, iter_sparse_cells, make_cell, style_font,
+    style_key, table_shape
+)
+
+
+@dataclass
+class CellData:
+    """Represents a single cell with its properties."""
+    value: str = ''
+    font: Dict[str, bool] = None
+    text_color: str = None
+    bg_color: str = None
+
+    def __post_init__(self):
+        if self.font is None:
+            self.font = {'bold': False, 'italic': False, 'underline': False}
+
+    def to_dict(self):
+        return {
+            'value': self.value,
+            'font': self.font.copy(),
+            'text_color': self.text_color,
+            'bg_color': self.bg_color
+        }
+
+    @staticmethod
+    def from_dict(data):
+        if isinstance(data, dict):
+            return CellData(
+                value=str(data.get('value', '')),
+                font=data.get('font', {'bold': False, 'italic': False, 'underline': False}).copy(),
+                text_color=data.get('text_color'),
+                bg_color=data.get('bg_color')
+            )
+        return CellData()
+
+
+class IndexMap:
+    """
+    Maps logical positions (row or column indices) to stable physical ids.
+
+    Cells are stored under physical ids, so structural edits only move
+    entries of the map (a memmove of 8 bytes per position) instead of
+    re-keying every cell after the edit point.
+    """
+
+    def __init__(self, count: int = 0):
+        self._ids = array('q', range(count))
+        self._next_id = count
+        self._positions = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        return self._ids[index]
+
+    def insert(self, index: int, count: int = 1):
+        """Insert count new positions before index."""
+        index = max(0, min(index, len(self._ids)))
+        self._ids[index:index] = array('q', range(self._next_id, self._next_id + count))
+        self._next_id += count
+        self._positions = None
+
+    def remove(self, indices: Iterable[int]) -> List[int]:
+        """Remove logical positions and return their physical ids, in position order."""
+        indices = sorted({index for index in indices if 0 <= index < len(self._ids)})
+        removed = [self._ids[index] for index in indices]
+        if len(indices) == 1:
+            del self._ids[indices[0]]
+        elif indices:
+            kept = array('q')
+            start = 0
+            for index in indices:
+                kept.extend(self._ids[start:index])
+                start = index + 1
+            kept.extend(self._ids[start:])
+            self._ids = kept
+        if indices:
+            self._positions = None
+        return removed
+
+    def position(self, physical_id: int) -> int:
+        """Return the logical position of a physical id, or -1 if it was removed."""
+        if self._positions is None:
+            positions = array('q', [-1]) * self._next_id
+            for index, pid in enumerate(self._ids):
+                positions[pid] = index
+            self._positions = positions
+        return self._positions[physical_id]
+
+
+class StyleTable:
+    """Interns (font_flags, text_color, bg_color) tuples as small integer ids; id 0 is unstyled."""
+
+    def __init__(self):
+        self._styles: List[Tuple] = [PLAIN_STYLE]
+        self._ids: Dict[Tuple, int] = {PLAIN_STYLE: 0}
+
+    def __len__(self):
+        return len(self._styles)
+
+    def intern(self, style: Tuple) -> int:
+        """Return the id of a style tuple, adding it if needed."""
+        style_id = self._ids.get(style)
+        if style_id is None:
+            style_id = len(self._styles)
+            self._ids[style] = style_id
+            self._styles.append(style)
+        return style_id
+
+    def style(self, style_id: int) -> Tuple:
+        """Return the style tuple of an id."""
+        return self._styles[style_id]
+
+    def intern_cell(self, cell: CellData) -> int:
+        """Return the style id of a cell's formatting."""
+        return self.intern(style_key(vars(cell)))
+
+    def make_cell(self, value: str, style_id: int) -> CellData:
+        """Build a CellData for a stored value and style id."""
+        if not style_id:
+            return CellData(value=value)
+        flags, text_color, bg_color = self._styles[style_id]
+        return CellData(value=value, font=style_font(flags), text_color=text_color, bg_color=bg_color)
+
+
+class CellDiff:
+    """
+    Before and after state of the cells of one edit, kept compact for the
+    undo stack: positions as runs of adjacent cells of a row in an int
+    array, values as strings and styles as ids into the diff's own
+    StyleTable. compact() shrinks a column every cell agrees on (the empty
+    new values of a clear or a removal) to its single entry and lets a side
+    the edit did not change (the values of a style change) share the other
+    side's storage. Diffs pickle as plain arrays and lists, see undo_spill.
+    """
+
+    def __init__(self):
+        self.style_table = StyleTable()
+        # (row, first col, length) triples
+        self._runs = array('q')
+        self._count = 0
+        self._old_values: List[str] = []
+        self._new_values: List[str] = []
+        self._old_styles = array('q')
+        self._new_styles = array('q')
+
+    def __len__(self):
+        return self._count
+
+    def add(self, row: int, col: int, old_value: str, old_style: Tuple, new_value: str, new_style: Tuple):
+        runs = self._runs
+        if runs and runs[-3] == row and runs[-2] + runs[-1] == col:
+            runs[-1] += 1
+        else:
+            runs.extend((row, col, 1))
+        self._count += 1
+        self._old_values.append(old_value)
+        self._new_values.append(new_value)
+        self._old_styles.append(self.style_table.intern(old_style))
+        self._new_styles.append(self.style_table.intern(new_style))
+
+    def compact(self):
+        """Shrink uniform columns and share unchanged sides; call once the diff is complete."""
+        if self._count > 1:
+            for name in ('_old_values', '_new_values', '_old_styles', '_new_styles'):
+                column = getattr(self, name)
+                first = column[0]
+                if all(item == first for item in column):
+                    setattr(self, name, column[:1])
+        if self._new_values == self._old_values:
+            self._new_values = self._old_values
+        if self._new_styles == self._old_styles:
+            self._new_styles = self._old_styles
+
+    def _column(self, column):
+        # A column shrunk by compact() holds the one entry of every cell
+        return repeat(column[0], self._count) if len(column) < self._count else column
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the diff, counting each distinct value string once."""
+        strings = {id(value): value for value in self._old_values}
+        strings.update((id(value), value) for value in self._new_values)
+        arrays = {id(a): a for a in (self._runs, self._old_styles, self._new_styles)}
+        lists = {id(values): values for values in (self._old_values, self._new_values)}
+        return (sum(sys.getsizeof(value) for value in strings.values())
+                + sum(a.itemsize * len(a) for a in arrays.values())
+                + sum(8 * len(values) for values in lists.values())
+                + 100 * len(self.style_table))
+
+    def positions(self):
+        """Yield the (row, col) of every cell, in the order they were added."""
+        runs = self._runs
+        for i in range(0, len(runs), 3):
+            row, col = runs[i], runs[i + 1]
+            for offset in range(runs[i + 2]):
+                yield row, col + offset
+
+    def cells(self, undone: bool = False):
+        """Yield (row, col, value, style tuple) of the state after the edit, or before it if undone."""
+        values, styles = (self._old_values, self._old_styles) if undone else (self._new_values, self._new_styles)
+        style = self.style_table.style
+        for (row, col), value, style_id in zip(self.positions(), self._column(values), self._column(styles)):
+            yield row, col, value, style(style_id)
+
+    def changed_values(self, undone: bool = False):
+        """Yield (row, col, value) of the cells whose value (not only style) the edit changes."""
+        if self._new_values is self._old_values:
+            return
+        values, others = (self._old_values, self._new_values) if undone else (self._new_values, self._old_values)
+        for (row, col), value, other in zip(self.positions(), self._column(values), self._column(others)):
+            if value != other:
+                yield row, col, value
+
+
+class LazyDataStore:
+    """Efficient data storage with lazy loading and memory management."""
+    
+    def __init__(self, initial_rows=100, initial_cols=10):
+        # Cells are keyed by physical (row_id, col_id); see IndexMap
+        self._data: Dict[Tuple[int, int], CellData] = {}
+        self._rows = IndexMap(initial_rows)
+        self._cols = IndexMap(initial_cols)
+        self._lock = QMutex()
+        self._dirty_cells: Set[Tuple[int, int]] = set()
+        self.row_cache = LRUCache(PerformanceConfig.MAX_CACHED_ROWS)
+    
+    @property
+    def row_count(self) -> int:
+        return len(self._rows)
+    
+    @property
+    def col_count(self) -> int:
+        return len(self._cols)
+    
+    def get_cell(self, row: int, col: int) -> CellData:
+        """Get cell data without materializing empty cells."""
+        if not (0 <= row < self.row_count and 0 <= col < self.col_count):
+            return CellData()
+        return self._data.get((self._rows[row], self._cols[col]), CellData())
+    
+    def set_cell(self, row: int, col: int, data: CellData):
+        """Set cell data and mark as dirty."""
+        if 0 <= row < self.row_count and 0 <= col < self.col_count:
+            self._lock.lock()
+            try:
+                key = (self._rows[row], self._cols[col])
+                if (
+                    not data.value
+                    and not data.text_color
+                    and not data.bg_color
+                    and not any(data.font.values())
+                ):
+                    self._data.pop(key, None)
+                else:
+                    self._data[key] = data
+                self._dirty_cells.add(key)
+                # Invalidate cached row
+                self.row_cache.pop(row)
+            finally:
+                self._lock.unlock()
+    
+    def get_styled_cells(self, positions):
+        """Return (value, style tuple) of each (row, col); empty cells are ('', PLAIN_STYLE)."""
+        result = []
+        for row, col in positions:
+            cell = self.get_cell(row, col)
+            result.append((cell.value, style_key(vars(cell))))
+        return result
+
+    def set_styled_cells(self, cells):
+        """Set (row, col, value, style tuple) cells in one write; empty cells are dropped from storage."""
+        self._lock.lock()
+        try:
+            for row, col, value, style in cells:
+                if not (0 <= row < self.row_count and 0 <= col < self.col_count):
+                    continue
+                key = (self._rows[row], self._cols[col])
+                if not value and style == PLAIN_STYLE:
+                    self._data.pop(key, None)
+                else:
+                    flags, text_color, bg_color = style
+                    self._data[key] = CellData(value=value, font=style_font(flags),
+                                               text_color=text_color, bg_color=bg_color)
+                self._dirty_cells.add(key)
+            self.row_cache.clear()
+        finally:
+            self._lock.unlock()
+
+    def set_values(self, cells):
+        """Replace the values of (row, col, value) cells, keeping their styles; values must not be empty."""
+        self._lock.lock()
+        try:
+            for row, col, value in cells:
+                if 0 <= row < self.row_count and 0 <= col < self.col_count:
+                    key = (self._rows[row], self._cols[col])
+                    cell = self._data.get(key)
+                    if cell is None:
+                        self._data[key] = CellData(value=value)
+                    else:
+                        self._data[key] = CellData(value=value, font=dict(cell.font),
+                                                   text_color=cell.text_color, bg_color=cell.bg_color)
+                    self._dirty_cells.add(key)
+            self.row_cache.clear()
+        finally:
+            self._lock.unlock()
+    
+    def get_row(self, row: int) -> List[CellData]:
+        """Get entire row (cached)."""
+        cells = self.row_cache.get(row)
+        if cells is None:
+            cells = [self.get_cell(row, c) for c in range(self.col_count)]
+            self.row_cache.put(row, cells)
+        return cells
+    
+    def get_visible_range(self, start_row: int, end_row: int, start_col: int, end_col: int) -> Dict:
+        """Get only visible cells efficiently."""
+        visible = {}
+        cols = [(col, self._cols[col])
+                for col in range(max(0, start_col), min(self.col_count, end_col + 1))]
+        for row in range(max(0, start_row), min(self.row_count, end_row + 1)):
+            row_id = self._rows[row]
+            for col, col_id in cols:
+                cell = self._data.get((row_id, col_id))
+                if cell is not None:
+                    visible[(row, col)] = cell
+        return visible
+    
+    def insert_row(self, index: int, count: int = 1):
+        """Insert rows; no stored cell is moved."""
+        self.insert_rows(index, count)
+    
+    def insert_rows(self, index: int, count: int):
+        """Insert count empty rows before index."""
+        self._lock.lock()
+        try:
+            self._rows.insert(index, count)
+            self.row_cache.clear()
+        finally:
+            self._lock.unlock()
+    
+    def insert_column(self, index: int, count: int = 1):
+        """Insert columns; no stored cell is moved."""
+        self.insert_columns(index, count)
+    
+    def insert_columns(self, index: int, count: int):
+        """Insert count empty columns before index."""
+        self._lock.lock()
+        try:
+            self._cols.insert(index, count)
+            self.row_cache.clear()
+        finally:
+            self._lock.unlock()
+    
+    def remove_row(self, index: int) -> Dict[Tuple[int, int], CellData]:
+        """Remove a row and return its stored cells by their former (row, col), for undo."""
+        return self.remove_rows([index])
+    
+    def remove_rows(self, indices) -> Dict[Tuple[int, int], CellData]:
+        """
+        Remove several rows at once.
+        
+        Returns:
+            dict: The stored cells of the removed rows by their former (row, col).
+        """
+        self._lock.lock()
+        try:
+            indices = sorted({row for row in indices if 0 <= row < self.row_count})
+            saved = {}
+            col_ids = list(enumerate(self._cols))
+            for row, row_id in zip(indices, self._rows.remove(indices)):
+                for col, col_id in col_ids:
+                    cell = self._data.pop((row_id, col_id), None)
+                    if cell is not None:
+                        saved[(row, col)] = cell
+            self.row_cache.clear()
+            return saved
+        finally:
+            self._lock.unlock()
+    
+    def remove_column(self, index: int) -> Dict[Tuple[int, int], CellData]:
+        """Remove a column and return its stored cells by their former (row, col), for undo."""
+        return self.remove_columns([index])
+    
+    def remove_columns(self, indices) -> Dict[Tuple[int, int], CellData]:
+        """
+        Remove several columns at once.
+        
+        Returns:
+            dict: The stored cells of the removed columns by their former (row, col).
+        """
+        self._lock.lock()
+        try:
+            indices = sorted({col for col in indices if 0 <= col < self.col_count})
+            removed = list(zip(indices, self._cols.remove(indices)))
+            saved = {}
+            if removed:
+                for row, row_id in enumerate(self._rows):
+                    for col, col_id in removed:
+                        cell = self._data.pop((row_id, col_id), None)
+                        if cell is not None:
+                            saved[(row, col)] = cell
+            self.row_cache.clear()
+            return saved
+        finally:
+            self._lock.unlock()
+    
+    def _iter_logical(self):
+        """Yield (row, col, cell) for every stored cell."""
+        for (row_id, col_id), cell in self._data.items():
+            yield self._rows.position(row_id), self._cols.position(col_id), cell
+
+    def iter_cell_chunks(self, chunk_rows: int):
+        """
+        Yield the stored cells in (row, col) order as lists of (row, col,
+        value, style tuple), one list per chunk_rows rows, each read under
+        the store lock.
+        """
+        start = 0
+        while start < self.row_count:
+            self._lock.lock()
+            try:
+                end = min(start + chunk_rows, self.row_count)
+                col_ids = list(enumerate(self._cols[col] for col in range(self.col_count)))
+                cells = []
+                for row in range(start, end):
+                    row_id = self._rows[row]
+                    for col, col_id in col_ids:
+                        cell = self._data.get((row_id, col_id))
+                        if cell is not None:
+                            cells.append((row, col, cell.value, style_key(vars(cell))))
+            finally:
+                self._lock.unlock()
+            yield cells
+            start = end
+
+    def iter_values(self):
+        """Yield (row, col, value) for every stored cell."""
+        for row, col, cell in self._iter_logical():
+            yield row, col, cell.value
+    
+    def get_all_data(self) -> List[List[Dict]]:
+        """Export all data (for saving)."""
+        self._lock.lock()
+        try:
+            result = []
+            for row in range(self.row_count):
+                row_id = self._rows[row]
+                row_data = []
+                for col in range(self.col_count):
+                    cell = self._data.get((row_id, self._cols[col]))
+                    row_data.append(cell.to_dict() if cell else CellData().to_dict())
+                result.append(row_data)
+            return result
+        finally:
+            self._lock.unlock()
+    
+    def get_sparse_data(self) -> Dict:
+        """Export the stored cells in the sparse table encoding (for saving)."""
+        self._lock.lock()
+        try:
+            encoder = SparseTableEncoder(self.row_count, self.col_count)
+            for row, col, cell in self._iter_logical():
+                encoder.add(row, col, cell.value, style_key(vars(cell)))
+            return encoder.result()
+        finally:
+            self._lock.unlock()
+
+    def load_all_data(self, data):
+        """Import all data (for loading), in the sparse or the legacy dense format."""
+        self._lock.lock()
+        try:
+            self._data.clear()
+            self.row_cache.clear()
+            # Physical ids start out equal to the logical positions
+            row_count, col_count = table_shape(data)
+            self._rows = IndexMap(row_count)
+            self._cols = IndexMap(col_count)
+            if is_sparse_table(data):
+                for row, col, value, (flags, text_color, bg_color) in iter_sparse_cells(data):
+                    if row < row_count and col < col_count:
+                        self._data[(row, col)] = CellData(
+                            value=str(value), font=style_font(flags),
+                            text_color=text_color, bg_color=bg_color
+                        )
+            else:
+                for row, col, cell_data in iter_cells(data):
+                    if row < row_count and col < col_count:
+                        self._data[(row, col)] = CellData.from_dict(cell_data)
+        finally:
+            self._lock.unlock()
+
+
+class ColumnarDataStore:
+    """
+    Columnar cell storage with interned styles.
+
+    A cell is stored when it has a value or any formatting: its value in
+    _values[col][row_id] and, unless unstyled, its style id in
+    _styles[col][row_id], where row_id is the row's physical id in _rows.
+    """
+
+    def __init__(self, initial_rows=100, initial_cols=10):
+        self.col_count = initial_cols
+        self.style_table = StyleTable()
+        self._rows = IndexMap(initial_rows)
+        self._values: List[Dict[int, str]] = [{} for _ in range(initial_cols)]
+        self._styles: List[Dict[int, int]] = [{} for _ in range(initial_cols)]
+        self._lock = QMutex()
+        self.row_cache = LRUCache(PerformanceConfig.MAX_CACHED_ROWS)
+
+    @property
+    def row_count(self) -> int:
+        return len(self._rows)
+
+    def cell_count(self) -> int:
+        """Return the number of stored (non-empty) cells."""
+        return sum(len(column) for column in self._values)
+
+    def get_cell(self, row: int, col: int) -> CellData:
+        """Get cell data without materializing empty cells."""
+        if not (0 <= row < self.row_count and 0 <= col < self.col_count):
+            return CellData()
+        row_id = self._rows[row]
+        value = self._values[col].get(row_id)
+        if value is None:
+            return CellData()
+        return self.style_table.make_cell(value, self._styles[col].get(row_id, 0))
+
+    def set_cell(self, row: int, col: int, data: CellData):
+        """Set cell data; empty cells are dropped from storage."""
+        if 0 <= row < self.row_count and 0 <= col < self.col_count:
+            self._lock.lock()
+            try:
+                self.row_cache.pop(row)
+                row_id = self._rows[row]
+                style_id = self.style_table.intern_cell(data)
+                values = self._values[col]
+                styles = self._styles[col]
+                if not data.value and not style_id:
+                    values.pop(row_id, None)
+                    styles.pop(row_id, None)
+                    return
+                values[row_id] = data.value
+                if style_id:
+                    styles[row_id] = style_id
+                else:
+                    styles.pop(row_id, None)
+            finally:
+                self._lock.unlock()
+
+    def get_styled_cells(self, positions: Iterable[Tuple[int, int]]) -> List[Tuple[str, Tuple]]:
+        """Return (value, style tuple) of each (row, col); empty cells are ('', PLAIN_STYLE)."""
+        result = []
+        style = self.style_table.style
+        for row, col in positions:
+            if 0 <= row < self.row_count and 0 <= col < self.col_count:
+                row_id = self._rows[row]
+                result.append((self._values[col].get(row_id, ''), style(self._styles[col].get(row_id, 0))))
+            else:
+                result.append(('', PLAIN_STYLE))
+        return result
+
+    def set_styled_cells(self, cells: Iterable[Tuple[int, int, str, Tuple]]):
+        """Set (row, col, value, style tuple) cells in one write; empty cells are dropped from storage."""
+        self._lock.lock()
+        try:
+            for row, col, value, style in cells:
+                if not (0 <= row < self.row_count and 0 <= col < self.col_count):
+                    continue
+                row_id = self._rows[row]
+                style_id = self.style_table.intern(style)
+                values = self._values[col]
+                styles = self._styles[col]
+                if not value and not style_id:
+                    values.pop(row_id, None)
+                    styles.pop(row_id, None)
+                    continue
+                values[row_id] = value
+                if style_id:
+                    styles[row_id] = style_id
+                else:
+                    styles.pop(row_id, None)
+            self.row_cache.clear()
+        finally:
+            self._lock.unlock()
+
+    def set_values(self, cells: Iterable[Tuple[int, int, str]]):
+        """Replace the values of (row, col, value) cells, keeping their styles; values must not be empty."""
+        self._lock.lock()
+        try:
+            for row, col, value in cells:
+                if 0 <= row < self.row_count and 0 <= col < self.col_count:
+                    self._values[col][self._rows[row]] = value
+            self.row_cache.clear()
+        finally:
+            self._lock.unlock()
+
+    def get_row(self, row: int) -> List[CellData]:
+        """Get entire row (cached)."""
+        cells = self.row_cache.get(row)
+        if cells is None:
+            cells = [self.get_cell(row, c) for c in range(self.col_count)]
+            self.row_cache.put(row, cells)
+        return cells
+
+    def get_visible_range(self, start_row: int, end_row: int, start_col: int, end_col: int) -> Dict:
+        """Get only the stored cells of the visible range."""
+        visible = {}
+        rows = range(max(0, start_row), min(self.row_count, end_row + 1))
+        for col in range(max(0, start_col), min(self.col_count, end_col + 1)):
+            values = self._values[col]
+            if not values:
+                continue
+            styles = self._styles[col]
+            if len(values) < len(rows):
+                stored = ((self._rows.position(row_id), row_id) for row_id in values)
+                stored = [(row, row_id) for row, row_id in stored if row in rows]
+            else:
+                stored = [(row, self._rows[row]) for row in rows]
+            for row, row_id in stored:
+                value = values.get(row_id)
+                if value is not None:
+                    visible[(row, col)] = self.style_table.make_cell(value, styles.get(row_id, 0))
+        return visible
+
+    def insert_row(self, index: int, count: int = 1):
+        """Insert rows; no stored cell is moved."""
+        self.insert_rows(index, count)
+
+    def insert_rows(self, index: int, count: int):
+        """Insert count empty rows before index."""
+        self._lock.lock()
+        try:
+            self._rows.insert(index, count)
+            self.row_cache.clear()
+        finally:
+            self._lock.unlock()
+
+    def insert_column(self, index: int, count: int = 1):
+        """Insert empty columns."""
+        self.insert_columns(index, count)
+
+    def insert_columns(self, index: int, count: int):
+        """Insert count empty columns before index."""
+        self._lock.lock()
+        try:
+            self._values[index:index] = [{} for _ in range(count)]
+            self._styles[index:index] = [{} for _ in range(count)]
+            self.col_count += count
+            self.row_cache.clear()
+        finally:
+            self._lock.unlock()
+
+    def remove_row(self, index: int) -> Dict[Tuple[int, int], CellData]:
+        """Remove a row and return its stored cells by their former (row, col), for undo."""
+        return self.remove_rows([index])
+
+    def remove_rows(self, indices: Iterable[int]) -> Dict[Tuple[int, int], CellData]:
+        """
+        Remove several rows at once.
+
+        Returns:
+            dict: The stored cells of the removed rows by their former (row, col).
+        """
+        self._lock.lock()
+        try:
+            indices = sorted({row for row in indices if 0 <= row < self.row_count})
+            saved = {}
+            for row in indices:
+                row_id = self._rows[row]
+                for col, values in enumerate(self._values):
+                    value = values.get(row_id)
+                    if value is not None:
+                        saved[(row, col)] = self.style_table.make_cell(
+                            value, self._styles[col].get(row_id, 0))
+            row_ids = self._rows.remove(indices)
+            self.row_cache.clear()
+            for values, styles in zip(self._values, self._styles):
+                if values:
+                    for row_id in row_ids:
+                        values.pop(row_id, None)
+                        styles.pop(row_id, None)
+            return saved
+        finally:
+            self._lock.unlock()
+
+    def remove_column(self, index: int) -> Dict[Tuple[int, int], CellData]:
+        """Remove a column and return its stored cells by their former (row, col), for undo."""
+        return self.remove_columns([index])
+
+    def remove_columns(self, indices: Iterable[int]) -> Dict[Tuple[int, int], CellData]:
+        """
+        Remove several columns at once.
+
+        Returns:
+            dict: The stored cells of the removed columns by their former (row, col).
+        """
+        self._lock.lock()
+        try:
+            indices = sorted({col for col in indices if 0 <= col < self.col_count})
+            saved = {}
+            for col in indices:
+                styles = self._styles[col]
+                for row_id, value in self._values[col].items():
+                    saved[(self._rows.position(row_id), col)] = self.style_table.make_cell(
+                        value, styles.get(row_id, 0))
+            for col in reversed(indices):
+                del self._values[col]
+                del self._styles[col]
+            self.col_count -= len(indices)
+            self.row_cache.clear()
+            return saved
+        finally:
+            self._lock.unlock()
+
+    def iter_stored_cells(self):
+        """Yield (row, col, value, style tuple) for every stored cell."""
+        for col, values in enumerate(self._values):
+            styles = self._styles[col]
+            for row_id, value in values.items():
+                yield (self._rows.position(row_id), col, value,
+                       self.style_table.style(styles.get(row_id, 0)))
+
+    def iter_cell_chunks(self, chunk_rows: int):
+        """
+        Yield the stored cells in (row, col) order as lists of (row, col,
+        value, style tuple), one list per chunk_rows rows. Each chunk is read
+        under the store lock, so memory follows one chunk, not the table.
+        """
+        start = 0
+        while start < self.row_count:
+            self._lock.lock()
+            try:
+                end = min(start + chunk_rows, self.row_count)
+                positions = {row_id: start + offset for offset, row_id in enumerate(self._rows[start:end])}
+                style = self.style_table.style
+                cells = []
+                for col, values in enumerate(self._values):
+                    styles = self._styles[col]
+                    for row_id in values.keys() & positions.keys():
+                        cells.append((positions[row_id], col, values[row_id],
+                                      style(styles.get(row_id, 0))))
+            finally:
+                self._lock.unlock()
+            cells.sort(key=lambda cell: (cell[0], cell[1]))
+            yield cells
+            start = end
+
+    def iter_values(self):
+        """Yield (row, col, value) for every stored cell."""
+        for col, values in enumerate(self._values):
+            for row_id, value in values.items():
+                yield self._rows.position(row_id), col, value
+
+    def get_all_data(self) -> List[List[Dict]]:
+        """Export all data in the dense format."""
+        self._lock.lock()
+        try:
+            result = [[CellData().to_dict() for _ in range(self.col_count)]
+                      for _ in range(self.row_count)]
+            for row, col, value, style in self.iter_stored_cells():
+                if 0 <= row < self.row_count and col < self.col_count:
+                    result[row][col] = make_cell(value, style)
+            return result
+        finally:
+            self._lock.unlock()
+
+    def get_sparse_data(self) -> Dict:
+        """Export the stored cells in the sparse table encoding (for saving)."""
+        self._lock.lock()
+        try:
+            encoder = SparseTableEncoder(self.row_count, self.col_count)
+            for row, col, value, style in self.iter_stored_cells():
+                if row >= 0:
+                    encoder.add(row, col, value, style)
+            return encoder.result()
+        finally:
+            self._lock.unlock()
+
+    def load_all_data(self, data):
+        """Import all data (for loading), in the sparse or the legacy dense format."""
+        self._lock.lock()
+        try:
+            row_count, self.col_count = table_shape(data)
+            self.row_cache.clear()
+            # Physical row ids start out equal to the logical rows
+            self._rows = IndexMap(row_count)
+            self._values = [{} for _ in range(self.col_count)]
+            self._styles = [{} for _ in range(self.col_count)]
+            if is_sparse_table(data):
+                style_ids = [self.style_table.intern(tuple(style))
+                             for style in data.get('styles') or [PLAIN_STYLE]]
+                for cell in data.get('cells', ()):
+                    row, col = cell[0], cell[1]
+                    if row < row_count and col < self.col_count:
+                        self._values[col][row] = str(cell[2])
+                        style_id = style_ids[cell[3]] if len(cell) > 3 else 0
+                        if style_id:
+                            self._styles[col][row] = style_id
+            else:
+                for row, col, cell_data in iter_cells(data):
+                    if row < row_count and col < self.col_count:
+                        cell = CellData.from_dict(cell_data)
+                        self._values[col][row] = cell.value
+                        style_id = self.style_table.intern_cell(cell)
+                        if style_id:
+                            self._styles[col][row] = style_id
+        finally:
+            self._lock.unlock()
@@ -1,6 +1,5 @@
 # project\comment\comment_table.py
 import re
-import collections
 import logging
 import csv
 import json
@@ -11,7 +10,7 @@ try:
 except ImportError:
     OPENPYXL_AVAILABLE = False
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QToolBar, QTableWidget, QTableWidgetItem,
+    QWidget, QVBoxLayout, QToolBar, QTableView, QTableWidgetSelectionRange,
     QLineEdit, QMessageBox, QAbstractItemView, QHeaderView, QApplication, QLabel,
     QStyledItemDelegate, QMenu, QListWidget, QSpinBox, QDialog, QFormLayout, 
     QPushButton, QHBoxLayout, QStyle, QFileDialog
@@ -23,12 +22,17 @@ from PySide6.QtGui import (
 )
 from PySide6.QtCore import Qt, QRectF, QPointF, Signal, QEvent, QItemSelection, QItemSelectionModel, QTimer
 from styles import colors, stylesheets
-from .comment_utils import FormulaParser, FUNCTION_HINTS, adjust_formula_references, col_str_to_int, col_int_to_str
-from .optimized_operations import OptimizedBatchDelete, OptimizedColumnAddition
-from .performance_config import MAX_COLUMNS, MAX_ROWS
+from .comment_utils import FUNCTION_HINTS, adjust_formula_references, shift_formula_references, col_str_to_int, col_int_to_str
+from .performance_config import MAX_COLUMNS, MAX_ROWS, PerformanceConfig
+from .recalc_engine import RecalcEngine
 from .export_handler import ExportHandler
 from .import_handler import ImportHandler
-from .virtual_spreadsheet import VirtualSpreadsheet
+from .cell_store import CellDiff
+from .undo_spill import DiffRecord
+from .spreadsheet_model import SpreadsheetModel
+from .render_cache import PaintStats, RenderCache
+from services.edit_service import EditService
+from services.table_codec import PLAIN_STYLE, make_cell, style_key
 
 logger = logging.getLogger(__name__)
 
@@ -100,20 +104,50 @@ class InsertQuantityDialog(QDialog):
 
 
 
-class ChangeCellCommand(QUndoCommand):
-    """An undo command for changing the data of one or more cells."""
-    def __init__(self, table, changes, text="Cell Change"):
+class CellDiffCommand(QUndoCommand):
+    """Base of the undo commands that keep their cells as a CellDiff, spilled to disk by EditService's UndoMemoryManager."""
+    def __init__(self, table, diff, text):
         super().__init__(text)
         self.table = table
-        self.changes = changes
+        self.diff_record = DiffRecord(diff)
+
+    @property
+    def diff(self):
+        return self.diff_record.get()
+
+    def journal_changes(self, undone):
+        """Returns the autosave journal record for the cells this command sets."""
+        return {'op': 'cells', 'cells': [[row, col, make_cell(value, style)]
+                                         for row, col, value, style in self.diff.cells(undone)]}
+
+class ChangeCellCommand(CellDiffCommand):
+    """An undo command for changing the data of one or more cells, given as (row, col, old, new) cell dicts."""
+    def __init__(self, table, changes, text="Cell Change"):
+        diff = CellDiff()
+        for row, col, old, new in changes:
+            diff.add(row, col, old.get('value', ''), style_key(old), new.get('value', ''), style_key(new))
+        super().__init__(table, diff, text)
 
     def redo(self):
-        self.table.apply_changes(self.changes)
+        self._apply(undone=False)
 
     def undo(self):
-        # Reverse changes: (row, col, old, new) -> (row, col, new, old)
-        reversed_changes = [(r, c, n, o) for r, c, o, n in self.changes]
-        self.table.apply_changes(reversed_changes)
+        self._apply(undone=True)
+
+    def _apply(self, undone):
+        self.table.apply_changes([(row, col, None, make_cell(value, style))
+                                  for row, col, value, style in self.diff.cells(undone)])
+
+class BulkEditCommand(CellDiffCommand):
+    """An undo command for a bulk edit (paste, fill, clear)."""
+    def __init__(self, table, diff, text="Bulk Edit"):
+        super().__init__(table, diff, text)
+
+    def redo(self):
+        self.table.apply_bulk_edit(self.diff)
+
+    def undo(self):
+        self.table.apply_bulk_edit(self.diff, undone=True)
 
 class ResizeCommand(QUndoCommand):
     """An undo command for adding/removing rows or columns."""
@@ -123,34 +157,50 @@ class ResizeCommand(QUndoCommand):
         self.action = action # 'add_row', 'remove_row', 'add_col', 'remove_col'
         self.index = index
         self.count = count
-        self.saved_data = [] # Used for undoing removals or additions
+        self.diff_record = None # Stored cells of removed rows/columns, restored on undo
+        self.rewrites = [] # (row, col) of the formulas the last redo/undo rewrote, for the journal
 
     def redo(self):
+        self.rewrites = []
         if 'add' in self.action:
-            # For add operations, save the data that's being replaced
-            self.saved_data = []
-            if self.action == 'add_row':
-                for c in range(self.table.columnCount()):
-                    item = self.table.item(self.index, c)
-                    self.saved_data.append(item.get_data() if item else {'value': ''})
-            elif self.action == 'add_col':
-                for r in range(self.table.rowCount()):
-                    item = self.table.item(r, self.index)
-                    self.saved_data.append(item.get_data() if item else {'value': ''})
-            self.table.perform_insert(self.action, self.index, self.count)
-        else:
-            self.saved_data = self.table.perform_remove(self.action, self.index)
+            self.table.perform_insert(self.action, self.index, self.count, rewrites=self.rewrites)
+            return
+        removed = self.table.perform_remove(self.action, self.index, self.count, rewrites=self.rewrites)
+        # A redo removes the same cells again, so the first removal's record stays valid
+        if self.diff_record is None:
+            diff = CellDiff()
+            for (row, col), cell in sorted(removed.items()):
+                diff.add(row, col, cell.value, style_key(vars(cell)), '', PLAIN_STYLE)
+            self.diff_record = DiffRecord(diff)
 
     def undo(self):
+        self.rewrites = []
         if 'add' in self.action:
             # Undo add = remove the same count that was added
-            remove_action = self.action.replace('add', 'remove')
-            for _ in range(self.count):
-                self.table.perform_remove(remove_action, self.index)
+            self.table.perform_remove(self.action.replace('add', 'remove'), self.index, self.count,
+                                      rewrites=self.rewrites)
         else:
             # Undo remove = insert and restore
             insert_action = self.action.replace('remove', 'add')
-            self.table.perform_insert_with_restore(insert_action, self.index, self.saved_data)
+            self.table.perform_insert_with_restore(insert_action, self.index,
+                                                   self.diff_record.get().cells(undone=True), self.count,
+                                                   rewrites=self.rewrites)
+
+    def journal_changes(self, undone):
+        """
+        Returns the autosave journal record of the structural edit, with the
+        cells an undone removal restored and the formulas the edit rewrote.
+        """
+        action = self.action
+        if undone:
+            action = action.replace('add', 'remove') if 'add' in action else action.replace('remove', 'add')
+        cells = []
+        if undone and 'remove' in self.action:
+            cells = [[row, col, make_cell(value, style)]
+                     for row, col, value, style in self.diff_record.get().cells(undone=True)]
+        cells.extend([row, col, make_cell(value, style)]
+                     for row, col, value, style in self.table.take_structural_rewrites(self.rewrites))
+        return {'op': 'resize', 'action': action, 'index': self.index, 'count': self.count, 'cells': cells}
 
 # --- End Undo Commands ---
 
@@ -159,7 +209,6 @@ class CommentTable(QWidget):
     A widget that provides a spreadsheet-like interface for comments,
     supporting formulas, cell referencing, and basic Excel features.
     """
-    VIRTUAL_SPREADSHEET_ROW_THRESHOLD = 20000
 
     def __init__(self, comment_data, main_window, common_menu, comment_service, parent=None):
         super().__init__(parent)
@@ -167,6 +216,8 @@ class CommentTable(QWidget):
         self.main_window = main_window
         self.common_menu = common_menu
         self.comment_service = comment_service
+        self.edit_service = EditService()
+        self._stack_id = f"comment_{self.comment_data['number']}"
 
         layout = QVBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)
@@ -175,6 +226,7 @@ class CommentTable(QWidget):
         toolbar = self._create_toolbar()
         self.formula_bar = QLineEdit()
         self.formula_bar.setPlaceholderText("Enter formula here")
+        # The model-backed Spreadsheet scales with the visible cells at any size
         self.table_widget = Spreadsheet(self, self.comment_service, self.comment_data['number'])
 
         # Initialize import/export handlers
@@ -184,7 +236,7 @@ class CommentTable(QWidget):
         layout.addWidget(toolbar)
         layout.addWidget(self.formula_bar)
         layout.addWidget(self.table_widget)
-        self._maybe_switch_to_virtual_spreadsheet()
+        self.edit_service.register_undo_stack(self._stack_id, self.table_widget.undo_stack)
 
         self._connect_signals()
 
@@ -230,19 +282,15 @@ class CommentTable(QWidget):
         self.table_widget.cellClicked.connect(self.handle_cell_click_for_formula)
 
     def _on_add_column(self):
-        self._maybe_switch_to_virtual_spreadsheet()
         self.table_widget.add_column()
 
     def _on_add_row(self):
-        self._maybe_switch_to_virtual_spreadsheet(force_if_near_threshold=True)
         self.table_widget.add_row()
 
     def _on_remove_column(self):
-        self._maybe_switch_to_virtual_spreadsheet()
         self.table_widget.remove_column()
 
     def _on_remove_row(self):
-        self._maybe_switch_to_virtual_spreadsheet()
         self.table_widget.remove_row()
 
     def _on_set_bold(self):
@@ -265,26 +313,9 @@ class CommentTable(QWidget):
         if hasattr(self.table_widget, 'set_background_color'):
             self.table_widget.set_background_color()
 
-    def _maybe_switch_to_virtual_spreadsheet(self, force_if_near_threshold=False):
-        if isinstance(self.table_widget, VirtualSpreadsheet):
-            return
-
-        row_count = self.table_widget.rowCount()
-        should_switch = row_count >= self.VIRTUAL_SPREADSHEET_ROW_THRESHOLD
-        if force_if_near_threshold:
-            should_switch = should_switch or row_count >= (self.VIRTUAL_SPREADSHEET_ROW_THRESHOLD - 1000)
-        if not should_switch:
-            return
-
-        self.table_widget.save_data_to_service()
-        old_table = self.table_widget
-        new_table = VirtualSpreadsheet(self, self.comment_service, self.comment_data['number'])
-        self.layout().replaceWidget(old_table, new_table)
-        old_table.hide()
-        old_table.deleteLater()
-        self.table_widget = new_table
-        self.table_widget.currentCellChanged.connect(self.update_formula_bar)
-        self.table_widget.cellClicked.connect(self.handle_cell_click_for_formula)
+    def cleanup(self):
+        """Clean up resources when the comment table is closed."""
+        self.edit_service.unregister_undo_stack(self._stack_id)
 
     def handle_cell_click_for_formula(self, row, column):
         if self.formula_bar.hasFocus() and self.formula_bar.text().startswith('='):
@@ -310,17 +341,30 @@ class CommentTable(QWidget):
                 command = ChangeCellCommand(self.table_widget, changes, "Edit Cell")
                 self.table_widget.undo_stack.push(command)
 
-class SpreadsheetItem(QTableWidgetItem):
-    def __init__(self, data=None):
-        super().__init__()
-        if data is None: data = {'value': ''}
-        self.set_data(data)
+class SpreadsheetItem:
+    """
+    QTableWidgetItem-like handle on one cell of a Spreadsheet. It holds no
+    data itself; reads and writes go to the table's model.
+    """
+    def __init__(self, table, row, col):
+        self._table = table
+        self._row = row
+        self._col = col
+
+    def row(self):
+        return self._row
+
+    def column(self):
+        return self._col
 
     def get_data(self):
-        return self.data(Qt.ItemDataRole.UserRole) or {'value': ''}
+        return self._table.model().cell_data(self._row, self._col)
 
     def set_data(self, data):
-        self.setData(Qt.ItemDataRole.UserRole, data)
+        self._table.set_cell_data(self._row, self._col, data)
+
+    def text(self):
+        return self._table.model().display_text(self._row, self._col)
 
 class ExcelHeaderView(QHeaderView):
     def __init__(self, orientation, parent=None):
@@ -345,13 +389,11 @@ class ExcelHeaderView(QHeaderView):
                     table.selectionModel().select(table.model().index(0, logicalIndex), QItemSelectionModel.SelectionFlag.Select | QItemSelectionModel.SelectionFlag.Columns)
             elif modifiers & Qt.KeyboardModifier.ShiftModifier:
                 # Shift+Click: Range select from first selected to clicked column
-                selected_columns = set()
-                for idx in table.selectedIndexes():
-                    selected_columns.add(idx.column())
+                selected_ranges = table.selectedRanges()
                 
-                if selected_columns:
-                    min_col = min(selected_columns)
-                    max_col = max(selected_columns)
+                if selected_ranges:
+                    min_col = min(r.leftColumn() for r in selected_ranges)
+                    max_col = max(r.rightColumn() for r in selected_ranges)
                     if logicalIndex < min_col:
                         start, end = logicalIndex, min_col
                     elif logicalIndex > max_col:
@@ -379,13 +421,11 @@ class ExcelHeaderView(QHeaderView):
                     table.selectionModel().select(table.model().index(logicalIndex, 0), QItemSelectionModel.SelectionFlag.Select | QItemSelectionModel.SelectionFlag.Rows)
             elif modifiers & Qt.KeyboardModifier.ShiftModifier:
                 # Shift+Click: Range select from first selected to clicked row
-                selected_rows = set()
-                for idx in table.selectedIndexes():
-                    selected_rows.add(idx.row())
+                selected_ranges = table.selectedRanges()
                 
-                if selected_rows:
-                    min_row = min(selected_rows)
-                    max_row = max(selected_rows)
+                if selected_ranges:
+                    min_row = min(r.topRow() for r in selected_ranges)
+                    max_row = max(r.bottomRow() for r in selected_ranges)
                     if logicalIndex < min_row:
                         start, end = logicalIndex, min_row
                     elif logicalIndex > max_row:
@@ -425,66 +465,72 @@ class SpreadsheetDelegate(QStyledItemDelegate):
                 command = ChangeCellCommand(table, changes, "Edit Cell")
                 table.undo_stack.push(command)
 
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Fonts, pens and colors per interned style, and laid-out cell texts
+        self.render_cache = RenderCache(
+            PerformanceConfig.MAX_CACHED_STATIC_TEXTS, colors.TEXT_PRIMARY, colors.BG_SPREADSHEET_CELL)
+        self.selection_background = QColor(colors.COLOR_SELECTION_FILL).lighter(150)
+        self.painted = 0  # Cells painted since the view last reset the counter
+
     def paint(self, painter, option, index):
-        """Custom paint method to ensure text visibility in selected cells."""
-        # Check if cell is selected
-        is_selected = option.state & QStyle.State_Selected
-        
-        # Get cell data
-        data = index.model().data(index, Qt.ItemDataRole.UserRole) or {'value': ''}
-        bg_color = data.get('bg_color')
-        text_color = data.get('text_color')
-        
-        # Draw background
-        if is_selected:
-            # For selected cells, use light green background
-            painter.fillRect(option.rect, QColor(colors.COLOR_SELECTION_FILL).lighter(150))
-        elif bg_color:
-            painter.fillRect(option.rect, QColor(bg_color))
-        else:
-            painter.fillRect(option.rect, QColor(colors.BG_SPREADSHEET_CELL))
-        
-        # For selected cells, ensure text color is dark for contrast
-        if is_selected:
-            # Use dark text (black) on light selection background for visibility
-            text_pen = QPen(colors.TEXT_DARK)
+        """
+        Paints a cell with the pooled font, pen and background of its style
+        and a cached QStaticText, keeping text readable in selected cells.
+        """
+        cache = self.render_cache
+        if option.font != cache.base_font:
+            cache.set_base_font(option.font)
+        model = index.model()
+        row, col = index.row(), index.column()
+        style_tuple = model.cell_style(row, col)
+        style = cache.style(style_tuple)
+        rect = option.rect
+
+        if option.state & QStyle.State_Selected:
+            # Light green background with dark text, for contrast
+            painter.fillRect(rect, self.selection_background)
+            painter.setPen(cache.pen(colors.TEXT_DARK))
         else:
-            # Use custom text color if set, otherwise use default
-            if text_color:
-                text_pen = QPen(QColor(text_color))
-            else:
-                text_pen = QPen(QColor(colors.TEXT_PRIMARY))
-        
-        # Get font
-        font = option.font
-        font_data = data.get('font', {})
-        font.setBold(font_data.get('bold', False))
-        font.setItalic(font_data.get('italic', False))
-        font.setUnderline(font_data.get('underline', False))
-        
-        # Draw text
-        painter.setFont(font)
-        painter.setPen(text_pen)
-        text_rect = option.rect.adjusted(3, 0, -3, 0)  # Add padding
-        # Use item.text() which contains the evaluated result, not the raw formula
-        # Get the item from the table to access the displayed text
-        table = self.parent()
-        if table:
-            item = table.item(index.row(), index.column())
-            display_text = item.text() if item else str(data.get('value', ''))
+            painter.fillRect(rect, style.background)
+            painter.setPen(style.text_pen)
+        self.painted += 1
+
+        # DisplayRole text: the evaluated result, not the raw formula
+        text = model.display_text(row, col)
+        if not text:
+            return
+        static = cache.static_text(text, style_tuple[0], style.font)
+        size = static.size()
+        text_rect = rect.adjusted(3, 0, -3, 0)  # Add padding
+        position = QPointF(text_rect.left(), text_rect.top() + (text_rect.height() - size.height()) / 2)
+        painter.setFont(style.font)
+        if size.width() > text_rect.width():
+            painter.save()
+            painter.setClipRect(text_rect, Qt.ClipOperation.IntersectClip)
+            painter.drawStaticText(position, static)
+            painter.restore()
         else:
-            display_text = str(data.get('value', ''))
-        painter.drawText(text_rect, Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, display_text)
+            painter.drawStaticText(position, static)
+
+class Spreadsheet(QTableView):
+    """
+    The comment spreadsheet. Cells live in a SpreadsheetModel over a sparse
+    cell store, so the view allocates nothing per cell; the QTableWidget-style
+    methods below (item, selectedRanges, setCurrentCell, ...) keep the
+    commands, handlers and CommentTable independent of that.
+    """
+    currentCellChanged = Signal(int, int, int, int)
+    cellClicked = Signal(int, int)
 
-class Spreadsheet(QTableWidget):
-    DEFERRED_RECALC_ROW_THRESHOLD = 10000
-    DEFERRED_RECALC_SCAN_ROW_CHUNK = 2000
-    DEFERRED_RECALC_FORMULA_CHUNK = 1000
+    # Text ending in a number, which fill drag counts up
+    TRAILING_NUMBER_REGEX = re.compile(r"^(.*?)(\d+)$")
 
     def __init__(self, parent=None, comment_service=None, comment_number=None):
-        super().__init__(1000, 2, parent)
+        super().__init__(parent)
         self.comment_service = comment_service
         self.comment_number = comment_number
+        self.setModel(SpreadsheetModel(parent=self))
         self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         self.setMouseTracking(True)
         self.hover_row = -1
@@ -494,17 +540,14 @@ class Spreadsheet(QTableWidget):
         self.setStyleSheet(stylesheets.get_spreadsheet_stylesheet())
         
         # Dependency Management
-        self.dependents = collections.defaultdict(set) # Key: (row, col), Value: Set of dependent (row, col)
-        self.precedents = collections.defaultdict(set) # Key: (row, col), Value: Set of precedent (row, col)
+        self.recalc = RecalcEngine(self) # Persistent dependency graph and dirty set
         self._evaluating = False # Flag to prevent recursion loops
         self._updates_deferred = False # Flag for batch operations
         self._deferred_start_shape = None
         self._pending_structural_ops = []  # Ordered ops: (action, index, count)
-        self._deferred_formula_recalc_scheduled = False
-        self._deferred_recalc_row_cursor = 0
-        self._deferred_formula_cells = []
-        self._deferred_formula_cursor = 0
-        self._deferred_recalc_phase = None
+        self._pending_rewrite_slots = []  # Per pending op: list receiving the rewritten (row, col), or None
+        self._formula_index_current = False  # self.recalc holds the formulas where they are
+        self._recalc_scheduled = False
 
         self._is_dragging_fill_handle = False
         self._drag_start_pos = None
@@ -537,13 +580,17 @@ class Spreadsheet(QTableWidget):
         self.setHorizontalHeader(ExcelHeaderView(Qt.Orientation.Horizontal, self))
         self.setVerticalHeader(ExcelHeaderView(Qt.Orientation.Vertical, self))
         self.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        # Uniform row heights, so the view never measures rows it does not show
+        self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
         self.delegate = SpreadsheetDelegate(self)
         self.setItemDelegate(self.delegate)
+        self._paint_stats = PaintStats(PerformanceConfig.VIEWPORT_FRAME_MS)
         if parent is not None:
             self.delegate.editingTextChanged.connect(parent.formula_bar.setText)
 
-        self.update_headers()
-        self.itemSelectionChanged.connect(self.on_selection_changed)
+        self.selectionModel().selectionChanged.connect(self.on_selection_changed)
+        self.selectionModel().currentChanged.connect(self._on_current_changed)
+        self.clicked.connect(lambda index: self.cellClicked.emit(index.row(), index.column()))
         if parent is not None:
             parent.formula_bar.textChanged.connect(self.on_formula_bar_text_changed)
 
@@ -558,6 +605,56 @@ class Spreadsheet(QTableWidget):
         self.verticalHeader().setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.verticalHeader().customContextMenuRequested.connect(self.show_header_context_menu)
 
+    # --- QTableWidget Compatibility ---
+
+    @property
+    def data_store(self):
+        return self.model().data_store
+
+    def rowCount(self):
+        return self.model().rowCount()
+
+    def columnCount(self):
+        return self.model().columnCount()
+
+    def setRowCount(self, rows):
+        self.model().set_shape(rows, self.columnCount())
+
+    def setColumnCount(self, cols):
+        self.model().set_shape(self.rowCount(), cols)
+
+    def item(self, row, col):
+        """Returns a SpreadsheetItem handle on a cell, or None outside the table."""
+        if 0 <= row < self.rowCount() and 0 <= col < self.columnCount():
+            return SpreadsheetItem(self, row, col)
+        return None
+
+    def currentRow(self):
+        return self.currentIndex().row()
+
+    def currentColumn(self):
+        return self.currentIndex().column()
+
+    def currentItem(self):
+        index = self.currentIndex()
+        return self.item(index.row(), index.column()) if index.isValid() else None
+
+    def setCurrentCell(self, row, col):
+        self.setCurrentIndex(self.model().index(row, col))
+
+    def selectedRanges(self):
+        return [QTableWidgetSelectionRange(r.top(), r.left(), r.bottom(), r.right())
+                for r in self.selectionModel().selection()]
+
+    def _on_current_changed(self, current, previous):
+        self.currentCellChanged.emit(current.row(), current.column(), previous.row(), previous.column())
+
+    def set_cell_data(self, row, col, data):
+        """Stores a cell dict and queues the recalculation of the formulas depending on it."""
+        self.model().set_cell_data(row, col, data)
+        self._sync_cell(row, col)
+        self._schedule_recalc()
+
     def set_updates_deferred(self, state):
         """
         Controls whether expensive operations like saving and evaluating
@@ -574,153 +671,144 @@ class Spreadsheet(QTableWidget):
             return
 
         shape_changed = self._deferred_start_shape != (self.rowCount(), self.columnCount())
-        has_pending_structural_ops = bool(self._pending_structural_ops)
+        # The shifts may already have been applied, e.g. to journal them
+        has_pending_structural_ops = bool(self._pending_structural_ops) or self.recalc.has_dirty()
         self._deferred_start_shape = None
 
         if has_pending_structural_ops or shape_changed:
-            self.update_headers()
-            if has_pending_structural_ops:
-                self._apply_pending_structural_formula_shifts()
-            self.save_data_to_service()
-            if has_pending_structural_ops:
-                self._schedule_deferred_formula_recalc()
-            else:
-                self.evaluate_all_cells()
+            self._finish_structural_edit()
 
-    def _buffer_structural_op(self, action, index, count=1):
-        """Buffer row/column structure changes until deferred mode flush."""
-        self._pending_structural_ops.append((action, index, count))
+    def _finish_structural_edit(self):
+        """
+        Applies the buffered row/column edits to the formulas, saves and
+        recalculates the formulas they affected; without a current
+        dependency graph every formula is re-evaluated.
+        """
+        self.update_headers()
+        self._apply_pending_structural_formula_shifts()
+        self.save_data_to_service()
+        if self._formula_index_current:
+            with self.model().batch():
+                self.recalc.recalculate()
+        else:
+            self.evaluate_all_cells()
 
     def _apply_pending_structural_formula_shifts(self):
-        """Apply all buffered row/column shifts across formulas in a single scan."""
+        """
+        Rewrites the formulas moved by the buffered row/column edits. While
+        the dependency graph matches the cells, only the formulas it finds
+        referring to a row or column at or after an edit are rewritten, and
+        the graph is moved along and left with them marked dirty; otherwise
+        the stored formulas are scanned.
+        """
         if not self._pending_structural_ops:
             return
 
-        self.blockSignals(True)
-        try:
-            for r in range(self.rowCount()):
-                for c in range(self.columnCount()):
-                    item = self.item(r, c)
-                    if not item:
-                        continue
-
-                    data = item.get_data()
-                    original_formula = str(data.get('value', ''))
-                    if not original_formula.startswith('='):
-                        continue
-
-                    updated_formula = original_formula
-                    for action, index, count in self._pending_structural_ops:
-                        if action == 'add_row':
-                            updated_formula = adjust_formula_references(
-                                updated_formula,
-                                row_offset=count,
-                                col_offset=0,
-                                min_row=index,
-                                min_col=0
-                            )
-                        elif action == 'remove_row':
-                            updated_formula = adjust_formula_references(
-                                updated_formula,
-                                row_offset=-count,
-                                col_offset=0,
-                                min_row=index,
-                                min_col=0,
-                                delete_row=index
-                            )
-                        elif action == 'add_col':
-                            updated_formula = adjust_formula_references(
-                                updated_formula,
-                                row_offset=0,
-                                col_offset=count,
-                                min_row=0,
-                                min_col=index
-                            )
-                        elif action == 'remove_col':
-                            updated_formula = adjust_formula_references(
-                                updated_formula,
-                                row_offset=0,
-                                col_offset=-count,
-                                min_row=0,
-                                min_col=index,
-                                delete_col=index
-                            )
-
-                    if updated_formula != original_formula:
-                        data['value'] = updated_formula
-                        item.set_data(data)
-        finally:
-            self.blockSignals(False)
-            self._pending_structural_ops.clear()
-
-    def _schedule_deferred_formula_recalc(self):
-        """Run full formula refresh in chunks for very large tables to keep UI responsive."""
-        if self._deferred_formula_recalc_scheduled:
-            return
-
-        if self.rowCount() < self.DEFERRED_RECALC_ROW_THRESHOLD:
-            self.evaluate_all_cells()
-            self.viewport().update()
+        ops = self._pending_structural_ops
+        self._pending_structural_ops = []
+        slots = self._pending_rewrite_slots
+        self._pending_rewrite_slots = []
+        model = self.model()
+        if self._formula_index_current:
+            candidates = []
+            for cell, text in self.recalc.formulas_reaching(*self._edit_thresholds(ops)):
+                position = self._position_after_edits(cell, ops)
+                if position is not None:
+                    candidates.append((position[0], position[1], '=' + text))
+        else:
+            candidates = model.iter_values()
+
+        shifted = []
+        for row, col, formula in candidates:
+            if row < 0 or not formula.startswith('='):
+                continue
+            updated_formula = shift_formula_references(formula, ops)
+            if updated_formula is not formula:
+                shifted.append((row, col, updated_formula))
+        # The last edit's slot receives the rewrites of all the edits flushed together
+        if slots and slots[-1] is not None:
+            slots[-1][:] = [(row, col) for row, col, _ in shifted]
+
+        with model.batch():
+            model.set_values(shifted)
+
+        if self._formula_index_current:
+            self.recalc.move_cells(lambda cell: self._position_after_edits(cell, ops))
+            # Rewritten formulas get their new references; the others that
+            # reach the edits keep absolute references to moved contents
+            self.recalc.set_formulas(((row, col), formula[1:]) for row, col, formula in shifted)
+            rewritten = {(row, col) for row, col, _ in shifted}
+            for row, col, _ in candidates:
+                if (row, col) not in rewritten:
+                    self.recalc.invalidate((row, col))
+
+    def take_structural_rewrites(self, slot):
+        """
+        Returns the formulas rewritten for the structural edit whose rewrites
+        list is slot, as (row, col, value, style tuple), and empties slot. The
+        formula shifts of deferred edits are applied first if slot belongs to
+        the last of them; the earlier ones return [], as their rewrites are
+        reported with the last.
+        """
+        pending = self._pending_rewrite_slots
+        if pending and pending[-1] is slot:
+            self._apply_pending_structural_formula_shifts()
+        positions = list(slot)
+        slot.clear()
+        values = self.model().data_store.get_styled_cells(positions)
+        return [(row, col, value, style) for (row, col), (value, style) in zip(positions, values)]
+
+    @staticmethod
+    def _edit_thresholds(ops):
+        """
+        Returns the first (row, col), in the positions before ops, whose
+        references the edits can move; None for an axis without edits.
+        """
+        min_row = min_col = None
+        added_rows = added_cols = 0
+        for action, index, count in ops:
+            if action.endswith('_row'):
+                first = index - added_rows
+                min_row = first if min_row is None else min(min_row, first)
+                if action == 'add_row':
+                    added_rows += count
+            else:
+                first = index - added_cols
+                min_col = first if min_col is None else min(min_col, first)
+                if action == 'add_col':
+                    added_cols += count
+        return min_row, min_col
+
+    @staticmethod
+    def _position_after_edits(cell, ops):
+        """Returns where a cell is after ops, or None if it was removed."""
+        row, col = cell
+        for action, index, count in ops:
+            if action == 'add_row' and row >= index:
+                row += count
+            elif action == 'add_col' and col >= index:
+                col += count
+            elif action == 'remove_row' and row >= index:
+                if row < index + count:
+                    return None
+                row -= count
+            elif action == 'remove_col' and col >= index:
+                if col < index + count:
+                    return None
+                col -= count
+        return row, col
+
+    def _schedule_recalc(self):
+        """Recalculates the dirty formulas once, when control returns to the event loop."""
+        if self._recalc_scheduled:
             return
+        self._recalc_scheduled = True
+        QTimer.singleShot(0, self._run_scheduled_recalc)
 
-        self._deferred_formula_recalc_scheduled = True
-        self._deferred_recalc_phase = 'scan'
-        self._deferred_recalc_row_cursor = 0
-        self._deferred_formula_cursor = 0
-        self._deferred_formula_cells = []
-        self.dependents.clear()
-        self.precedents.clear()
-        QTimer.singleShot(0, self._run_formula_recalc_chunk)
-
-    def _run_formula_recalc_chunk(self):
-        """Chunked full-table formula reevaluation for large structural operations."""
-        try:
-            if self._deferred_recalc_phase == 'scan':
-                row_end = min(
-                    self._deferred_recalc_row_cursor + self.DEFERRED_RECALC_SCAN_ROW_CHUNK,
-                    self.rowCount()
-                )
-                for r in range(self._deferred_recalc_row_cursor, row_end):
-                    for c in range(self.columnCount()):
-                        item = self.item(r, c)
-                        if not item:
-                            continue
-                        value = str(item.get_data().get('value', ''))
-                        if value.startswith('='):
-                            self._deferred_formula_cells.append((r, c))
-                        else:
-                            item.setText(value)
-
-                self._deferred_recalc_row_cursor = row_end
-                if self._deferred_recalc_row_cursor < self.rowCount():
-                    QTimer.singleShot(0, self._run_formula_recalc_chunk)
-                    return
-
-                self._deferred_recalc_phase = 'eval'
-
-            eval_end = min(
-                self._deferred_formula_cursor + self.DEFERRED_RECALC_FORMULA_CHUNK,
-                len(self._deferred_formula_cells)
-            )
-            for idx in range(self._deferred_formula_cursor, eval_end):
-                r, c = self._deferred_formula_cells[idx]
-                self.evaluate_cell(r, c, propagate=False)
-
-            self._deferred_formula_cursor = eval_end
-            if self._deferred_formula_cursor < len(self._deferred_formula_cells):
-                QTimer.singleShot(0, self._run_formula_recalc_chunk)
-                return
-
-            self._deferred_formula_recalc_scheduled = False
-            self._deferred_recalc_phase = None
-            self._deferred_formula_cells = []
-            self.viewport().update()
-        except Exception:
-            self._deferred_formula_recalc_scheduled = False
-            self._deferred_recalc_phase = None
-            self._deferred_formula_cells = []
-            self.evaluate_all_cells()
-            self.viewport().update()
+    def _run_scheduled_recalc(self):
+        self._recalc_scheduled = False
+        with self.model().batch():
+            self.recalc.recalculate()
 
     def eventFilter(self, obj, event):
         """Global event filter to hide popups when application loses focus."""
@@ -781,285 +869,190 @@ class Spreadsheet(QTableWidget):
         menu.exec(header.mapToGlobal(pos))
 
     # --- Dependency Graph Methods ---
-    
-    def add_dependency(self, dependent_cell, precedent_cell):
-        """
-        Called by FormulaParser when 'dependent_cell' reads 'precedent_cell'.
-        """
-        self.precedents[dependent_cell].add(precedent_cell)
-        self.dependents[precedent_cell].add(dependent_cell)
 
-    def clear_dependencies(self, cell):
-        """Clears outgoing dependencies for a cell before re-parsing."""
-        if cell in self.precedents:
-            for prec in self.precedents[cell]:
-                if cell in self.dependents[prec]:
-                    self.dependents[prec].remove(cell)
-            del self.precedents[cell]
+    def _sync_cell(self, row, col):
+        """Registers a cell's current content with the recalculation engine."""
+        raw_value = self.model().data_store.get_cell(row, col).value
+        if raw_value.startswith('='):
+            self.recalc.set_formula((row, col), raw_value[1:])
+        else:
+            # Not (or no longer) a formula: drop its references
+            self.recalc.set_formula((row, col), None)
+
+    def set_formula_result(self, row, col, result):
+        """Called by the recalculation engine with the evaluated result of a formula cell."""
+        self.model().set_formula_result(row, col, result)
 
     def evaluate_cell(self, row, col, propagate=True):
         """
-        Evaluates a specific cell, updates the graph, and optionally propagates updates.
+        Re-reads a cell and recalculates it and, if propagate is set, every
+        formula depending on it. Each affected cell is evaluated once, after
+        its precedents.
         """
-        item = self.item(row, col)
-        if not item: return
-
-        data = item.get_data()
-        raw_value = str(data.get('value', ''))
-        
-        if raw_value.startswith('='):
-            cell_coords = (row, col)
-            # 1. Clear old dependencies
-            self.clear_dependencies(cell_coords)
-            
-            # 2. Parse and Evaluate
-            try:
-                # Pass self (Spreadsheet) as the table interface
-                parser = FormulaParser(self, cell_coords) 
-                result = parser.evaluate(raw_value[1:])
-                
-                # Format Result
-                if isinstance(result, bool): item.setText(str(result).upper())
-                elif isinstance(result, float) and result.is_integer(): item.setText(str(int(result)))
-                else: item.setText(f"{result:.2f}" if isinstance(result, float) else str(result))
-            except Exception:
-                item.setText("#ERROR")
-        else:
-            # If it's not a formula, just show text
-            # Also clear dependencies because it's no longer a formula
-            self.clear_dependencies((row, col))
-            item.setText(raw_value)
-
-        # 3. Propagate to dependents
-        if propagate and (row, col) in self.dependents:
-            # Create a copy of the set to avoid "Set changed size during iteration" error
-            # when recursive calls modify the dependents set
-            for dep_row, dep_col in list(self.dependents[(row, col)]):
-                self.evaluate_cell(dep_row, dep_col, propagate=True)
+        if not self.item(row, col): return
+        self._sync_cell(row, col)
+        with self.model().batch():
+            self.recalc.recalculate(None if propagate else [(row, col)])
 
     def evaluate_all_cells(self):
         """
-        Evaluates all cells using Topological Sort to handle dependencies efficiently.
+        Rebuilds the dependency graph from every stored formula and
+        recalculates all formulas in topological order; cells on a cycle
+        show #CIRC!.
         """
-        # 1. Clear all dependencies and rebuild graph from scratch
-        self.dependents.clear()
-        self.precedents.clear()
-
-        # 2. First pass: Parse all formulas to build the dependency graph (without evaluating values yet if possible, 
-        #    but simplest is just to eval). 
-        #    However, to avoid double work, we can just queue cells.
-        
-        cells_with_formulas = []
-        for r in range(self.rowCount()):
-            for c in range(self.columnCount()):
-                item = self.item(r, c)
-                if item and str(item.get_data().get('value', '')).startswith('='):
-                    cells_with_formulas.append((r, c))
-                elif item:
-                    item.setText(str(item.get_data().get('value', '')))
-
-        # 3. Evaluation Loop (Simple approach with cycle detection)
-        # A true topological sort is better, but just evaluating standard cells first then formulas works often.
-        # Given the circular ref possibility, we'll just call evaluate_cell.
-        # To prevent infinite recursion during init, we rely on the parser.
-        
-        # Better approach: Just evaluate everything. The recursion in `evaluate_cell` 
-        # handles the order if we trigger it. But efficient way is:
-        # Evaluate cells with NO formulas first (done above).
-        # Then evaluate cells with formulas.
-        for r, c in cells_with_formulas:
-            self.evaluate_cell(r, c, propagate=False) 
-            # propagate=False because we are iterating everyone anyway, 
-            # though correct order matters.
-            
-        # Refined Approach: 
-        # To ensure correct order (A1 before B1 if B1=A1), we need to resolve deps.
-        # Since we cleared deps, we let `evaluate_cell` rebuild them.
-        # We might calculate a cell twice if we are not careful, but that's safer than O(N^2).
-        pass
+        model = self.model()
+        formulas = [((r, c), value[1:]) for r, c, value in model.iter_values()
+                    if r >= 0 and value.startswith('=')]
+        self.recalc.reset(formulas)
+        self._formula_index_current = True
+        with model.batch():
+            self.recalc.recalculate_parallel()
 
     # --- Data Operations ---
 
     def get_cell_value(self, row, col):
-        item = self.item(row, col)
-        if not item: return 0
-        text = item.text()
-        try: return float(text)
-        except: return text
+        """Value of a cell as seen by formulas: the result for formula cells."""
+        model = self.model()
+        text = model.formula_result(row, col)
+        if text is None:
+            text = model.data_store.get_cell(row, col).value
+            if not text:
+                return 0
+        try:
+            return float(text)
+        except ValueError:
+            return text
 
     def apply_changes(self, changes):
         """Applies a batch of cell changes and triggers updates."""
-        self.blockSignals(True)
-        affected_cells = []
-        for row, col, _, new_data in changes:
-            item = self.item(row, col)
-            if not item:
-                item = SpreadsheetItem()
-                self.setItem(row, col, item)
-            item.set_data(new_data)
-            affected_cells.append((row, col))
-        self.blockSignals(False)
-        
-        for r, c in affected_cells:
-            self.evaluate_cell(r, c)
-            
-        self.viewport().update()
+        model = self.model()
+        with model.batch():
+            for row, col, _, new_data in changes:
+                model.set_cell_data(row, col, new_data)
+            for row, col, _, _ in changes:
+                self._sync_cell(row, col)
+            self.recalc.recalculate()
+
         self.save_data_to_service()
 
-    def perform_insert(self, action, index, count=1):
-        self.blockSignals(True)
+    def perform_insert(self, action, index, count=1, restored=None, rewrites=None):
+        """
+        Inserts count rows or columns before index and shifts the formula
+        references behind them. restored, (row, col, value, style tuple)
+        cells removed by perform_remove, is written into the inserted rows
+        or columns. rewrites, a list, receives the (row, col) of the formulas
+        rewritten by the shift (see take_structural_rewrites).
+        """
+        model = self.model()
         if action == 'add_row':
-            for _ in range(count):
-                self.insertRow(index)
-            if self._updates_deferred:
-                self._buffer_structural_op('add_row', index, count)
-            else:
-                self.shift_formulas_for_insert_delete(row_threshold=index, row_shift=count)
+            model.insert_rows(index, count)
         elif action == 'add_col':
-            for _ in range(count):
-                self.insertColumn(index)
-            if self._updates_deferred:
-                self._buffer_structural_op('add_col', index, count)
-            else:
-                self.shift_formulas_for_insert_delete(col_threshold=index, col_shift=count)
-        
-        self.blockSignals(False)
-        
+            model.insert_columns(index, count)
+        self._pending_structural_ops.append((action, index, count))
+        self._pending_rewrite_slots.append(rewrites)
+
+        if restored is not None:
+            # Restored formulas already point where they did before the removal
+            self._apply_pending_structural_formula_shifts()
+            restored = list(restored)
+            with model.batch():
+                model.set_styled_cells(restored)
+            if self._formula_index_current:
+                self.recalc.set_formulas(((row, col), value[1:] if value.startswith('=') else None)
+                                         for row, col, value, _ in restored)
+
         if not self._updates_deferred:
-            self.update_headers()
-            self.save_data_to_service()
-            self.evaluate_all_cells()
+            self._finish_structural_edit()
 
-    def perform_remove(self, action, index):
-        self.blockSignals(True)
-        saved_data = []
-        
+    def perform_remove(self, action, index, count=1, rewrites=None):
+        """
+        Removes count rows or columns from index on; rewrites as for
+        perform_insert.
+
+        Returns:
+            dict: The stored cells of the removed rows or columns by their
+            former (row, col), for perform_insert_with_restore.
+        """
+        model = self.model()
+        positions = range(index, index + count)
         if action == 'remove_row':
-            # Save data for undo
-            for c in range(self.columnCount()):
-                item = self.item(index, c)
-                saved_data.append(item.get_data() if item else {'value': ''})
-            self.removeRow(index)
-            if self._updates_deferred:
-                self._buffer_structural_op('remove_row', index, 1)
-            else:
-                self.shift_formulas_for_insert_delete(row_threshold=index, row_shift=-1, deleted_row=index)
-            
-        elif action == 'remove_col':
-            for r in range(self.rowCount()):
-                item = self.item(r, index)
-                saved_data.append(item.get_data() if item else {'value': ''})
-            self.removeColumn(index)
-            if self._updates_deferred:
-                self._buffer_structural_op('remove_col', index, 1)
-            else:
-                self.shift_formulas_for_insert_delete(col_threshold=index, col_shift=-1, deleted_col=index)
+            saved_data = model.remove_rows(positions)
+        else:
+            saved_data = model.remove_columns(positions)
+        self._pending_structural_ops.append((action, index, count))
+        self._pending_rewrite_slots.append(rewrites)
 
-        self.blockSignals(False)
-        
         if not self._updates_deferred:
-            self.update_headers()
-            self.save_data_to_service()
-            self.evaluate_all_cells()
+            self._finish_structural_edit()
         return saved_data
 
-    def perform_insert_with_restore(self, action, index, saved_data):
+    def perform_insert_with_restore(self, action, index, restored, count=1, rewrites=None):
         # Used for undoing a delete
-        self.perform_insert(action, index, 1) # This handles the shift
-        # Now restore data
-        self.blockSignals(True)
-        if action == 'add_row':
-            for c, data in enumerate(saved_data):
-                item = self.item(index, c)
-                if not item: 
-                    item = SpreadsheetItem()
-                    self.setItem(index, c, item)
-                item.set_data(data)
-        elif action == 'add_col':
-             for r, data in enumerate(saved_data):
-                item = self.item(r, index)
-                if not item: 
-                    item = SpreadsheetItem()
-                    self.setItem(r, index, item)
-                item.set_data(data)
-        self.blockSignals(False)
-        
-        if not self._updates_deferred:
-            self.save_data_to_service()
-            self.evaluate_all_cells()
+        self.perform_insert(action, index, count, restored, rewrites)
 
-    def shift_formulas_for_insert_delete(self, row_threshold=0, col_threshold=0, row_shift=0, col_shift=0, deleted_row=-1, deleted_col=-1):
+    def bulk_edit(self, edits, text):
         """
-        Iterates over all cells and updates formulas to point to new locations.
+        Pushes (row, col, value, style tuple) edits as one BulkEditCommand; a
+        style of None keeps the cell's own. Cells outside the table and cells
+        the edit would not change are left out.
         """
-        for r in range(self.rowCount()):
-            for c in range(self.columnCount()):
-                item = self.item(r, c)
-                if not item: continue
-                
-                data = item.get_data()
-                val = str(data.get('value', ''))
-                
-                if val.startswith('='):
-                    new_formula = adjust_formula_references(
-                        val, 
-                        row_offset=row_shift, 
-                        col_offset=col_shift, 
-                        min_row=row_threshold, 
-                        min_col=col_threshold,
-                        delete_row=deleted_row,
-                        delete_col=deleted_col
-                    )
-                    if new_formula != val:
-                        data['value'] = new_formula
-                        item.set_data(data)
+        rows, cols = self.rowCount(), self.columnCount()
+        edits = [edit for edit in edits if 0 <= edit[0] < rows and 0 <= edit[1] < cols]
+        current = self.model().data_store.get_styled_cells([(edit[0], edit[1]) for edit in edits])
+        diff = CellDiff()
+        for (row, col, value, style), (old_value, old_style) in zip(edits, current):
+            if style is None:
+                style = old_style
+            if value != old_value or style != old_style:
+                diff.add(row, col, old_value, old_style, value, style)
+        if len(diff):
+            self.undo_stack.push(BulkEditCommand(self, diff, text))
+
+    def apply_bulk_edit(self, diff, undone=False):
+        """Writes one side of a CellDiff in one store write and recalculates the dirty formulas once."""
+        model = self.model()
+        with model.batch():
+            model.set_styled_cells(diff.cells(undone))
+            self.recalc.set_formulas(((row, col), value[1:] if value.startswith('=') else None)
+                                     for row, col, value in diff.changed_values(undone))
+            self.recalc.recalculate()
+
+        self.save_data_to_service()
+
+    def _clear_edits(self, top, bottom, left, right):
+        """Edits clearing the value of every stored, non-empty cell of a range."""
+        cells = self.model().data_store.get_visible_range(top, bottom, left, right)
+        return [(row, col, '', None) for (row, col), cell in sorted(cells.items()) if cell.value]
 
     def paste(self):
         selection = self.selectedRanges()
         if not selection: return
         start_row, start_col = selection[0].topRow(), selection[0].leftColumn()
 
-        clipboard_text = QApplication.clipboard().text()
+        clipboard_text = QApplication.clipboard().text().replace('\r\n', '\n')
         rows = clipboard_text.strip('\n').split('\n')
-        changes = []
-        
+
+        # Relative Reference Adjustment on Paste: the text clipboard holds no
+        # source coordinates, so an internal copy records them in EditService
+        row_offset = col_offset = None
+        from services.edit_service import ClipboardDataType
+        clipboard_data, clipboard_type, _ = self.parent().main_window.edit_service.get_clipboard()
+        if clipboard_type == ClipboardDataType.TABLE_CELLS and clipboard_data and 'is_spreadsheet' in clipboard_data:
+            row_offset = start_row - clipboard_data['start_row']
+            col_offset = start_col - clipboard_data['start_col']
+
+        edits = []
         for r_idx, row_text in enumerate(rows):
-            cols = row_text.split('\t')
-            for c_idx, val in enumerate(cols):
-                target_row, target_col = start_row + r_idx, start_col + c_idx
-                if target_row < self.rowCount() and target_col < self.columnCount():
-                    item = self.item(target_row, target_col)
-                    old_data = item.get_data() if item else {'value': ''}
-                    new_data = old_data.copy()
-                    
-                    # Intelligent Paste: Adjust relative references
-                    # We assume the copy source was (0,0) relative to the clipboard structure
-                    # This is a simplification. A full Excel clone stores source coords in clipboard.
-                    # For now, we just set value. Real relative paste requires knowing source indices.
-                    # Assuming simple text paste for now, but if it looks like formula, we paste as is?
-                    # Problem: "Relative Reference Adjustment on Paste" requested.
-                    # Limitation: Standard text clipboard doesn't hold source coordinates.
-                    # Solution: Use EditService for internal copy to track source row/col.
-                    
-                    from services.edit_service import ClipboardDataType
-                    clipboard_data, clipboard_type, _ = self.parent().main_window.edit_service.get_clipboard()
-                    if clipboard_type == ClipboardDataType.TABLE_CELLS and clipboard_data and 'is_spreadsheet' in clipboard_data:
-                        source_data = clipboard_data
-                        # Use internal logic if available
-                        src_r = source_data['start_row'] + r_idx
-                        src_c = source_data['start_col'] + c_idx
-                        # Calculate offset
-                        row_offset = target_row - src_r
-                        col_offset = target_col - src_c
-                        
-                        if val.startswith('='):
-                            val = adjust_formula_references(val, row_offset, col_offset)
-
-                    new_data['value'] = val
-                    changes.append((target_row, target_col, old_data, new_data))
-
-        if changes:
-            self.undo_stack.push(ChangeCellCommand(self, changes, "Paste"))
+            target_row = start_row + r_idx
+            if target_row >= self.rowCount(): break
+            for c_idx, val in enumerate(row_text.split('\t')):
+                target_col = start_col + c_idx
+                if target_col >= self.columnCount(): break
+                if row_offset is not None and val.startswith('='):
+                    val = adjust_formula_references(val, row_offset, col_offset)
+                edits.append((target_row, target_col, val, None))
+
+        self.bulk_edit(edits, "Paste")
 
     def copy(self):
         selection = self.selectedRanges()
@@ -1075,12 +1068,12 @@ class Spreadsheet(QTableWidget):
             'start_col': c1
         }, ClipboardDataType.TABLE_CELLS)
         
+        store = self.model().data_store
         text = ""
         for r in range(r1, r2 + 1):
             row_data = []
             for c in range(c1, c2 + 1):
-                item = self.item(r, c)
-                row_data.append(str(item.get_data().get('value', '')) if item else "")
+                row_data.append(store.get_cell(r, c).value)
             text += "\t".join(row_data) + "\n"
         QApplication.clipboard().setText(text)
 
@@ -1091,18 +1084,10 @@ class Spreadsheet(QTableWidget):
     def delete(self):
         selection = self.selectedRanges()
         if not selection: return
-        changes = []
+        edits = []
         for r in selection:
-            for row in range(r.topRow(), r.bottomRow() + 1):
-                for col in range(r.leftColumn(), r.rightColumn() + 1):
-                    item = self.item(row, col)
-                    if item and item.get_data().get('value'):
-                        old = item.get_data()
-                        new = old.copy()
-                        new['value'] = ''
-                        changes.append((row, col, old, new))
-        if changes:
-            self.undo_stack.push(ChangeCellCommand(self, changes, "Delete"))
+            edits.extend(self._clear_edits(r.topRow(), r.bottomRow(), r.leftColumn(), r.rightColumn()))
+        self.bulk_edit(edits, "Delete")
     
     def undo(self):
         self.set_updates_deferred(True)
@@ -1118,34 +1103,37 @@ class Spreadsheet(QTableWidget):
         if not self.comment_service: return
         table_data = self.comment_service.get_table_data(self.comment_number)
         if not table_data: return
+        self.load_table_data(table_data)
 
-        self.setRowCount(len(table_data))
-        self.setColumnCount(len(table_data[0]) if table_data else 0)
-        self.update_headers()
-
-        self.blockSignals(True)
-        for r, row in enumerate(table_data):
-            for c, cell_data in enumerate(row):
-                item = self.item(r, c) or SpreadsheetItem()
-                self.setItem(r, c, item)
-                item.set_data(cell_data)
-        self.blockSignals(False)
+    def load_table_data(self, table_data):
+        """Replaces every cell with table data (sparse or dense) and recalculates."""
+        self.model().load(table_data)
         self.evaluate_all_cells()
 
+    def write_styled_cells(self, cells):
+        """
+        Writes (row, col, value, style tuple) cells in one store write, growing
+        the table to fit them. Nothing is recalculated; bulk loaders such as the
+        Excel import call evaluate_all_cells once at the end.
+        """
+        if not cells: return
+        model = self.model()
+        model.set_shape(max(model.rowCount(), max(cell[0] for cell in cells) + 1),
+                        max(model.columnCount(), max(cell[1] for cell in cells) + 1))
+        with model.batch():
+            model.set_styled_cells(cells)
+        self._formula_index_current = False
+
     def save_data_to_service(self):
         if not self.comment_service: return
-        data = []
-        for r in range(self.rowCount()):
-            row_d = []
-            for c in range(self.columnCount()):
-                item = self.item(r, c)
-                row_d.append(item.get_data() if item else {'value': ''})
-            data.append(row_d)
-        self.comment_service.update_table_data(self.comment_number, data)
+        self.comment_service.update_table_data(self.comment_number, self.model().data_store.get_sparse_data())
 
     def update_headers(self):
-        self.setHorizontalHeaderLabels([col_int_to_str(i) for i in range(self.columnCount())])
-        self.setVerticalHeaderLabels([str(i+1) for i in range(self.rowCount())])
+        model = self.model()
+        if model.columnCount():
+            model.headerDataChanged.emit(Qt.Orientation.Horizontal, 0, model.columnCount() - 1)
+        if model.rowCount():
+            model.headerDataChanged.emit(Qt.Orientation.Vertical, 0, model.rowCount() - 1)
 
     def get_cell_ref_str(self, row, col):
         return f"{col_int_to_str(col)}{row + 1}"
@@ -1170,11 +1158,7 @@ class Spreadsheet(QTableWidget):
             QMessageBox.warning(self, "Limit", f"Max {MAX_COLUMNS} columns allowed.")
             return
         
-        # Use optimized addition for tables with many rows
-        if self.rowCount() > 10000 and count > 1:
-            OptimizedColumnAddition.add_columns_optimized(self, idx, count, show_progress=True)
-        else:
-            self.undo_stack.push(ResizeCommand(self, 'add_col', idx, count))
+        self.insert_columns(idx, count)
 
     def add_row(self):
         # Insert at current selection if available, else insert BEFORE current index
@@ -1196,7 +1180,7 @@ class Spreadsheet(QTableWidget):
             QMessageBox.warning(self, "Limit", f"Max {MAX_ROWS:,} rows allowed.")
             return
             
-        self.undo_stack.push(ResizeCommand(self, 'add_row', idx, count))
+        self.insert_rows(idx, count)
 
     def remove_column(self, index=None):
         # FIX: Ensure index is strictly an int and not bool (from signal)
@@ -1229,18 +1213,7 @@ class Spreadsheet(QTableWidget):
             if not cols_to_remove and self.currentColumn() >= 0:
                  cols_to_remove.add(self.currentColumn())
 
-        sorted_cols = sorted(list(cols_to_remove), reverse=True)
-        if not sorted_cols: return
-
-        self.set_updates_deferred(True)
-        self.undo_stack.beginMacro("Delete Columns")
-        try:
-            for c in sorted_cols:
-                if self.columnCount() > 0:
-                    self.undo_stack.push(ResizeCommand(self, 'remove_col', c))
-        finally:
-            self.undo_stack.endMacro()
-            self.set_updates_deferred(False)
+        self.remove_columns(cols_to_remove)
 
     def remove_row(self, index=None):
         # FIX: Ensure index is strictly an int and not bool (from signal)
@@ -1265,23 +1238,42 @@ class Spreadsheet(QTableWidget):
             if not rows_to_remove and self.currentRow() >= 0:
                  rows_to_remove.add(self.currentRow())
 
-        sorted_rows = sorted(list(rows_to_remove), reverse=True)
-        if not sorted_rows: return
+        self.remove_rows(rows_to_remove)
 
-        # Use optimized batch deletion for large operations
-        if len(sorted_rows) > 100 or (len(sorted_rows) > 10 and self.rowCount() > 10000):
-            OptimizedBatchDelete.delete_multiple_rows_optimized(self, sorted_rows, show_progress=True)
-        else:
-            # Standard deletion for small batches
-            self.set_updates_deferred(True)
-            self.undo_stack.beginMacro("Delete Rows")
-            try:
-                for r in sorted_rows:
-                    if self.rowCount() > 0:
-                        self.undo_stack.push(ResizeCommand(self, 'remove_row', r))
-            finally:
-                self.undo_stack.endMacro()
-                self.set_updates_deferred(False)
+    def insert_rows(self, index, count):
+        """Inserts count empty rows before index as one undoable edit."""
+        self.undo_stack.push(ResizeCommand(self, 'add_row', index, count))
+
+    def insert_columns(self, index, count):
+        """Inserts count empty columns before index as one undoable edit."""
+        self.undo_stack.push(ResizeCommand(self, 'add_col', index, count))
+
+    def remove_rows(self, rows):
+        """Removes the given rows as one undoable edit."""
+        self._remove_blocks('remove_row', rows, self.rowCount(), "Delete Rows")
+
+    def remove_columns(self, cols):
+        """Removes the given columns as one undoable edit."""
+        self._remove_blocks('remove_col', cols, self.columnCount(), "Delete Columns")
+
+    def _remove_blocks(self, action, positions, limit, text):
+        """Pushes one ResizeCommand per block of adjacent positions, last block first."""
+        blocks = []
+        for pos in sorted({p for p in positions if 0 <= p < limit}, reverse=True):
+            if blocks and blocks[-1][0] == pos + 1:
+                blocks[-1][0] = pos
+            else:
+                blocks.append([pos, pos])
+        if not blocks: return
+
+        self.set_updates_deferred(True)
+        self.undo_stack.beginMacro(text)
+        try:
+            for first, last in blocks:
+                self.undo_stack.push(ResizeCommand(self, action, first, last - first + 1))
+        finally:
+            self.undo_stack.endMacro()
+            self.set_updates_deferred(False)
 
     def insert_column(self, index):
         # Context menu insert - show dialog to ask how many columns
@@ -1297,7 +1289,7 @@ class Spreadsheet(QTableWidget):
             QMessageBox.warning(self, "Limit", f"Max {MAX_COLUMNS} columns allowed.")
             return
         
-        self.undo_stack.push(ResizeCommand(self, 'add_col', index, count))
+        self.insert_columns(index, count)
 
     def insert_row(self, index):
         # Context menu insert - show dialog to ask how many rows
@@ -1313,46 +1305,29 @@ class Spreadsheet(QTableWidget):
             QMessageBox.warning(self, "Limit", f"Max {MAX_ROWS:,} rows allowed.")
             return
         
-        self.undo_stack.push(ResizeCommand(self, 'add_row', index, count))
+        self.insert_rows(index, count)
 
     def clear_column_contents(self, index):
-        changes = []
-        for r in range(self.rowCount()):
-            item = self.item(r, index)
-            if item:
-                old_data = item.get_data()
-                if old_data.get('value'):
-                    new_data = old_data.copy()
-                    new_data['value'] = ''
-                    changes.append((r, index, old_data, new_data))
-        if changes:
-            self.undo_stack.push(ChangeCellCommand(self, changes, "Clear Column Contents"))
+        self.bulk_edit(self._clear_edits(0, self.rowCount() - 1, index, index), "Clear Column Contents")
 
     def clear_row_contents(self, index):
-        changes = []
-        for c in range(self.columnCount()):
-            item = self.item(index, c)
-            if item:
-                old_data = item.get_data()
-                if old_data.get('value'):
-                    new_data = old_data.copy()
-                    new_data['value'] = ''
-                    changes.append((index, c, old_data, new_data))
-        if changes:
-            self.undo_stack.push(ChangeCellCommand(self, changes, "Clear Row Contents"))
+        self.bulk_edit(self._clear_edits(index, index, 0, self.columnCount() - 1), "Clear Row Contents")
 
     def set_bold(self): self._toggle_font('bold')
     def set_italic(self): self._toggle_font('italic')
     def set_underline(self): self._toggle_font('underline')
     def _toggle_font(self, p):
         changes = []
-        for i in self.selectedItems():
-            o = i.get_data()
-            n = o.copy()
-            if 'font' not in n:
-                n['font'] = {}
-            n['font'][p] = not n['font'].get(p, False)
-            changes.append((i.row(), i.column(), o, n))
+        store = self.model().data_store
+        # The stored cells of the selection, as the selected items used to be
+        for r in self.selectedRanges():
+            cells = store.get_visible_range(r.topRow(), r.bottomRow(), r.leftColumn(), r.rightColumn())
+            for (row, col), cell in sorted(cells.items()):
+                o = cell.to_dict()
+                n = o.copy()
+                n['font'] = dict(n['font'])
+                n['font'][p] = not n['font'].get(p, False)
+                changes.append((row, col, o, n))
         if changes: self.undo_stack.push(ChangeCellCommand(self, changes, f"Toggle {p}"))
 
     def set_text_color(self): self._set_color('text_color')
@@ -1367,24 +1342,19 @@ class Spreadsheet(QTableWidget):
         color_value = None if is_no_fill else c.name()
         
         # Apply color to all cells in selected ranges, not just cells with content
+        model = self.model()
         selected_ranges = self.selectedRanges()
         for range_obj in selected_ranges:
             for row in range(range_obj.topRow(), range_obj.bottomRow() + 1):
                 for col in range(range_obj.leftColumn(), range_obj.rightColumn() + 1):
-                    # Get or create item using SpreadsheetItem (custom item class)
-                    item = self.item(row, col)
-                    if item is None:
-                        item = SpreadsheetItem()
-                        self.setItem(row, col, item)
-                    
-                    o = item.get_data()
+                    o = model.cell_data(row, col)
                     n = o.copy()
                     n[p] = color_value
                     changes.append((row, col, o, n))
         
         if changes: self.undo_stack.push(ChangeCellCommand(self, changes, "Color"))
     
-    def on_selection_changed(self):
+    def on_selection_changed(self, *_):
         self.viewport().update()
         self.parent().formula_bar.setText("")
         self.formula_hint.hide()
@@ -1459,8 +1429,38 @@ class Spreadsheet(QTableWidget):
         editor.setCursorPosition(len(new_text))
         self.completer_popup.hide()
 
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._resize_caches()
+
+    def _resize_caches(self):
+        """Size the text cache to the PerformanceConfig limit, but never below a few viewports."""
+        viewport = self.viewport()
+        rows = viewport.height() // max(1, self.verticalHeader().defaultSectionSize()) + 1
+        cols = viewport.width() // max(1, self.horizontalHeader().minimumSectionSize()) + 1
+        self.delegate.render_cache.resize(max(PerformanceConfig.MAX_CACHED_STATIC_TEXTS,
+                                              rows * cols * PerformanceConfig.CACHE_MIN_VIEWPORTS))
+
+    def cache_stats(self):
+        """Return the size and hit/miss counters of the render cache."""
+        return {'render': self.delegate.render_cache.stats()}
+
+    def paint_stats(self):
+        """Return the paint-time counters: frames, cells painted, last/max/average ms, frames over budget."""
+        return self._paint_stats.stats()
+
+    def reset_paint_stats(self):
+        self._paint_stats.reset()
+
     def paintEvent(self, event):
+        started = self._paint_stats.start()
+        self.delegate.painted = 0
         super().paintEvent(event)
+        self._paint_overlays()
+        self._paint_stats.finish(started, self.delegate.painted)
+
+    def _paint_overlays(self):
+        """Draws hover, reference highlights, the selection border and the fill handle over the cells."""
         painter = QPainter(self.viewport())
         
         # Draw hover effect
@@ -1605,75 +1605,52 @@ class Spreadsheet(QTableWidget):
         selected_ranges = self.selectedRanges()
         if not selected_ranges: return
         source_range = selected_ranges[0]
+        top, bottom = source_range.topRow(), source_range.bottomRow()
+        left, right = source_range.leftColumn(), source_range.rightColumn()
         
         # Determine direction
-        rows_ext = end_row - source_range.bottomRow()
-        cols_ext = end_col - source_range.rightColumn()
-        
-        changes = []
+        rows_ext = end_row - bottom
+        cols_ext = end_col - right
         
+        # (target_row, target_col, source_row, source_col, step)
         if rows_ext > 0 and (rows_ext >= cols_ext or cols_ext <= 0):
             # Fill Down
-            fill_rows = range(source_range.bottomRow() + 1, end_row + 1)
-            for col in range(source_range.leftColumn(), source_range.rightColumn() + 1):
-                for i, target_row in enumerate(fill_rows, 1):
-                    source_row = source_range.topRow() + (i - 1) % source_range.rowCount()
-                    source_item = self.item(source_row, col)
-                    source_data = source_item.get_data() if source_item else {'value': ''}
-                    source_text = str(source_data.get('value', ''))
-                    new_data = source_data.copy()
-                    
-                    if source_text.startswith('='):
-                        new_data['value'] = adjust_formula_references(source_text, target_row - source_row, 0)
-                    else:
-                        match = re.match(r"^(.*?)(\d+)$", source_text)
-                        if match:
-                            prefix, num_str = match.groups()
-                            new_value = int(num_str) + i
-                            new_data['value'] = f"{prefix}{new_value}"
-                        else:
-                            new_data['value'] = source_text
-                            
-                    target_item = self.item(target_row, col)
-                    old_data = target_item.get_data() if target_item else {'value': ''}
-                    changes.append((target_row, col, old_data, new_data))
-                    
+            targets = [(target_row, col, top + (i - 1) % source_range.rowCount(), col, i)
+                       for col in range(left, right + 1)
+                       for i, target_row in enumerate(range(bottom + 1, end_row + 1), 1)]
         elif cols_ext > 0 and (cols_ext > rows_ext or rows_ext <= 0):
             # Fill Right
-            fill_cols = range(source_range.rightColumn() + 1, end_col + 1)
-            for row in range(source_range.topRow(), source_range.bottomRow() + 1):
-                for i, target_col in enumerate(fill_cols, 1):
-                    source_col = source_range.leftColumn() + (i - 1) % source_range.columnCount()
-                    source_item = self.item(row, source_col)
-                    source_data = source_item.get_data() if source_item else {'value': ''}
-                    source_text = str(source_data.get('value', ''))
-                    new_data = source_data.copy()
-                    
-                    if source_text.startswith('='):
-                        new_data['value'] = adjust_formula_references(source_text, 0, target_col - source_col)
-                    else:
-                        match = re.match(r"^(.*?)(\d+)$", source_text)
-                        if match:
-                            prefix, num_str = match.groups()
-                            new_value = int(num_str) + i
-                            new_data['value'] = f"{prefix}{new_value}"
-                        else:
-                            new_data['value'] = source_text
-                            
-                    target_item = self.item(row, target_col)
-                    old_data = target_item.get_data() if target_item else {'value': ''}
-                    changes.append((row, target_col, old_data, new_data))
-
-        if changes:
-            command = ChangeCellCommand(self, changes, "Fill Drag")
-            self.undo_stack.push(command)
+            targets = [(row, target_col, row, left + (i - 1) % source_range.columnCount(), i)
+                       for row in range(top, bottom + 1)
+                       for i, target_col in enumerate(range(right + 1, end_col + 1), 1)]
+        else:
+            return
+
+        positions = [(r, c) for r in range(top, bottom + 1) for c in range(left, right + 1)]
+        sources = dict(zip(positions, self.model().data_store.get_styled_cells(positions)))
+        edits = []
+        for target_row, target_col, source_row, source_col, i in targets:
+            source_text, style = sources[(source_row, source_col)]
+            if source_text.startswith('='):
+                new_value = adjust_formula_references(source_text, target_row - source_row, target_col - source_col)
+            else:
+                match = self.TRAILING_NUMBER_REGEX.match(source_text)
+                if match:
+                    prefix, num_str = match.groups()
+                    new_value = f"{prefix}{int(num_str) + i}"
+                else:
+                    new_value = source_text
+            edits.append((target_row, target_col, new_value, style))
+
+        self.bulk_edit(edits, "Fill Drag")
 
     def trace_precedents(self):
-        current_item = self.currentItem()
-        if not current_item: return
-        cell = (current_item.row(), current_item.column())
-        if cell in self.precedents:
-            self.highlighted_cells.update(self.precedents[cell])
+        index = self.currentIndex()
+        if not index.isValid(): return
+        cell = (index.row(), index.column())
+        precedents = self.recalc.precedents_of(cell)
+        if precedents:
+            self.highlighted_cells.update(precedents)
             self.viewport().update()
 
     def clear_highlights(self):
@@ -1,5 +1,6 @@
 # project\comment\comment_utils.py
 import re
+import functools
 import statistics
 import operator
 import math
@@ -73,140 +74,630 @@ def adjust_formula_references(formula, row_offset, col_offset, min_row=0, min_co
     if not formula.startswith('='):
         return formula
 
-    # Use re.IGNORECASE flag to match both uppercase and lowercase cell references
-    ref_regex = re.compile(r"(\$?[A-Za-z]+)(\$?\d+)")
-
-    def replacement(match):
-        col_part = match.group(1)
-        row_part = match.group(2)
-        
-        # Check if column is absolute (starts with $)
-        is_col_absolute = col_part.startswith('$')
-        # Check if row is absolute (contains $)
-        is_row_absolute = row_part.startswith('$')
-        
-        # Extract column letter (without $) and row number (without $)
-        col_letter = col_part.lstrip('$')
-        row_number = row_part.lstrip('$')
-        
-        col_idx = col_str_to_int(col_letter)
-        row_idx = int(row_number) - 1
+    def replacement(ref):
+        col_absolute, col_idx, row_absolute, row_idx = ref
 
         # Check for deleted row/column references
         if (delete_row != -1 and row_idx == delete_row) or \
            (delete_col != -1 and col_idx == delete_col):
-            return "#REF!"
+            return None
 
         # Only shift row if it's not absolute and >= threshold
-        if not is_row_absolute and row_idx >= min_row:
+        if not row_absolute and row_idx >= min_row:
             row_idx += row_offset
         # Only shift column if it's not absolute and >= threshold
-        if not is_col_absolute and col_idx >= min_col:
+        if not col_absolute and col_idx >= min_col:
             col_idx += col_offset
-            
-        if row_idx < 0 or col_idx < 0:
-            return "#REF!"
-        
-        # Reconstruct reference with proper $ markers
-        col_str = ('$' if is_col_absolute else '') + col_int_to_str(col_idx)
-        row_str = ('$' if is_row_absolute else '') + str(row_idx + 1)
-        return f"{col_str}{row_str}"
-
-    parts = re.split(r'("[^"]*")', formula)
-    for i, part in enumerate(parts):
-        if not part.startswith('"'):
-            parts[i] = ref_regex.sub(replacement, part)
-    
+        return (col_absolute, col_idx, row_absolute, row_idx)
+
+    return _render_references(reference_tokens(formula), replacement)
+
+
+def shift_formula_references(formula, edits):
+    """
+    Rewrites the references of a formula for a sequence of structural edits,
+    in one pass over its cached reference tokens.
+
+    Args:
+        formula: Cell text, starting with '='.
+        edits: (action, index, count) in the order they were made; action is
+            'add_row', 'remove_row', 'add_col' or 'remove_col', and a removal
+            removes count rows or columns from index on. References to removed
+            cells become #REF!; absolute ($) rows and columns are not shifted.
+
+    Returns:
+        str: The rewritten formula, or formula itself if no reference moved.
+    """
+    tokens = reference_tokens(formula)
+    moved = False
+
+    def replacement(ref):
+        nonlocal moved
+        col_absolute, col_idx, row_absolute, row_idx = ref
+        for action, index, count in edits:
+            if action == 'add_row':
+                if not row_absolute and row_idx >= index:
+                    row_idx += count
+            elif action == 'remove_row':
+                if index <= row_idx < index + count:
+                    row_idx = -1
+                    break
+                if not row_absolute and row_idx >= index:
+                    row_idx -= count
+            elif action == 'add_col':
+                if not col_absolute and col_idx >= index:
+                    col_idx += count
+            elif action == 'remove_col':
+                if index <= col_idx < index + count:
+                    col_idx = -1
+                    break
+                if not col_absolute and col_idx >= index:
+                    col_idx -= count
+        new_ref = (col_absolute, col_idx, row_absolute, row_idx)
+        moved = moved or new_ref != ref
+        return new_ref
+
+    rewritten = _render_references(tokens, replacement)
+    return rewritten if moved else formula
+
+
+TOKEN_SPECIFICATION = [
+    ('FUNCTION',  r'[A-Z][A-Z0-9_]*\('),
+    ('CELLRANGE', r'\$?[A-Z]+\$?[0-9]+:\$?[A-Z]+\$?[0-9]+'),
+    ('CELL',      r'\$?[A-Z]+\$?[0-9]+'),
+    ('NUMBER',    r'[0-9]+(\.[0-9]*)?'),
+    ('BOOLEAN',   r'TRUE|FALSE'),
+    ('STRING',    r'"[^"]*"'),
+    ('OP_CMP',    r'<=|>=|<>|!=|==|<|>|='), 
+    ('OP_ADD',    r'[\+\-]'),
+    ('OP_MUL',    r'[\*/]'),
+    ('OP_POW',    r'\^'),
+    ('LPAREN',    r'\('),
+    ('RPAREN',    r'\)'),
+    ('COMMA',     r','),
+    ('WHITESPACE',r'\s+'),
+    ('IDENTIFIER',r'[A-Z][A-Z0-9_]*'), # Catch-all for text like 'SUM' without parens or 's'
+    ('MISMATCH',  r'.'),
+]
+TOKEN_REGEX = re.compile('|'.join('(?P<%s>%s)' % pair for pair in TOKEN_SPECIFICATION), re.IGNORECASE)
+CELL_REF_REGEX = re.compile(r"([A-Z]+)(\d+)")
+
+# Number of distinct formula texts whose compiled form is kept
+COMPILED_FORMULA_CACHE_SIZE = 100000
+
+
+def tokenize_formula(expression):
+    """Splits a formula (without the leading '=') into (kind, value) tokens."""
+    tokens = []
+    for mo in TOKEN_REGEX.finditer(expression):
+        kind = mo.lastgroup
+        value = mo.group()
+        if kind == 'WHITESPACE':
+            continue
+        if kind == 'FUNCTION':
+            tokens.append((kind, value[:-1].upper()))
+            tokens.append(('LPAREN', '('))
+        elif kind == 'STRING':
+            tokens.append((kind, value[1:-1]))
+        elif kind == 'BOOLEAN':
+            tokens.append((kind, value.upper() == 'TRUE'))
+        elif kind == 'NUMBER':
+            tokens.append((kind, float(value)))
+        elif kind == 'IDENTIFIER':
+            # Keep it as is, will raise #NAME? in parser
+            tokens.append((kind, value))
+        elif kind == 'MISMATCH':
+            raise ValueError(f"Unexpected character: {value}")
+        else:
+            tokens.append((kind, value))
+    return tokens
+
+
+def cell_ref_coords(ref):
+    """Returns (row, col) of a cell reference such as 'B3' or '$B$3'."""
+    match = CELL_REF_REGEX.match(ref.replace('$', '').upper())
+    if not match: raise ValueError("Invalid cell ref")
+    col_str, row_str = match.groups()
+    return int(row_str) - 1, col_str_to_int(col_str)
+
+
+REFERENCE_REGEX = re.compile(r"(\$?)([A-Z]+)(\$?)(\d+)", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=COMPILED_FORMULA_CACHE_SIZE)
+def reference_tokens(formula):
+    """
+    Splits a formula into the pieces reference rewriting works on: text kept
+    as is, and cell references as (col_absolute, col, row_absolute, row)
+    tuples, 0-based. The split follows the formula tokens, so string literals
+    and function names such as LOG10( are never taken for references.
+    """
+    pieces = []
+    text = []
+    for mo in TOKEN_REGEX.finditer(formula):
+        if mo.lastgroup not in ('CELL', 'CELLRANGE'):
+            text.append(mo.group())
+            continue
+        for i, ref in enumerate(mo.group().split(':')):
+            if i:
+                text.append(':')
+            if text:
+                pieces.append(''.join(text))
+                text = []
+            col_absolute, col_str, row_absolute, row_str = REFERENCE_REGEX.fullmatch(ref).groups()
+            pieces.append((bool(col_absolute), col_str_to_int(col_str), bool(row_absolute), int(row_str) - 1))
+    if text:
+        pieces.append(''.join(text))
+    return tuple(pieces)
+
+
+def _render_references(tokens, replacement):
+    """
+    Joins reference tokens back into a formula, each reference passed through
+    replacement; a reference that ends up before row or column 0 (or None)
+    becomes #REF!.
+    """
+    parts = []
+    for piece in tokens:
+        if isinstance(piece, str):
+            parts.append(piece)
+            continue
+        ref = replacement(piece)
+        if ref is None or ref[1] < 0 or ref[3] < 0:
+            parts.append("#REF!")
+            continue
+        col_absolute, col_idx, row_absolute, row_idx = ref
+        parts.append(('$' if col_absolute else '') + col_int_to_str(col_idx) +
+                     ('$' if row_absolute else '') + str(row_idx + 1))
     return "".join(parts)
 
 
+def _is_number(s):
+    try:
+        float(s)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def _base(number, radix, min_length=0):
+    res = ""
+    num = int(number)
+    rad = int(radix)
+    if rad < 2 or rad > 36: return "#NUM!"
+    
+    chars = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    if num == 0: res = "0"
+    else:
+        while num > 0:
+            res = chars[num % rad] + res
+            num //= rad
+    
+    if min_length and len(res) < int(min_length):
+        res = res.zfill(int(min_length))
+    return res
+
+
+def _compare(a, b, op):
+    if isinstance(a, str) and isinstance(b, str):
+        return op(a.lower(), b.lower())
+    try:
+        return op(a, b)
+    except TypeError:
+        return False
+
+
+def _vlookup(lookup_val, table_array, col_idx_num, range_lookup=True):
+    col_idx = int(col_idx_num) - 1
+    lookup_str = str(lookup_val).lower()
+    if not isinstance(table_array, list) or not table_array: return "#N/A"
+    
+    if str(range_lookup).upper() == 'FALSE' or range_lookup is False or range_lookup == 0:
+        for row in table_array:
+            if len(row) > 0 and str(row[0]).lower() == lookup_str:
+                return row[col_idx] if col_idx < len(row) else "#REF!"
+        return "#N/A"
+    
+    best = None
+    for row in table_array:
+        if not row: continue
+        val = row[0]
+        try:
+            if val == lookup_val: 
+                return row[col_idx] if col_idx < len(row) else "#REF!"
+            if val <= lookup_val: 
+                best = row
+            else: break
+        except: continue
+    
+    if best and col_idx < len(best): return best[col_idx]
+    return "#N/A"
+
+
+def _hlookup(lookup_val, table_array, row_idx_num, range_lookup=True):
+    row_idx = int(row_idx_num) - 1
+    lookup_str = str(lookup_val).lower()
+    if not isinstance(table_array, list) or not table_array: return "#N/A"
+    
+    if str(range_lookup).upper() == 'FALSE' or range_lookup is False:
+        for c in range(len(table_array[0])):
+            val = table_array[0][c]
+            if str(val).lower() == lookup_str:
+                return table_array[row_idx][c] if row_idx < len(table_array) else "#REF!"
+        return "#N/A"
+    return "#N/A"
+
+
+def _substitute(text, old, new, instance=None):
+    text, old, new = str(text), str(old), str(new)
+    if instance:
+        count = int(instance)
+        parts = text.split(old)
+        if len(parts) <= count: return text
+        return old.join(parts[:count]) + new + old.join(parts[count:])
+    return text.replace(old, new)
+
+
+# Shared by every parser; built once instead of per evaluated cell
+FORMULA_FUNCTIONS = {
+    'SUM': lambda *args: sum(float(x) for x in args if _is_number(x)),
+    'AVERAGE': lambda *args: statistics.mean(float(x) for x in args if _is_number(x)) if any(_is_number(x) for x in args) else 0,
+    'MAX': lambda *args: max((float(x) for x in args if _is_number(x)), default=0),
+    'MIN': lambda *args: min((float(x) for x in args if _is_number(x)), default=0),
+    'COUNT': lambda *args: sum(1 for x in args if _is_number(x)),
+    'AND': lambda *args: all(args),
+    'OR': lambda *args: any(args),
+    'NOT': lambda x: not x,
+    'TRUE': lambda: True,
+    'FALSE': lambda: False,
+    'UPPER': lambda s: str(s).upper(),
+    'LOWER': lambda s: str(s).lower(),
+    'LEN': lambda s: len(str(s)),
+    'LEFT': lambda s, n=1: str(s)[:int(n)],
+    'RIGHT': lambda s, n=1: str(s)[-int(n):],
+    'MID': lambda s, start, n: str(s)[int(start)-1:int(start)-1+int(n)],
+    'CONCAT': lambda *args: "".join(map(str, args)),
+    'INT': int,
+    'TRIM': lambda s: str(s).strip(),
+    'CHAR': lambda n: chr(int(n)),
+    'CODE': lambda s: ord(str(s)[0]) if s else 0,
+    'DEC2HEX': lambda n: hex(int(n))[2:].upper(),
+    'DEC2BIN': lambda n: bin(int(n))[2:],
+    'DEC2OCT': lambda n: oct(int(n))[2:],
+    'HEX2DEC': lambda h: int(str(h), 16),
+    'HEX2BIN': lambda h: bin(int(str(h), 16))[2:],
+    'HEX2OCT': lambda h: oct(int(str(h), 16))[2:],
+    'BIN2DEC': lambda b: int(str(b), 2),
+    'BIN2HEX': lambda b: hex(int(str(b), 2))[2:].upper(),
+    'BIN2OCT': lambda b: oct(int(str(b), 2))[2:],
+    'OCT2DEC': lambda o: int(str(o), 8),
+    'OCT2BIN': lambda o: bin(int(str(o), 8))[2:],
+    'OCT2HEX': lambda o: hex(int(str(o), 8))[2:].upper(),
+    'BASE': _base,
+    'DECIMAL': lambda text, radix: int(str(text), int(radix)),
+    'BITAND': lambda a, b: int(a) & int(b),
+    'BITOR': lambda a, b: int(a) | int(b),
+    'BITXOR': lambda a, b: int(a) ^ int(b),
+    'BITLSHIFT': lambda n, s: int(n) << int(s),
+    'BITRSHIFT': lambda n, s: int(n) >> int(s),
+    'VLOOKUP': _vlookup,
+    'HLOOKUP': _hlookup,
+    'REPLACE': lambda old, start, n, new: str(old)[:int(start)-1] + str(new) + str(old)[int(start)-1+int(n):],
+    'SUBSTITUTE': _substitute,
+}
+
+# Functions whose range arguments are passed as 2D lists instead of flattened
+_TABLE_FUNCTIONS = ('VLOOKUP', 'HLOOKUP')
+
+# Functions the table may compute directly when every argument is a range
+_RANGE_AGGREGATES = ('SUM', 'AVERAGE', 'MIN', 'MAX', 'COUNT')
+
+_COMPARISONS = {
+    '=': operator.eq, '==': operator.eq,
+    '<': operator.lt, '>': operator.gt,
+    '<=': operator.le, '>=': operator.ge,
+    '!=': operator.ne, '<>': operator.ne,
+}
+
+
+def _divide(left, right):
+    if right == 0: raise ValueError("Div by Zero")
+    return left / right
+
+
+def _flatten_args(args):
+    final_args = []
+    for arg in args:
+        if isinstance(arg, list):
+            for sub in arg:
+                if isinstance(sub, list): final_args.extend(sub)
+                else: final_args.append(sub)
+        else:
+            final_args.append(arg)
+    return final_args
+
+
+class FormulaCompiler:
+    """
+    Compiles formula tokens into a tree of closures.
+
+    Each node is a callable taking the evaluating FormulaParser (which
+    resolves cell reads and records dependencies) and returning the value.
+    The grammar and evaluation order mirror FormulaParser's interpreter; a
+    formula it cannot compile raises here and is left to the interpreter.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def compile(self):
+        return self._expression()
+
+    def _peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def _peek_kind(self):
+        token = self._peek()
+        if token is None:
+            raise ValueError("Unexpected end of formula")
+        return token[0]
+
+    def _consume(self, kind=None):
+        token = self._peek()
+        if not token:
+            raise ValueError("Unexpected end of formula")
+        if kind and token[0] != kind:
+            raise ValueError(f"Expected {kind}, got {token[0]}")
+        self.pos += 1
+        return token
+
+    def _expression(self):
+        left = self._additive()
+        while True:
+            token = self._peek()
+            if not (token and token[0] == 'OP_CMP'):
+                return left
+            op = _COMPARISONS[self._consume()[1]]
+            right = self._additive()
+            left = (lambda l, r, op: lambda ev: _compare(l(ev), r(ev), op))(left, right, op)
+
+    def _additive(self):
+        left = self._multiplicative()
+        while True:
+            token = self._peek()
+            if not (token and token[0] == 'OP_ADD'):
+                return left
+            op_str = self._consume()[1]
+            right = self._multiplicative()
+            if op_str == '+':
+                left = (lambda l, r: lambda ev: l(ev) + r(ev))(left, right)
+            else:
+                left = (lambda l, r: lambda ev: l(ev) - r(ev))(left, right)
+
+    def _multiplicative(self):
+        left = self._power()
+        while True:
+            token = self._peek()
+            if not (token and token[0] == 'OP_MUL'):
+                return left
+            op_str = self._consume()[1]
+            right = self._power()
+            if op_str == '*':
+                left = (lambda l, r: lambda ev: l(ev) * r(ev))(left, right)
+            else:
+                left = (lambda l, r: lambda ev: _divide(l(ev), r(ev)))(left, right)
+
+    def _power(self):
+        left = self._atom()
+        token = self._peek()
+        if token and token[0] == 'OP_POW':
+            self._consume()
+            right = self._power()
+            left = (lambda l, r: lambda ev: l(ev) ** r(ev))(left, right)
+        return left
+
+    def _atom(self):
+        token = self._peek()
+        if not token:
+            raise ValueError("Unexpected end of formula")
+
+        kind, value = token
+        self._consume()
+
+        if kind in ('NUMBER', 'STRING', 'BOOLEAN'):
+            return lambda ev: value
+        elif kind == 'LPAREN':
+            node = self._expression()
+            self._consume('RPAREN')
+            return node
+        elif kind == 'CELL':
+            row, col = cell_ref_coords(value)
+            return lambda ev: ev._read_cell(row, col)
+        elif kind == 'CELLRANGE':
+            start_ref, end_ref = value.split(':')
+            r1, c1 = cell_ref_coords(start_ref)
+            r2, c2 = cell_ref_coords(end_ref)
+            bounds = (min(r1, r2), max(r1, r2), min(c1, c2), max(c1, c2))
+            read_range = lambda ev: ev._read_range(*bounds)
+            read_range.bounds = bounds
+            return read_range
+        elif kind == 'FUNCTION':
+            return self._function_call(value)
+        elif kind == 'IDENTIFIER':
+            # Only an error if the branch holding it is evaluated
+            def unknown_name(ev):
+                raise ValueError(f"#NAME? {value}")
+            return unknown_name
+        elif kind == 'OP_ADD' and value == '-':
+            operand = self._atom()
+            return lambda ev: -operand(ev)
+        raise ValueError(f"Unexpected token {value}")
+
+    def _function_call(self, func_name):
+        self._consume('LPAREN')
+
+        if func_name == 'IF':
+            condition = self._expression()
+            self._consume('COMMA')
+            if_true = self._expression()
+            if_false = None
+            if self._peek_kind() == 'COMMA':
+                self._consume()
+                if_false = self._expression()
+            self._consume('RPAREN')
+            if if_false is None:
+                return lambda ev: if_true(ev) if condition(ev) else False
+            return lambda ev: if_true(ev) if condition(ev) else if_false(ev)
+
+        if func_name == 'IFERROR':
+            value = self._expression()
+            self._consume('COMMA')
+            value_if_error = self._expression()
+            self._consume('RPAREN')
+
+            def iferror(ev):
+                try:
+                    return value(ev)
+                except Exception:
+                    return value_if_error(ev)
+            return iferror
+
+        if func_name == 'IFNA':
+            value = self._expression()
+            self._consume('COMMA')
+            value_if_na = self._expression()
+            self._consume('RPAREN')
+
+            def ifna(ev):
+                val = value(ev)
+                val_if_na = value_if_na(ev)
+                return val_if_na if str(val) == "#N/A" else val
+            return ifna
+
+        args = []
+        if self._peek_kind() != 'RPAREN':
+            while True:
+                args.append(self._expression())
+                if self._peek_kind() == 'COMMA':
+                    self._consume()
+                else:
+                    break
+        self._consume('RPAREN')
+        args = tuple(args)
+
+        func = FORMULA_FUNCTIONS.get(func_name)
+        if func is None:
+            def unknown_function(ev):
+                for arg in args:
+                    arg(ev)
+                raise ValueError(f"Unknown function {func_name}")
+            return unknown_function
+        if func_name in _TABLE_FUNCTIONS:
+            if len(args) in (3, 4) and hasattr(args[1], 'bounds'):
+                table_range = args[1]
+                other_args = (args[0],) + args[2:]
+
+                def indexed_lookup(ev):
+                    values = [arg(ev) for arg in other_args]
+                    result = ev._lookup(func_name, table_range.bounds, *values)
+                    if result is None:
+                        result = func(values[0], table_range(ev), *values[1:])
+                    return result
+                return indexed_lookup
+            return lambda ev: func(*[arg(ev) for arg in args])
+        if func_name in _RANGE_AGGREGATES and args and all(hasattr(arg, 'bounds') for arg in args):
+            ranges = tuple(arg.bounds for arg in args)
+
+            def range_aggregate(ev):
+                result = ev._aggregate_ranges(func_name, ranges)
+                if result is None:
+                    result = func(*_flatten_args([arg(ev) for arg in args]))
+                return result
+            return range_aggregate
+        return lambda ev: func(*_flatten_args([arg(ev) for arg in args]))
+
+
+@functools.lru_cache(maxsize=COMPILED_FORMULA_CACHE_SIZE)
+def compile_formula(expression):
+    """
+    Returns the compiled form of a formula (without the leading '='), or None
+    if it cannot be compiled and must be interpreted.
+
+    Results are cached by formula text, so editing a cell's text simply
+    compiles the new text; the old entry ages out of the cache.
+    """
+    try:
+        return FormulaCompiler(tokenize_formula(expression)).compile()
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=COMPILED_FORMULA_CACHE_SIZE)
+def formula_references(expression):
+    """
+    Returns the cells and ranges a formula (without the leading '=') refers
+    to, whether or not every reference is reached when it is evaluated.
+
+    Returns:
+        tuple: (cells, ranges) where cells are (row, col) and ranges are
+        (top, bottom, left, right), all 0-based and inclusive.
+    """
+    try:
+        tokens = tokenize_formula(expression)
+    except Exception:
+        return (), ()
+    cells = []
+    ranges = []
+    for kind, value in tokens:
+        if kind == 'CELL':
+            cells.append(cell_ref_coords(value))
+        elif kind == 'CELLRANGE':
+            start_ref, end_ref = value.split(':')
+            r1, c1 = cell_ref_coords(start_ref)
+            r2, c2 = cell_ref_coords(end_ref)
+            ranges.append((min(r1, r2), max(r1, r2), min(c1, c2), max(c1, c2)))
+    return tuple(cells), tuple(ranges)
+
+
+def format_formula_result(result):
+    """Formats an evaluated formula result for display in a cell."""
+    if isinstance(result, bool):
+        return str(result).upper()
+    if isinstance(result, float) and result.is_integer():
+        return str(int(result))
+    return f"{result:.2f}" if isinstance(result, float) else str(result)
+
+
 class FormulaParser:
+    functions = FORMULA_FUNCTIONS
+
     def __init__(self, table_interface, current_cell_coords):
         self.table = table_interface
         self.current_cell = current_cell_coords
         self.pos = 0
         self.tokens = []
-        
-        self.functions = {
-            'SUM': lambda *args: sum(float(x) for x in args if self._is_number(x)),
-            'AVERAGE': lambda *args: statistics.mean(float(x) for x in args if self._is_number(x)) if any(self._is_number(x) for x in args) else 0,
-            'MAX': lambda *args: max((float(x) for x in args if self._is_number(x)), default=0),
-            'MIN': lambda *args: min((float(x) for x in args if self._is_number(x)), default=0),
-            'COUNT': lambda *args: sum(1 for x in args if self._is_number(x)),
-            'AND': lambda *args: all(args),
-            'OR': lambda *args: any(args),
-            'NOT': lambda x: not x,
-            'TRUE': lambda: True,
-            'FALSE': lambda: False,
-            'UPPER': lambda s: str(s).upper(),
-            'LOWER': lambda s: str(s).lower(),
-            'LEN': lambda s: len(str(s)),
-            'LEFT': lambda s, n=1: str(s)[:int(n)],
-            'RIGHT': lambda s, n=1: str(s)[-int(n):],
-            'MID': lambda s, start, n: str(s)[int(start)-1:int(start)-1+int(n)],
-            'CONCAT': lambda *args: "".join(map(str, args)),
-            'INT': int,
-            'TRIM': lambda s: str(s).strip(),
-            'CHAR': lambda n: chr(int(n)),
-            'CODE': lambda s: ord(str(s)[0]) if s else 0,
-            'DEC2HEX': lambda n: hex(int(n))[2:].upper(),
-            'DEC2BIN': lambda n: bin(int(n))[2:],
-            'DEC2OCT': lambda n: oct(int(n))[2:],
-            'HEX2DEC': lambda h: int(str(h), 16),
-            'HEX2BIN': lambda h: bin(int(str(h), 16))[2:],
-            'HEX2OCT': lambda h: oct(int(str(h), 16))[2:],
-            'BIN2DEC': lambda b: int(str(b), 2),
-            'BIN2HEX': lambda b: hex(int(str(b), 2))[2:].upper(),
-            'BIN2OCT': lambda b: oct(int(str(b), 2))[2:],
-            'OCT2DEC': lambda o: int(str(o), 8),
-            'OCT2BIN': lambda o: bin(int(str(o), 8))[2:],
-            'OCT2HEX': lambda o: hex(int(str(o), 8))[2:].upper(),
-            'BASE': self._base,
-            'DECIMAL': lambda text, radix: int(str(text), int(radix)),
-            'BITAND': lambda a, b: int(a) & int(b),
-            'BITOR': lambda a, b: int(a) | int(b),
-            'BITXOR': lambda a, b: int(a) ^ int(b),
-            'BITLSHIFT': lambda n, s: int(n) << int(s),
-            'BITRSHIFT': lambda n, s: int(n) >> int(s),
-            'VLOOKUP': self._vlookup,
-            'HLOOKUP': self._hlookup,
-            'REPLACE': lambda old, start, n, new: str(old)[:int(start)-1] + str(new) + str(old)[int(start)-1+int(n):],
-            'SUBSTITUTE': self._substitute
-        }
 
     def _is_number(self, s):
-        try:
-            float(s)
-            return True
-        except (ValueError, TypeError):
-            return False
-
-    def _base(self, number, radix, min_length=0):
-        res = ""
-        num = int(number)
-        rad = int(radix)
-        if rad < 2 or rad > 36: return "#NUM!"
-        
-        chars = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-        if num == 0: res = "0"
-        else:
-            while num > 0:
-                res = chars[num % rad] + res
-                num //= rad
-        
-        if min_length and len(res) < int(min_length):
-            res = res.zfill(int(min_length))
-        return res
+        return _is_number(s)
 
     def _compare(self, a, b, op):
-        if isinstance(a, str) and isinstance(b, str):
-            return op(a.lower(), b.lower())
-        try:
-            return op(a, b)
-        except TypeError:
-            return False
+        return _compare(a, b, op)
 
     def evaluate(self, expression):
+        if not expression: return ""
+        compiled = compile_formula(expression)
+        if compiled is None:
+            return self.interpret(expression)
+        try:
+            return compiled(self)
+        except Exception as e:
+            return f"#ERROR: {str(e)}"
+
+    def interpret(self, expression):
+        """Evaluates a formula by parsing it token by token, without the compiled cache."""
         if not expression: return ""
         try:
             self.tokens = self._tokenize(expression)
@@ -217,48 +708,7 @@ class FormulaParser:
             return f"#ERROR: {str(e)}"
 
     def _tokenize(self, expression):
-        token_specification = [
-            ('FUNCTION',  r'[A-Z][A-Z0-9_]*\('),
-            ('CELLRANGE', r'\$?[A-Z]+\$?[0-9]+:\$?[A-Z]+\$?[0-9]+'),
-            ('CELL',      r'\$?[A-Z]+\$?[0-9]+'),
-            ('NUMBER',    r'[0-9]+(\.[0-9]*)?'),
-            ('BOOLEAN',   r'TRUE|FALSE'),
-            ('STRING',    r'"[^"]*"'),
-            ('OP_CMP',    r'<=|>=|<>|!=|==|<|>|='), 
-            ('OP_ADD',    r'[\+\-]'),
-            ('OP_MUL',    r'[\*/]'),
-            ('OP_POW',    r'\^'),
-            ('LPAREN',    r'\('),
-            ('RPAREN',    r'\)'),
-            ('COMMA',     r','),
-            ('WHITESPACE',r'\s+'),
-            ('IDENTIFIER',r'[A-Z][A-Z0-9_]*'), # Catch-all for text like 'SUM' without parens or 's'
-            ('MISMATCH',  r'.'),
-        ]
-        tok_regex = '|'.join('(?P<%s>%s)' % pair for pair in token_specification)
-        tokens = []
-        for mo in re.finditer(tok_regex, expression, re.IGNORECASE):
-            kind = mo.lastgroup
-            value = mo.group()
-            if kind == 'WHITESPACE':
-                continue
-            if kind == 'FUNCTION':
-                tokens.append((kind, value[:-1].upper()))
-                tokens.append(('LPAREN', '('))
-            elif kind == 'STRING':
-                tokens.append((kind, value[1:-1]))
-            elif kind == 'BOOLEAN':
-                tokens.append((kind, value.upper() == 'TRUE'))
-            elif kind == 'NUMBER':
-                tokens.append((kind, float(value)))
-            elif kind == 'IDENTIFIER':
-                # Keep it as is, will raise #NAME? in parser
-                tokens.append((kind, value))
-            elif kind == 'MISMATCH':
-                raise ValueError(f"Unexpected character: {value}")
-            else:
-                tokens.append((kind, value))
-        return tokens
+        return tokenize_formula(expression)
 
     def _peek(self):
         if self.pos < len(self.tokens):
@@ -391,17 +841,10 @@ class FormulaParser:
                     break
         self._consume('RPAREN')
         
-        if func_name in ['VLOOKUP', 'HLOOKUP']:
+        if func_name in _TABLE_FUNCTIONS:
             final_args = args
         else:
-            final_args = []
-            for arg in args:
-                if isinstance(arg, list):
-                    for sub in arg:
-                        if isinstance(sub, list): final_args.extend(sub)
-                        else: final_args.append(sub)
-                else:
-                    final_args.append(arg)
+            final_args = _flatten_args(args)
 
         if func_name in self.functions:
             return self.functions[func_name](*final_args)
@@ -469,81 +912,44 @@ class FormulaParser:
 
     def _resolve_cell(self, ref):
         # Strip $ signs for absolute references - they don't affect evaluation, only copy/fill behavior
-        clean_ref = ref.replace('$', '').upper()
-        match = re.match(r"([A-Z]+)(\d+)", clean_ref)
-        if not match: raise ValueError("Invalid cell ref")
-        col_str, row_str = match.groups()
-        row = int(row_str) - 1
-        col = col_str_to_int(col_str)
+        row, col = cell_ref_coords(ref)
+        return self._read_cell(row, col)
+
+    def _resolve_range(self, ref_range):
+        # Strip $ signs for absolute references - they don't affect evaluation
+        start_ref, end_ref = ref_range.split(':')
+        r1, c1 = cell_ref_coords(start_ref)
+        r2, c2 = cell_ref_coords(end_ref)
+        return self._read_range(min(r1, r2), max(r1, r2), min(c1, c2), max(c1, c2))
+
+    def _read_cell(self, row, col):
         if hasattr(self.table, 'add_dependency'):
             self.table.add_dependency(self.current_cell, (row, col))
         return self.table.get_cell_value(row, col)
 
-    def _resolve_range(self, ref_range):
-        # Strip $ signs for absolute references - they don't affect evaluation
-        clean_range = ref_range.replace('$', '')
-        start_ref, end_ref = clean_range.split(':')
-        r1, c1 = self._cell_coords(start_ref)
-        r2, c2 = self._cell_coords(end_ref)
+    def _aggregate_ranges(self, func_name, ranges):
+        # Lets the table answer SUM(A1:A100000) and the like without reading
+        # every cell; None means it cannot and the cells are read as usual
+        aggregate = getattr(self.table, 'aggregate_ranges', None)
+        if aggregate is None or hasattr(self.table, 'add_dependency'):
+            return None
+        return aggregate(func_name, ranges)
+
+    def _lookup(self, func_name, bounds, *args):
+        # VLOOKUP/HLOOKUP through the table's shared lookup index, if it has one
+        lookup = getattr(self.table, 'lookup', None)
+        if lookup is None or hasattr(self.table, 'add_dependency'):
+            return None
+        return lookup(func_name, bounds, *args)
+
+    def _read_range(self, top, bottom, left, right):
+        track = hasattr(self.table, 'add_dependency')
         vals = []
-        for r in range(min(r1, r2), max(r1, r2) + 1):
+        for r in range(top, bottom + 1):
             row_vals = []
-            for c in range(min(c1, c2), max(c1, c2) + 1):
-                if hasattr(self.table, 'add_dependency'):
+            for c in range(left, right + 1):
+                if track:
                     self.table.add_dependency(self.current_cell, (r, c))
                 row_vals.append(self.table.get_cell_value(r, c))
             vals.append(row_vals)
         return vals
-
-    def _cell_coords(self, ref):
-        match = re.match(r"([A-Z]+)(\d+)", ref.upper())
-        col_str, row_str = match.groups()
-        return int(row_str) - 1, col_str_to_int(col_str)
-
-    def _vlookup(self, lookup_val, table_array, col_idx_num, range_lookup=True):
-        col_idx = int(col_idx_num) - 1
-        lookup_str = str(lookup_val).lower()
-        if not isinstance(table_array, list) or not table_array: return "#N/A"
-        
-        if str(range_lookup).upper() == 'FALSE' or range_lookup is False or range_lookup == 0:
-            for row in table_array:
-                if len(row) > 0 and str(row[0]).lower() == lookup_str:
-                    return row[col_idx] if col_idx < len(row) else "#REF!"
-            return "#N/A"
-        
-        best = None
-        for row in table_array:
-            if not row: continue
-            val = row[0]
-            try:
-                if val == lookup_val: 
-                    return row[col_idx] if col_idx < len(row) else "#REF!"
-                if val <= lookup_val: 
-                    best = row
-                else: break
-            except: continue
-        
-        if best and col_idx < len(best): return best[col_idx]
-        return "#N/A"
-
-    def _hlookup(self, lookup_val, table_array, row_idx_num, range_lookup=True):
-        row_idx = int(row_idx_num) - 1
-        lookup_str = str(lookup_val).lower()
-        if not isinstance(table_array, list) or not table_array: return "#N/A"
-        
-        if str(range_lookup).upper() == 'FALSE' or range_lookup is False:
-            for c in range(len(table_array[0])):
-                val = table_array[0][c]
-                if str(val).lower() == lookup_str:
-                    return table_array[row_idx][c] if row_idx < len(table_array) else "#REF!"
-            return "#N/A"
-        return "#N/A"
-
-    def _substitute(self, text, old, new, instance=None):
-        text, old, new = str(text), str(old), str(new)
-        if instance:
-            count = int(instance)
-            parts = text.split(old)
-            if len(parts) <= count: return text
-            return old.join(parts[:count]) + new + old.join(parts[count:])
-        return text.replace(old, new)
\ No newline at end of file
@@ -7,6 +7,7 @@ Export handler for comment tables - manages export operations to various file fo
 import csv
 import json
 import logging
+import os
 
 try:
     from openpyxl import Workbook
@@ -14,7 +15,12 @@ try:
 except ImportError:
     OPENPYXL_AVAILABLE = False
 
-from PySide6.QtWidgets import QMessageBox, QFileDialog
+from PySide6.QtCore import QEventLoop, QThread, Qt, Signal
+from PySide6.QtWidgets import QMessageBox, QFileDialog, QProgressDialog
+
+from services.table_codec import PLAIN_STYLE, SPARSE_FORMAT, SPARSE_VERSION, style_font
+
+from .performance_config import PerformanceConfig
 
 logger = logging.getLogger(__name__)
 
@@ -101,7 +107,8 @@ class ExportHandler:
             parent: Parent widget for dialogs
         """
         try:
-            SpreadsheetExportHandler.export_to_csv(self.spreadsheet, file_path)
+            if not SpreadsheetExportHandler.export_to_csv(self.spreadsheet, file_path):
+                return
             QMessageBox.information(
                 parent,
                 "Success",
@@ -121,7 +128,8 @@ class ExportHandler:
             parent: Parent widget for dialogs
         """
         try:
-            SpreadsheetExportHandler.export_to_json(self.spreadsheet, file_path)
+            if not SpreadsheetExportHandler.export_to_json(self.spreadsheet, file_path):
+                return
             QMessageBox.information(
                 parent,
                 "Success",
@@ -182,7 +190,8 @@ class ExportHandler:
             return
 
         try:
-            SpreadsheetExportHandler.export_to_csv(self.spreadsheet, file_path)
+            if not SpreadsheetExportHandler.export_to_csv(self.spreadsheet, file_path):
+                return
             QMessageBox.information(
                 parent,
                 "Success",
@@ -207,7 +216,8 @@ class ExportHandler:
             return
 
         try:
-            SpreadsheetExportHandler.export_to_json(self.spreadsheet, file_path)
+            if not SpreadsheetExportHandler.export_to_json(self.spreadsheet, file_path):
+                return
             QMessageBox.information(
                 parent,
                 "Success",
@@ -219,6 +229,57 @@ class ExportHandler:
             )
 
 
+class TableExportThread(QThread):
+    """
+    Writes the stored cells of a table to a file, one chunk of rows at a time.
+
+    The file is written next to the destination as "<file>.part" and renamed
+    over it once complete; a cancelled or failed export leaves the destination
+    untouched.
+    """
+
+    progress = Signal(int, int)  # rows written, total rows
+    failed = Signal(str)
+
+    def __init__(self, data_store, file_path, write, chunk_rows):
+        super().__init__()
+        self.data_store = data_store
+        self.file_path = file_path
+        self.write = write
+        self.chunk_rows = chunk_rows
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        partial_path = self.file_path + ".part"
+        try:
+            with open(partial_path, "w", encoding="utf-8", newline="") as f:
+                self.write(f, self.data_store, self._chunks())
+            if self._cancelled:
+                os.remove(partial_path)
+            else:
+                os.replace(partial_path, self.file_path)
+        except Exception as e:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            self.failed.emit(str(e))
+
+    def _chunks(self):
+        total_rows = self.data_store.row_count
+        rows_written = 0
+        for cells in self.data_store.iter_cell_chunks(self.chunk_rows):
+            if self._cancelled:
+                return
+            yield cells
+            rows_written = min(rows_written + self.chunk_rows, total_rows)
+            self.progress.emit(rows_written, total_rows)
+
+
 class SpreadsheetExportHandler:
     """
     Low-level export operations - performs actual file I/O and formatting.
@@ -230,50 +291,23 @@ class SpreadsheetExportHandler:
         """
         Export table data to CSV with formatting columns (no column letters A,B,C).
 
+        Only cells with a value are written, one line per cell in row order,
+        streamed from the cell store on a worker thread (see export_cells).
+
         Args:
             spreadsheet: Spreadsheet instance to export from
             file_path: Destination file path
 
+        Returns:
+            bool: True if the file was written, False if cancelled
+
         Raises:
             Exception: If export fails
         """
         try:
-            with open(file_path, "w", encoding="utf-8", newline="") as f:
-                fieldnames = [
-                    "Row",
-                    "Column",
-                    "Value",
-                    "FontBold",
-                    "FontItalic",
-                    "FontUnderline",
-                    "TextColor",
-                    "BGColor",
-                ]
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-
-                for r in range(spreadsheet.rowCount()):
-                    for c in range(spreadsheet.columnCount()):
-                        item = spreadsheet.item(r, c)
-                        if not item:
-                            continue
-
-                        cell_data = item.get_data()
-                        if not cell_data.get("value"):
-                            continue
-
-                        font_data = cell_data.get("font", {})
-                        row_dict = {
-                            "Row": r,
-                            "Column": c,
-                            "Value": str(cell_data.get("value", "")),
-                            "FontBold": font_data.get("bold", False),
-                            "FontItalic": font_data.get("italic", False),
-                            "FontUnderline": font_data.get("underline", False),
-                            "TextColor": cell_data.get("text_color", ""),
-                            "BGColor": cell_data.get("bg_color", ""),
-                        }
-                        writer.writerow(row_dict)
+            return SpreadsheetExportHandler.export_cells(
+                spreadsheet, file_path, SpreadsheetExportHandler._write_csv
+            )
         except Exception as e:
             raise Exception(f"Failed to export to CSV: {str(e)}")
 
@@ -282,30 +316,135 @@ class SpreadsheetExportHandler:
         """
         Export table data to JSON with full formatting (no column letters A,B,C).
 
+        The table is written in the sparse table encoding (see
+        services.table_codec), which import_from_json reads like the dense
+        one, streamed from the cell store on a worker thread.
+
         Args:
             spreadsheet: Spreadsheet instance to export from
             file_path: Destination file path
 
+        Returns:
+            bool: True if the file was written, False if cancelled
+
         Raises:
             Exception: If export fails
         """
         try:
-            data = []
-            for r in range(spreadsheet.rowCount()):
-                row_d = []
-                for c in range(spreadsheet.columnCount()):
-                    item = spreadsheet.item(r, c)
-                    cell_data = item.get_data() if item else {"value": ""}
-                    row_d.append(cell_data)
-                data.append(row_d)
-
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(
-                    {"table_data": data}, f, indent=2, ensure_ascii=False
-                )
+            return SpreadsheetExportHandler.export_cells(
+                spreadsheet, file_path, SpreadsheetExportHandler._write_json
+            )
         except Exception as e:
             raise Exception(f"Failed to export to JSON: {str(e)}")
 
+    @staticmethod
+    def export_cells(spreadsheet, file_path, write):
+        """
+        Write the stored cells of a table to a file on a TableExportThread,
+        behind a window-modal progress dialog that can cancel the export.
+
+        Args:
+            spreadsheet: Spreadsheet instance to export from
+            file_path: Destination file path
+            write: Callable(file, data_store, chunks) writing the file from
+                the row-ordered cell chunks of the store
+
+        Returns:
+            bool: True if the file was written, False if cancelled
+
+        Raises:
+            Exception: If writing fails
+        """
+        errors = []
+
+        def show_progress(rows_written, total_rows):
+            progress.setMaximum(total_rows)
+            progress.setValue(min(rows_written, total_rows))
+
+        thread = TableExportThread(
+            spreadsheet.data_store, file_path, write, PerformanceConfig.EXPORT_BATCH_ROWS
+        )
+        progress = QProgressDialog("Exporting table...", "Cancel", 0, 0, spreadsheet)
+        progress.setWindowTitle("Exporting Table")
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setMinimumDuration(500)
+        progress.canceled.connect(thread.cancel)
+
+        loop = QEventLoop()
+        thread.progress.connect(show_progress)
+        thread.failed.connect(errors.append)
+        thread.finished.connect(loop.quit)
+        thread.start()
+        loop.exec()
+        thread.wait()
+        progress.close()
+
+        if errors:
+            raise Exception(errors[0])
+        return not thread.is_cancelled()
+
+    @staticmethod
+    def _write_csv(f, data_store, chunks):
+        writer = csv.writer(f)
+        writer.writerow([
+            "Row",
+            "Column",
+            "Value",
+            "FontBold",
+            "FontItalic",
+            "FontUnderline",
+            "TextColor",
+            "BGColor",
+        ])
+        # The formatting columns of each style, built once
+        formats = {}
+        for cells in chunks:
+            rows = []
+            for row, col, value, style in cells:
+                if not value:
+                    continue
+                columns = formats.get(style)
+                if columns is None:
+                    flags, text_color, bg_color = style
+                    font = style_font(flags)
+                    columns = formats[style] = (
+                        font["bold"], font["italic"], font["underline"],
+                        text_color or "", bg_color or "",
+                    )
+                rows.append((row, col, value) + columns)
+            writer.writerows(rows)
+
+    @staticmethod
+    def _write_json(f, data_store, chunks):
+        # The same document as SparseTableEncoder would build: cells in row
+        # order, styles numbered by first use
+        f.write(
+            '{\n  "table_data": {\n'
+            f'    "format": "{SPARSE_FORMAT}",\n'
+            f'    "version": {SPARSE_VERSION},\n'
+            f'    "rows": {data_store.row_count},\n'
+            f'    "cols": {data_store.col_count},\n'
+            '    "cells": ['
+        )
+        style_ids = {PLAIN_STYLE: 0}
+        # The closing "]" of a cell, with its style id unless plain
+        endings = {PLAIN_STYLE: "]"}
+        encode = json.encoder.encode_basestring
+        separator = "\n      "
+        for cells in chunks:
+            lines = []
+            for row, col, value, style in cells:
+                ending = endings.get(style)
+                if ending is None:
+                    style_ids[style] = len(style_ids)
+                    ending = endings[style] = f", {style_ids[style]}]"
+                lines.append(f"[{row}, {col}, {encode(value)}{ending}")
+            if lines:
+                f.write(separator + ",\n      ".join(lines))
+                separator = ",\n      "
+        styles = json.dumps([list(style) for style in style_ids], ensure_ascii=False)
+        f.write(f'\n    ],\n    "styles": {styles}\n  }}\n}}\n')
+
     @staticmethod
     def export_to_excel(spreadsheet, file_path):
         """
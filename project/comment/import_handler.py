@@ -14,7 +14,12 @@ try:
 except ImportError:
     OPENPYXL_AVAILABLE = False
 
-from PySide6.QtWidgets import QMessageBox, QFileDialog
+from PySide6.QtCore import QEventLoop, QThread, Qt, Signal
+from PySide6.QtWidgets import QMessageBox, QFileDialog, QProgressDialog
+
+from services.table_codec import style_key, to_dense
+
+from .performance_config import PerformanceConfig
 
 logger = logging.getLogger(__name__)
 
@@ -52,7 +57,8 @@ class ImportHandler:
 
         try:
             if file_path.lower().endswith(".xlsx"):
-                SpreadsheetImportHandler.import_from_excel(self.spreadsheet, file_path)
+                if not SpreadsheetImportHandler.import_from_excel(self.spreadsheet, file_path):
+                    return
             elif file_path.lower().endswith(".json"):
                 SpreadsheetImportHandler.import_from_json(self.spreadsheet, file_path)
             else:
@@ -70,6 +76,97 @@ class ImportHandler:
             )
 
 
+class ExcelImportThread(QThread):
+    """
+    Reads the active sheet of a workbook in openpyxl read-only mode and emits
+    its non-empty cells as (row, col, value, style tuple) batches.
+    """
+
+    batch_ready = Signal(object)
+    progress = Signal(int, int)  # rows read, total rows (0 if unknown)
+    failed = Signal(str)
+
+    def __init__(self, file_path, batch_rows):
+        super().__init__()
+        self.file_path = file_path
+        self.batch_rows = batch_rows
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        try:
+            self._read()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def _read(self):
+        wb = load_workbook(self.file_path, read_only=True)
+        try:
+            ws = wb.active
+            if not ws:
+                raise Exception("No worksheet found in Excel file")
+
+            total_rows = ws.max_row or 0
+            styles = {}
+            batch = []
+            for row_idx, row in enumerate(ws.iter_rows()):
+                if self._cancelled:
+                    return
+                for col_idx, cell in enumerate(row):
+                    if cell.value is None:
+                        continue
+                    batch.append((row_idx, col_idx, str(cell.value), _cell_style(cell, styles)))
+                if (row_idx + 1) % self.batch_rows == 0:
+                    if batch:
+                        self.batch_ready.emit(batch)
+                        batch = []
+                    self.progress.emit(row_idx + 1, total_rows)
+            if batch:
+                self.batch_ready.emit(batch)
+        finally:
+            wb.close()
+
+
+def _excel_color(color):
+    """Returns the '#rrggbb' of an openpyxl color, or None for none or a non-RGB color."""
+    color_val = color.rgb if color is not None else None
+    if not isinstance(color_val, str) or color_val == "00000000" or len(color_val) < 6:
+        return None
+    return f"#{color_val[-6:]}"
+
+
+def _cell_style(cell, styles):
+    """
+    Returns the style tuple (font_flags, text_color, bg_color) of a cell.
+
+    Cells sharing an openpyxl font and fill share one tuple; styles caches
+    them by (font id, fill id) so each distinct style is extracted once.
+    """
+    style_array = getattr(cell, "style_array", None)
+    key = (style_array.fontId, style_array.fillId) if style_array is not None else None
+    style = styles.get(key) if key is not None else None
+    if style is None:
+        font = cell.font
+        fill = cell.fill
+        style = style_key({
+            "font": {
+                "bold": bool(font and font.bold),
+                "italic": bool(font and font.italic),
+                "underline": bool(font and font.underline),
+            },
+            "text_color": _excel_color(font.color) if font else None,
+            "bg_color": _excel_color(fill.start_color) if fill else None,
+        })
+        if key is not None:
+            styles[key] = style
+    return style
+
+
 class SpreadsheetImportHandler:
     """
     Low-level import operations - performs actual file I/O and data restoration.
@@ -81,10 +178,19 @@ class SpreadsheetImportHandler:
         """
         Import table data from Excel file with formatting.
 
+        The active sheet is streamed in openpyxl read-only mode on an
+        ExcelImportThread and written into the cell store in batches of
+        PerformanceConfig.IMPORT_BATCH_ROWS rows, so memory follows one batch
+        rather than the workbook. Formulas are recalculated once at the end.
+        A cancelled or failed import restores the previous cells.
+
         Args:
             spreadsheet: Spreadsheet instance to import into
             file_path: Source file path
 
+        Returns:
+            bool: True if the sheet was imported, False if cancelled
+
         Raises:
             Exception: If openpyxl is not available or import fails
         """
@@ -93,84 +199,51 @@ class SpreadsheetImportHandler:
                 "openpyxl library is not installed. Install with: pip install openpyxl"
             )
 
-        try:
-            wb = load_workbook(file_path)
-            ws = wb.active
-
-            if not ws:
-                raise Exception("No worksheet found in Excel file")
-
-            # Determine table dimensions
-            max_row = 0
-            max_col = 0
-            import_data = {}
-
-            # Read all cells with data
-            for row_idx, row in enumerate(ws.iter_rows()):
-                for col_idx, cell in enumerate(row):
-                    if cell.value is None:
-                        continue
-
-                    max_row = max(max_row, row_idx)
-                    max_col = max(max_col, col_idx)
-
-                    # Extract formatting
-                    cell_data = {"value": str(cell.value)}
-
-                    # Font formatting
-                    font_data = {}
-                    if cell.font:
-                        font_data["bold"] = cell.font.bold or False
-                        font_data["italic"] = cell.font.italic or False
-                        font_data["underline"] = bool(cell.font.underline) or False
-                    cell_data["font"] = font_data
-
-                    # Text color
-                    text_color = None
-                    if cell.font and cell.font.color:
-                        color_val = cell.font.color.rgb
-                        if color_val and color_val != "00000000":
-                            text_color = (
-                                f"#{color_val[-6:]}"
-                                if len(str(color_val)) >= 6
-                                else None
-                            )
-                    cell_data["text_color"] = text_color
-
-                    # Background color
-                    bg_color = None
-                    if cell.fill and cell.fill.start_color:
-                        color_val = cell.fill.start_color.rgb
-                        if color_val and color_val != "00000000":
-                            bg_color = (
-                                f"#{color_val[-6:]}"
-                                if len(str(color_val)) >= 6
-                                else None
-                            )
-                    cell_data["bg_color"] = bg_color
-
-                    import_data[(row_idx, col_idx)] = cell_data
-
-            # Resize table
-            if max_row > 0 or max_col > 0:
-                spreadsheet.setRowCount(max_row + 1)
-                spreadsheet.setColumnCount(max_col + 1)
-                spreadsheet.update_headers()
+        previous = spreadsheet.data_store.get_sparse_data()
+        extent = [-1, -1]
+        errors = []
 
-            # Import data - Import SpreadsheetItem here to avoid circular import
-            from .comment_table import SpreadsheetItem
-            
-            spreadsheet.blockSignals(True)
-            for (row, col), cell_data in import_data.items():
-                item = spreadsheet.item(row, col) or SpreadsheetItem()
-                spreadsheet.setItem(row, col, item)
-                item.set_data(cell_data)
+        def write_batch(cells):
+            extent[0] = max(extent[0], max(cell[0] for cell in cells))
+            extent[1] = max(extent[1], max(cell[1] for cell in cells))
+            spreadsheet.write_styled_cells(cells)
 
-            spreadsheet.blockSignals(False)
-            spreadsheet.evaluate_all_cells()
+        def show_progress(rows_read, total_rows):
+            if total_rows:
+                progress.setMaximum(total_rows)
+                progress.setValue(min(rows_read, total_rows))
 
-        except Exception as e:
-            raise Exception(f"Failed to import from Excel: {str(e)}")
+        thread = ExcelImportThread(file_path, PerformanceConfig.IMPORT_BATCH_ROWS)
+        progress = QProgressDialog(
+            "Importing from Excel...", "Cancel", 0, 0, spreadsheet
+        )
+        progress.setWindowTitle("Importing Table")
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setMinimumDuration(500)
+        progress.canceled.connect(thread.cancel)
+
+        loop = QEventLoop()
+        thread.batch_ready.connect(write_batch)
+        thread.progress.connect(show_progress)
+        thread.failed.connect(errors.append)
+        thread.finished.connect(loop.quit)
+        thread.start()
+        loop.exec()
+        thread.wait()
+        progress.close()
+
+        if errors or thread.is_cancelled():
+            spreadsheet.load_table_data(previous)
+            if errors:
+                raise Exception(f"Failed to import from Excel: {errors[0]}")
+            return False
+
+        # Fit the table to the imported sheet
+        if extent[0] > 0 or extent[1] > 0:
+            spreadsheet.setRowCount(extent[0] + 1)
+            spreadsheet.setColumnCount(extent[1] + 1)
+        spreadsheet.evaluate_all_cells()
+        return True
 
     @staticmethod
     def import_from_csv(spreadsheet, file_path):
@@ -185,9 +258,6 @@ class SpreadsheetImportHandler:
             Exception: If import fails
         """
         try:
-            # Import here to avoid circular imports
-            from .comment_table import SpreadsheetItem
-
             # First, read all the data to determine dimensions
             import_data = {}
             max_row = 0
@@ -216,8 +286,7 @@ class SpreadsheetImportHandler:
             # Import the data
             spreadsheet.blockSignals(True)
             for (row, col), row_dict in import_data.items():
-                item = spreadsheet.item(row, col) or SpreadsheetItem()
-                spreadsheet.setItem(row, col, item)
+                item = spreadsheet.item(row, col)
 
                 cell_data = {
                     "value": row_dict.get("Value", ""),
@@ -253,12 +322,10 @@ class SpreadsheetImportHandler:
             Exception: If import fails
         """
         try:
-            # Import here to avoid circular imports
-            from .comment_table import SpreadsheetItem
-
             with open(file_path, "r", encoding="utf-8") as f:
                 data_dict = json.load(f)
-                table_data = data_dict.get("table_data", [])
+                # Accepts both the dense and the sparse table encoding
+                table_data = to_dense(data_dict.get("table_data", []))
 
             if not table_data:
                 return
@@ -274,8 +341,7 @@ class SpreadsheetImportHandler:
             spreadsheet.blockSignals(True)
             for r, row in enumerate(table_data):
                 for c, cell_data in enumerate(row):
-                    item = spreadsheet.item(r, c) or SpreadsheetItem()
-                    spreadsheet.setItem(r, c, item)
+                    item = spreadsheet.item(r, c)
                     # Ensure cell_data is a dict with required keys
                     if isinstance(cell_data, dict):
                         item.set_data(cell_data)
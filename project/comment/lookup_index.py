@@ -0,0 +1,166 @@
+# project\comment\lookup_index.py
+"""
+Lookup indexes for VLOOKUP and HLOOKUP.
+
+Without an index every VLOOKUP materializes its whole table range and scans
+it, so thousands of lookups against the same 20k-row table cost
+O(lookups x rows) per recalculation. LookupIndexCache keeps, per sheet, one
+LookupIndex for each key column (VLOOKUP) or key row (HLOOKUP) of a range
+that a lookup has used. It is shared by every formula of the sheet and is
+dropped when a cell of that key column or row changes.
+
+Results match _vlookup and _hlookup in comment_utils exactly. Approximate
+matches use bisect when the keys of the lookup value's type are sorted, and
+otherwise replay the linear scan over the index. Cases the index does not
+model return None, and the formula falls back to the unindexed function.
+"""
+
+import bisect
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of lookup indexes kept per sheet before the oldest is dropped
+LOOKUP_INDEX_CACHE_SIZE = 256
+
+
+def _key_class(value):
+    # Keys of different classes never compare in the linear scan (TypeError),
+    # so each class is searched on its own
+    if isinstance(value, str):
+        return str
+    if isinstance(value, (int, float)):
+        return float
+    return None
+
+
+class LookupIndex:
+    """Index of the keys (first column or first row) of a lookup range."""
+
+    def __init__(self, keys):
+        self.exact = {}
+        self.approximate_supported = True
+        lines = {str: ([], []), float: ([], [])}
+        for pos, key in enumerate(keys):
+            self.exact.setdefault(str(key).lower(), pos)
+            key_class = _key_class(key)
+            if key_class is None:
+                self.approximate_supported = False
+                continue
+            lines[key_class][0].append(key)
+            lines[key_class][1].append(pos)
+        self._lines = {}
+        for key_class, (values, positions) in lines.items():
+            # NaN compares False with everything, which the sorted check rejects
+            ordered = all(a <= b for a, b in zip(values, values[1:])) and all(v == v for v in values)
+            self._lines[key_class] = (values, positions, ordered)
+
+    def approximate(self, lookup_val):
+        """
+        Returns (position, exact_hit) of an approximate match, None for no
+        match, or False if the index cannot answer for this lookup value.
+        """
+        key_class = _key_class(lookup_val)
+        if key_class is None or not self.approximate_supported:
+            return False
+        values, positions, ordered = self._lines[key_class]
+        if ordered:
+            index = bisect.bisect_left(values, lookup_val)
+            if index < len(values) and values[index] == lookup_val:
+                return positions[index], True
+            return (positions[index - 1], False) if index else None
+        best = None
+        for value, pos in zip(values, positions):
+            if value == lookup_val:
+                return pos, True
+            if value <= lookup_val:
+                best = pos
+            else:
+                break
+        return None if best is None else (best, False)
+
+
+class LookupIndexCache:
+    """The lookup indexes of one sheet."""
+
+    def __init__(self, table):
+        self.table = table
+        self._indexes = {}   # ('V', top, bottom, col) / ('H', left, right, row) -> LookupIndex
+        self._by_line = {}   # ('V', col) / ('H', row) -> keys of the indexes on that line
+
+    def clear(self):
+        self._indexes.clear()
+        self._by_line.clear()
+
+    def invalidate(self, row, col):
+        """Drops the indexes whose keys include a changed cell."""
+        for axis, line, pos in (('V', col, row), ('H', row, col)):
+            keys = self._by_line.get((axis, line))
+            if not keys:
+                continue
+            for key in [k for k in keys if k[1] <= pos <= k[2]]:
+                self._drop(key)
+
+    def _drop(self, key):
+        self._indexes.pop(key, None)
+        keys = self._by_line.get((key[0], key[3]))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_line[(key[0], key[3])]
+
+    def _index(self, key):
+        index = self._indexes.get(key)
+        if index is None:
+            axis, first, last, line = key
+            read = self.table.get_cell_value
+            if axis == 'V':
+                keys = [read(row, line) for row in range(first, last + 1)]
+            else:
+                keys = [read(line, col) for col in range(first, last + 1)]
+            if len(self._indexes) >= LOOKUP_INDEX_CACHE_SIZE:
+                self._drop(next(iter(self._indexes)))
+            index = self._indexes[key] = LookupIndex(keys)
+            self._by_line.setdefault((axis, line), set()).add(key)
+        return index
+
+    def lookup(self, func_name, bounds, lookup_val, index_num, range_lookup=True):
+        """
+        Answers VLOOKUP or HLOOKUP over a range given by bounds.
+
+        Returns:
+            The result, or None if the unindexed function has to compute it.
+        """
+        top, bottom, left, right = bounds
+        if func_name == 'VLOOKUP':
+            col_idx = int(index_num) - 1
+            if col_idx < 0:
+                return None
+            width = right - left + 1
+            index = self._index(('V', top, bottom, left))
+            if str(range_lookup).upper() == 'FALSE' or range_lookup is False or range_lookup == 0:
+                pos = index.exact.get(str(lookup_val).lower())
+                if pos is None:
+                    return "#N/A"
+                return self.table.get_cell_value(top + pos, left + col_idx) if col_idx < width else "#REF!"
+            match = index.approximate(lookup_val)
+            if match is False:
+                return None
+            if match is None:
+                return "#N/A"
+            pos, exact_hit = match
+            if col_idx < width:
+                return self.table.get_cell_value(top + pos, left + col_idx)
+            return "#REF!" if exact_hit else "#N/A"
+
+        row_idx = int(index_num) - 1
+        if row_idx < 0:
+            return None
+        if not (str(range_lookup).upper() == 'FALSE' or range_lookup is False):
+            return "#N/A"
+        pos = self._index(('H', left, right, top)).exact.get(str(lookup_val).lower())
+        if pos is None:
+            return "#N/A"
+        if row_idx < bottom - top + 1:
+            return self.table.get_cell_value(top + row_idx, left + pos)
+        return "#REF!"
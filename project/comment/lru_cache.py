@@ -0,0 +1,84 @@
+# project\comment\lru_cache.py
+"""
+Bounded least-recently-used cache with hit/miss counters.
+
+Used by the spreadsheet's render cache for laid-out cell text and by the
+cell stores for materialized rows. Painting reads the visible entries on every
+frame, which keeps them most recently used, so eviction removes the entries
+that have scrolled farthest out of view first. The capacity is the
+PerformanceConfig limit, raised to hold a few viewports when the window is
+large enough to need it.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Mapping of at most capacity entries, evicting the least recently used."""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Return a cached value and mark it most recently used, counting the hit or miss."""
+        with self._lock:
+            value = self._entries.get(key, self)
+            if value is self:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Add or replace an entry, evicting the least recently used ones beyond capacity."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def resize(self, capacity: int):
+        """Change the capacity, evicting entries if it shrinks."""
+        with self._lock:
+            self.capacity = max(1, int(capacity))
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Return the size, capacity and hit/miss/eviction counters."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
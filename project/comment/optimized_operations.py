@@ -59,6 +59,11 @@ class OptimizedBatchDelete:
         if not rows:
             return
         
+        # Tables backed by a cell store remove all rows in one structural edit
+        if getattr(spreadsheet, 'data_store', None) is not None:
+            spreadsheet.remove_rows(rows)
+            return
+        
         total_rows = len(rows)
         
         # For small batches, use original method
@@ -121,6 +126,10 @@ class OptimizedBatchDelete:
         if not cols:
             return
         
+        if getattr(spreadsheet, 'data_store', None) is not None:
+            spreadsheet.remove_columns(cols)
+            return
+        
         total_cols = len(cols)
         
         # For small batches, use original method
@@ -261,6 +270,11 @@ class OptimizedColumnAddition:
             QMessageBox.warning(spreadsheet, "Limit", "Max 30 columns allowed.")
             return
         
+        # Inserting into a cell store does not touch the existing cells
+        if getattr(spreadsheet, 'data_store', None) is not None:
+            spreadsheet.insert_columns(index, count)
+            return
+        
         row_count = spreadsheet.rowCount()
         total_ops = count * row_count
         
@@ -0,0 +1,208 @@
+# project\comment\parallel_recalc.py
+"""
+Multi-process recalculation of large comment sheets.
+
+Formula evaluation is pure Python and GIL-bound, so a background thread
+cannot use more than one core. recalculate_parallel plans the dirty cells of
+a RecalcEngine as usual, then splits them into batches that worker processes
+evaluate independently:
+
+- Shallow graphs (at most PARALLEL_RECALC_MAX_LEVELS levels, the common case
+  of many row formulas plus a few totals) are evaluated level by level. Each
+  batch holds cells of one level and carries the results of the earlier
+  levels it reads.
+- Deeper graphs are split into their connected components, and whole
+  components are packed into batches, each evaluated in topological order.
+
+The worker processes are started on first use and kept for later
+recalculations. Each batch carries the non-formula inputs its formulas read,
+and a worker evaluates it with a fresh RecalcEngine over those inputs, so
+results, the numeric column cache and the lookup indexes behave exactly as
+in the host process. The results are published back to the host table
+through set_formula_result, on the calling thread. If the pool
+fails (a worker died or raised), the cells it did not finish are evaluated
+in process and the next recalculation starts new workers.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from .comment_utils import format_formula_result
+from .performance_config import PerformanceConfig
+
+logger = logging.getLogger(__name__)
+
+# Batches per worker and level, so that uneven batches still balance
+BATCHES_PER_WORKER = 4
+
+
+class SnapshotTable:
+    """Host table of a worker: cell values by (row, col), as get_cell_value returns them."""
+
+    def __init__(self, values):
+        self.values = values
+        self.results = {}
+
+    def get_cell_value(self, row, col):
+        return self.values.get((row, col), 0)
+
+    def set_formula_result(self, row, col, result):
+        self.results[(row, col)] = result
+        # Read back the way the widgets read a displayed result
+        text = format_formula_result(result)
+        try:
+            self.values[(row, col)] = float(text)
+        except ValueError:
+            self.values[(row, col)] = text
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    """Returns the shared worker pool, starting it with workers processes if needed."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None and _pool_workers != workers:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    """Stops the worker processes; the next parallel recalculation starts new ones."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _evaluate_batch(formulas, inputs, computed):
+    """
+    Evaluates a batch of formulas in a worker.
+
+    Args:
+        formulas: ((row, col), text) pairs.
+        inputs: {(row, col): value} of the non-formula cells the batch reads.
+        computed: {(row, col): result} of formulas evaluated by earlier batches.
+
+    Returns:
+        dict: {(row, col): result} for the batch.
+    """
+    from .recalc_engine import RecalcEngine
+    engine = RecalcEngine(SnapshotTable(inputs))
+    table = engine.table
+    for cell, result in computed.items():
+        table.set_formula_result(cell[0], cell[1], result)
+        engine.set_formula(cell, None)
+    for cell, text in formulas:
+        engine.set_formula(cell, text)
+    engine.recalculate([cell for cell, _ in formulas])
+    return {cell: table.results.pop(cell) for cell, _ in formulas}
+
+
+def _chunks(items, count):
+    size = max(1, -(-len(items) // count))
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _components(order, precedents):
+    """Groups cells into connected components, each in topological order."""
+    parent = {cell: cell for cell in order}
+
+    def find(cell):
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+
+    for cell in order:
+        for precedent in precedents[cell]:
+            root, other = find(cell), find(precedent)
+            if root != other:
+                parent[root] = other
+    components = {}
+    for cell in order:
+        components.setdefault(find(cell), []).append(cell)
+    return list(components.values())
+
+
+def recalculate_parallel(engine, workers=None):
+    """
+    Recalculates every dirty cell of an engine, using worker processes when
+    the work is large enough.
+
+    Returns:
+        int: The number of cells that were updated.
+    """
+    workers = workers or PerformanceConfig.PARALLEL_RECALC_WORKERS or os.cpu_count() or 1
+    with engine._lock:
+        order, circular = engine.plan()
+        if workers < 2 or len(order) < PerformanceConfig.PARALLEL_RECALC_MIN_FORMULAS:
+            engine.mark_circular(circular)
+            for cell in order:
+                engine.evaluate(cell)
+            return len(order) + len(circular)
+
+        engine.mark_circular(circular)
+        precedents = engine.work_precedents(order)
+        work = set(order)
+        formulas = engine._formulas
+
+        levels = {}
+        for cell in order:
+            levels[cell] = 1 + max((levels[p] for p in precedents[cell]), default=-1)
+        depth = max(levels.values()) + 1
+
+        if depth <= PerformanceConfig.PARALLEL_RECALC_MAX_LEVELS:
+            stages = [[] for _ in range(depth)]
+            for cell in order:
+                stages[levels[cell]].append(cell)
+            stages = [_chunks(stage, workers * BATCHES_PER_WORKER) for stage in stages]
+        else:
+            # One stage of whole components, largest first
+            batches = [[] for _ in range(workers * BATCHES_PER_WORKER)]
+            sizes = [0] * len(batches)
+            for component in sorted(_components(order, precedents), key=len, reverse=True):
+                smallest = sizes.index(min(sizes))
+                batches[smallest].extend(component)
+                sizes[smallest] += len(component)
+            stages = [[batch for batch in batches if batch]]
+
+        logger.info("Parallel recalculation of %d formulas in %d stage(s) on %d workers",
+                    len(order), len(stages), workers)
+        results = {}
+        try:
+            pool = _get_pool(workers)
+            for stage in stages:
+                futures = []
+                for batch in stage:
+                    batch_cells = set(batch)
+                    computed = {p: results[p] for cell in batch for p in precedents[cell]
+                                if p not in batch_cells}
+                    futures.append(pool.submit(
+                        _evaluate_batch, [(cell, formulas[cell]) for cell in batch],
+                        engine.input_snapshot(work, batch), computed))
+                for future in futures:
+                    results.update(future.result())
+        except Exception as e:
+            # BrokenProcessPool, a worker error or an unpicklable value
+            logger.warning("Parallel recalculation failed, evaluating in process: %s", e)
+            shutdown_pool()
+            engine.publish_results(results)
+            for cell in order:
+                if cell not in results:
+                    engine.evaluate(cell)
+            return len(order) + len(circular)
+
+        engine.publish_results(results)
+        return len(order) + len(circular)
@@ -35,6 +35,14 @@ class PerformanceConfig:
     # Progress update interval (every N operations)
     PROGRESS_UPDATE_INTERVAL = 100
     
+    # Rows read from a workbook per batch written into the table by the
+    # streaming Excel import
+    IMPORT_BATCH_ROWS = 2000
+    
+    # Rows read from the cell store per chunk written by the streaming CSV
+    # and JSON exports
+    EXPORT_BATCH_ROWS = 4096
+    
     
     # UI Settings
     # ===========
@@ -52,9 +60,6 @@ class PerformanceConfig:
     # Memory Settings
     # ===============
     
-    # Use virtual rendering (VirtualSpreadsheet) for large tables
-    ENABLE_VIRTUAL_RENDERING = False  # Set True for 100,000+ rows
-    
     # Pre-render buffer (extra rows/cols beyond viewport)
     VIEWPORT_BUFFER_ROWS = 20
     VIEWPORT_BUFFER_COLS = 5
@@ -62,6 +67,16 @@ class PerformanceConfig:
     # Maximum cached rows in memory
     MAX_CACHED_ROWS = 1000
     
+    # Maximum cached laid-out cell texts (QStaticText) of the spreadsheet
+    MAX_CACHED_STATIC_TEXTS = 20000
+    
+    # The text cache always holds at least this many viewports
+    CACHE_MIN_VIEWPORTS = 2
+    
+    # Cell storage of the spreadsheet: 'columnar' (ColumnarDataStore,
+    # per-column maps with interned styles) or 'dict' (LazyDataStore)
+    CELL_STORE_BACKEND = 'columnar'
+    
     
     # Formula Evaluation Settings
     # ==========================
@@ -75,6 +90,21 @@ class PerformanceConfig:
     # Batch size for formula evaluation
     FORMULA_EVAL_BATCH_SIZE = 100
     
+    # Compute SUM/AVERAGE/MIN/MAX/COUNT over ranges from cached numeric
+    # columns (used only when numpy is installed)
+    NUMERIC_COLUMN_CACHE = True
+    
+    # Full recalculations of at least this many formulas run in a pool of
+    # worker processes
+    PARALLEL_RECALC_MIN_FORMULAS = 20000
+    
+    # Worker processes for parallel recalculation (None: one per CPU core)
+    PARALLEL_RECALC_WORKERS = None
+    
+    # Deepest dependency graph evaluated level by level in parallel; deeper
+    # graphs are split into independent components instead
+    PARALLEL_RECALC_MAX_LEVELS = 64
+    
     
     # Data Persistence Settings
     # ==========================
@@ -105,6 +135,9 @@ class PerformanceConfig:
     # Lazy load data
     LAZY_LOAD_ENABLED = True
     
+    # Frame budget of the spreadsheet paint-time counters (milliseconds)
+    VIEWPORT_FRAME_MS = 16
+    
     
     # Table Limits
     # ============
@@ -189,17 +222,6 @@ class PerformanceConfig:
         
         return strategy
     
-    @classmethod
-    def should_use_virtual_spreadsheet(cls, row_count: int, col_count: int) -> bool:
-        """
-        Determine if VirtualSpreadsheet should be used instead of QTableWidget.
-        
-        Returns True if table is very large.
-        """
-        if cls.ENABLE_VIRTUAL_RENDERING:
-            return row_count > 50000
-        return False
-    
     @classmethod
     def get_chunk_size(cls, operation_type: str) -> int:
         """Get appropriate chunk size for operation."""
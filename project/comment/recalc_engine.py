@@ -0,0 +1,503 @@
+# project\comment\recalc_engine.py
+"""
+Incremental, topologically ordered formula recalculation.
+
+RecalcEngine keeps a persistent dependency graph built from the references
+in each formula's text. Editing a cell marks it and everything downstream of
+it dirty; a recalculation then evaluates only the dirty cells, each after all
+of its precedents, so every cell is evaluated at most once per pass. Cells on
+a reference cycle (and the cells depending on them) get CIRCULAR as their
+result instead of recursing.
+
+A range reference such as SUM(A1:A100000) is one edge to a range node in a
+per-column RangeIndex, not one edge per cell; the formulas affected by a
+changed cell are found by containment.
+
+The host table (the comment Spreadsheet) provides:
+    get_cell_value(row, col): the current value of a cell for formulas.
+    set_formula_result(row, col, result): stores an evaluated result.
+A host publishes a plain value before passing the cell to set_formula, so
+the numeric and lookup caches see the new value.
+"""
+
+import bisect
+import threading
+from collections import defaultdict, deque
+
+from .comment_utils import FormulaParser, formula_references, reference_tokens
+from .lookup_index import LookupIndexCache
+from .numeric_cache import NUMPY_AVAILABLE, NumericColumnCache
+from .performance_config import PerformanceConfig
+
+CIRCULAR = "#CIRC!"
+
+
+def _move_members(cells, moved, moved_cells):
+    """Renames the members of a set of cells in place by a {old: new} mapping."""
+    found = cells & moved_cells
+    if found:
+        cells -= found
+        cells.update(moved[cell] for cell in found)
+
+
+class RangeIndex:
+    """
+    Range references by column, looked up by containment.
+
+    Each column keeps the (top, bottom) spans that cover it with the formula
+    cells referring to them, plus a lazily sorted list of the spans so a
+    lookup only checks the spans starting at or above the row.
+    """
+
+    def __init__(self):
+        self._spans = defaultdict(dict)  # col -> {(top, bottom): formula cells}
+        self._sorted = {}                # col -> sorted [(top, bottom)]
+
+    def add(self, cell_range, cell):
+        top, bottom, left, right = cell_range
+        for col in range(left, right + 1):
+            self._spans[col].setdefault((top, bottom), set()).add(cell)
+            self._sorted.pop(col, None)
+
+    def discard(self, cell_range, cell):
+        top, bottom, left, right = cell_range
+        for col in range(left, right + 1):
+            spans = self._spans.get(col)
+            cells = spans.get((top, bottom)) if spans else None
+            if cells is None:
+                continue
+            cells.discard(cell)
+            if not cells:
+                del spans[(top, bottom)]
+                self._sorted.pop(col, None)
+                if not spans:
+                    del self._spans[col]
+
+    def clear(self):
+        self._spans.clear()
+        self._sorted.clear()
+
+    def move_cells(self, moved):
+        """Renames formula cells by a {old cell: new cell} mapping; the spans stay."""
+        moved_cells = set(moved)
+        for spans in self._spans.values():
+            for cells in spans.values():
+                _move_members(cells, moved, moved_cells)
+
+    def containing(self, row, col):
+        """Returns the formula cells referring to a range that contains (row, col)."""
+        spans = self._spans.get(col)
+        if not spans:
+            return set()
+        ordered = self._sorted.get(col)
+        if ordered is None:
+            ordered = self._sorted[col] = sorted(spans)
+        found = set()
+        for index in range(bisect.bisect_right(ordered, (row, float('inf')))):
+            top, bottom = ordered[index]
+            if bottom >= row:
+                found.update(spans[(top, bottom)])
+        return found
+
+
+class _CellPool:
+    """A set of cells with per-column sorted rows, for range membership queries."""
+
+    def __init__(self, cells):
+        self.cells = cells
+        self._rows = defaultdict(list)
+        for row, col in cells:
+            self._rows[col].append(row)
+        for rows in self._rows.values():
+            rows.sort()
+
+    def within(self, top, bottom, left, right):
+        """Yields the pooled cells inside a range."""
+        if right - left < len(self._rows):
+            cols = (col for col in range(left, right + 1) if col in self._rows)
+        else:
+            cols = (col for col in self._rows if left <= col <= right)
+        for col in cols:
+            rows = self._rows[col]
+            for index in range(bisect.bisect_left(rows, top), bisect.bisect_right(rows, bottom)):
+                yield rows[index], col
+
+
+class RecalcEngine:
+    """Dependency graph and dirty-set driven recalculation of a table's formulas."""
+
+    CIRCULAR = CIRCULAR
+
+    def __init__(self, table):
+        self.table = table
+        self._formulas = {}                 # formula cell -> text without '='
+        self._cell_refs = {}                # formula cell -> single cells it refers to
+        self._range_refs = {}               # formula cell -> (top, bottom, left, right) ranges
+        self._extents = {}                  # formula cell -> (last row, last col) it refers to
+        self._dependents = defaultdict(set)  # cell -> formula cells referring to it directly
+        self._ranges = RangeIndex()
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._lookups = LookupIndexCache(table)
+        self._numeric = None
+        if NUMPY_AVAILABLE and PerformanceConfig.NUMERIC_COLUMN_CACHE:
+            self._numeric = NumericColumnCache(table)
+
+    def get_cell_value(self, row, col):
+        """Reads a cell for the formula being evaluated."""
+        return self.table.get_cell_value(row, col)
+
+    def aggregate_ranges(self, func_name, ranges):
+        """Computes a range aggregate from the numeric column cache, or returns None."""
+        if self._numeric is None:
+            return None
+        return self._numeric.aggregate(func_name, ranges)
+
+    def lookup(self, func_name, bounds, *args):
+        """Answers VLOOKUP/HLOOKUP from the sheet's lookup indexes, or returns None."""
+        return self._lookups.lookup(func_name, bounds, *args)
+
+    def _value_changed(self, cell):
+        self._lookups.invalidate(*cell)
+        if self._numeric is not None:
+            self._numeric.refresh(*cell)
+
+    # ----- graph maintenance -----
+
+    def formula_cells(self):
+        """Returns the cells that hold a formula."""
+        return list(self._formulas)
+
+    def is_formula(self, cell):
+        return cell in self._formulas
+
+    def is_dirty(self, cell):
+        return cell in self._dirty
+
+    def has_dirty(self):
+        return bool(self._dirty)
+
+    def dirty_count(self):
+        return len(self._dirty)
+
+    def dirty_within(self, top, bottom, left, right):
+        """Returns the dirty formula cells inside a range, row by row."""
+        dirty = self._dirty
+        return [(row, col) for row in range(top, bottom + 1) for col in range(left, right + 1)
+                if (row, col) in dirty]
+
+    def formulas_reaching(self, min_row=None, min_col=None):
+        """
+        Returns (cell, text) of the formulas referring to a row at or after
+        min_row, or to a column at or after min_col: the formulas a row or
+        column edit at that position can move references of.
+        """
+        with self._lock:
+            row_limit = float('inf') if min_row is None else min_row
+            col_limit = float('inf') if min_col is None else min_col
+            return [(cell, self._formulas[cell]) for cell, (last_row, last_col) in self._extents.items()
+                    if last_row >= row_limit or last_col >= col_limit]
+
+    def precedents_of(self, cell):
+        """Returns the cells a formula cell refers to, with its ranges expanded."""
+        precedents = set(self._cell_refs.get(cell, ()))
+        for top, bottom, left, right in self._range_refs.get(cell, ()):
+            precedents.update((r, c) for r in range(top, bottom + 1) for c in range(left, right + 1))
+        return precedents
+
+    def dependents_of(self, cell):
+        """Returns the formula cells that refer to a cell, directly or through a range."""
+        dependents = self._ranges.containing(*cell)
+        dependents.update(self._dependents.get(cell, ()))
+        return dependents
+
+    def reset(self, formulas=()):
+        """
+        Rebuilds the graph from scratch.
+
+        Args:
+            formulas: ((row, col), text) pairs, text without the leading '='.
+                All of them are left dirty.
+        """
+        with self._lock:
+            self._formulas.clear()
+            self._cell_refs.clear()
+            self._range_refs.clear()
+            self._extents.clear()
+            self._dependents.clear()
+            self._ranges.clear()
+            self._lookups.clear()
+            if self._numeric is not None:
+                self._numeric.clear()
+            for cell, text in formulas:
+                self._link(cell, text)
+            self._dirty = set(self._formulas)
+
+    def move_cells(self, position):
+        """
+        Moves the formula cells for row or column insertions or removals,
+        keeping the graph without re-parsing it. Formulas on removed cells
+        are dropped. References are left as they are, so the caller then
+        re-registers the formulas whose text the edit rewrote (set_formulas)
+        and invalidates those still referring to cells whose contents moved.
+
+        Args:
+            position: Callable returning where a cell is after the edits, or
+                None if they removed it.
+        """
+        with self._lock:
+            moved = {}
+            for cell in self._formulas:
+                target = position(cell)
+                if target != cell:
+                    moved[cell] = target
+            for cell in [cell for cell, target in moved.items() if target is None]:
+                self._unlink(cell)
+                del moved[cell]
+            if moved:
+                def move(cell):
+                    return moved.get(cell, cell)
+                self._formulas = {move(cell): text for cell, text in self._formulas.items()}
+                self._cell_refs = {move(cell): refs for cell, refs in self._cell_refs.items()}
+                self._range_refs = {move(cell): refs for cell, refs in self._range_refs.items()}
+                self._extents = {move(cell): extent for cell, extent in self._extents.items()}
+                self._dirty = {move(cell) for cell in self._dirty}
+                moved_cells = set(moved)
+                for dependents in self._dependents.values():
+                    _move_members(dependents, moved, moved_cells)
+                self._ranges.move_cells(moved)
+            # Plain values moved too
+            self._lookups.clear()
+            if self._numeric is not None:
+                self._numeric.clear()
+
+    def set_formula(self, cell, text):
+        """
+        Registers the formula of a cell, or None if it now holds a plain value,
+        and marks it and everything depending on it dirty.
+
+        Returns:
+            set: The formula cells that became dirty.
+        """
+        with self._lock:
+            if self._formulas.get(cell) != text:
+                self._unlink(cell)
+                if text is not None:
+                    self._link(cell, text)
+            self._value_changed(cell)
+            return self.invalidate(cell)
+
+    def set_formulas(self, formulas):
+        """
+        set_formula for many (cell, text) pairs under one lock, e.g. the
+        cells of a paste, so that one recalculate covers all of them.
+
+        Returns:
+            set: The formula cells that became dirty.
+        """
+        with self._lock:
+            marked = set()
+            for cell, text in formulas:
+                marked |= self.set_formula(cell, text)
+            return marked
+
+    def invalidate(self, cell):
+        """
+        Marks a cell (if it is a formula) and all of its transitive dependents dirty.
+
+        Returns:
+            set: The formula cells that became dirty.
+        """
+        with self._lock:
+            marked = set()
+            pending = [cell]
+            while pending:
+                current = pending.pop()
+                if current in self._formulas and current not in self._dirty:
+                    self._dirty.add(current)
+                    marked.add(current)
+                for dependent in self.dependents_of(current):
+                    if dependent not in marked and dependent not in self._dirty:
+                        pending.append(dependent)
+            return marked
+
+    def _link(self, cell, text):
+        cells, ranges = formula_references(text)
+        self._formulas[cell] = text
+        self._cell_refs[cell] = set(cells)
+        self._range_refs[cell] = ranges = tuple(set(ranges))
+        for precedent in cells:
+            self._dependents[precedent].add(cell)
+        for cell_range in ranges:
+            self._ranges.add(cell_range, cell)
+        if cells or ranges:
+            self._extents[cell] = (max([r for r, _ in cells] + [r[1] for r in ranges]),
+                                   max([c for _, c in cells] + [r[3] for r in ranges]))
+        else:
+            # No references, or a formula that does not parse: ask the rewriting tokens
+            refs = [piece for piece in reference_tokens('=' + text) if not isinstance(piece, str)]
+            self._extents[cell] = (max((ref[3] for ref in refs), default=-1),
+                                   max((ref[1] for ref in refs), default=-1))
+
+    def _unlink(self, cell):
+        self._formulas.pop(cell, None)
+        self._extents.pop(cell, None)
+        self._dirty.discard(cell)
+        for precedent in self._cell_refs.pop(cell, ()):
+            dependents = self._dependents.get(precedent)
+            if dependents is not None:
+                dependents.discard(cell)
+                if not dependents:
+                    del self._dependents[precedent]
+        for cell_range in self._range_refs.pop(cell, ()):
+            self._ranges.discard(cell_range, cell)
+
+    def _precedents_in(self, cell, pool):
+        """Returns the cells of a _CellPool that a formula cell refers to."""
+        found = {p for p in self._cell_refs.get(cell, ()) if p in pool.cells}
+        for cell_range in self._range_refs.get(cell, ()):
+            found.update(pool.within(*cell_range))
+        return found
+
+    # ----- recalculation -----
+
+    def plan(self, targets=None):
+        """
+        Orders the dirty cells for evaluation.
+
+        Args:
+            targets: Cells that need a current value. Only the dirty cells
+                they transitively depend on are planned. None plans every
+                dirty cell.
+
+        Returns:
+            tuple: (order, circular) where order lists the cells to evaluate,
+            precedents first, and circular holds the cells that are on or
+            downstream of a reference cycle.
+        """
+        with self._lock:
+            if targets is None:
+                work = set(self._dirty)
+            else:
+                # A clean cell never has a dirty precedent, so the walk only
+                # needs to follow dirty cells
+                dirty = _CellPool(self._dirty)
+                work = set()
+                pending = [cell for cell in targets if cell in self._dirty]
+                while pending:
+                    cell = pending.pop()
+                    if cell in work:
+                        continue
+                    work.add(cell)
+                    pending.extend(p for p in self._precedents_in(cell, dirty) if p not in work)
+
+            pool = _CellPool(work)
+            waiting = {}
+            ready = deque()
+            for cell in work:
+                count = len(self._precedents_in(cell, pool))
+                if count:
+                    waiting[cell] = count
+                else:
+                    ready.append(cell)
+
+            order = []
+            while ready:
+                cell = ready.popleft()
+                order.append(cell)
+                for dependent in self.dependents_of(cell):
+                    if dependent in waiting:
+                        waiting[dependent] -= 1
+                        if not waiting[dependent]:
+                            del waiting[dependent]
+                            ready.append(dependent)
+            return order, set(waiting)
+
+    def evaluate(self, cell):
+        """Evaluates one planned cell, publishes its result and marks it clean."""
+        with self._lock:
+            text = self._formulas.get(cell)
+            self._dirty.discard(cell)
+            if text is None:
+                return
+            result = FormulaParser(self, cell).evaluate(text)
+            self.table.set_formula_result(cell[0], cell[1], result)
+            self._value_changed(cell)
+
+    def mark_circular(self, cells):
+        """Publishes CIRCULAR for cells on or behind a reference cycle."""
+        with self._lock:
+            for cell in cells:
+                self._dirty.discard(cell)
+                self.table.set_formula_result(cell[0], cell[1], CIRCULAR)
+                self._value_changed(cell)
+
+    def recalculate(self, targets=None, cancelled=None):
+        """
+        Evaluates the dirty cells (or those the targets depend on) in
+        topological order.
+
+        Args:
+            targets: Cells that need a current value, None for every dirty cell.
+            cancelled: Optional callable checked before each evaluation. When it
+                returns True the pass stops; the cells not reached stay dirty.
+
+        Returns:
+            int: The number of cells that were updated.
+        """
+        with self._lock:
+            order, circular = self.plan(targets)
+            self.mark_circular(circular)
+            for count, cell in enumerate(order):
+                if cancelled is not None and cancelled():
+                    return count + len(circular)
+                self.evaluate(cell)
+            return len(order) + len(circular)
+
+    def recalculate_parallel(self, workers=None):
+        """
+        Evaluates every dirty cell, in worker processes when there are at
+        least PerformanceConfig.PARALLEL_RECALC_MIN_FORMULAS of them.
+
+        Returns:
+            int: The number of cells that were updated.
+        """
+        from .parallel_recalc import recalculate_parallel
+        return recalculate_parallel(self, workers)
+
+    # ----- support for parallel recalculation -----
+
+    def work_precedents(self, order):
+        """Returns {cell: the cells of order it refers to} for planned cells."""
+        with self._lock:
+            pool = _CellPool(set(order))
+            return {cell: self._precedents_in(cell, pool) for cell in order}
+
+    def input_snapshot(self, order, cells=None):
+        """
+        Returns {cell: value} of every cell outside order that the planned
+        formulas of cells (by default all of order) read.
+        """
+        with self._lock:
+            work = order if isinstance(order, (set, frozenset)) else set(order)
+            snapshot = {}
+            ranges = set()
+            for cell in (order if cells is None else cells):
+                for precedent in self._cell_refs.get(cell, ()):
+                    if precedent not in work and precedent not in snapshot:
+                        snapshot[precedent] = self.table.get_cell_value(*precedent)
+                ranges.update(self._range_refs.get(cell, ()))
+            for top, bottom, left, right in ranges:
+                for r in range(top, bottom + 1):
+                    for c in range(left, right + 1):
+                        if (r, c) not in work and (r, c) not in snapshot:
+                            snapshot[(r, c)] = self.table.get_cell_value(r, c)
+            return snapshot
+
+    def publish_results(self, results):
+        """Publishes results computed elsewhere and marks their cells clean."""
+        with self._lock:
+            for cell, result in results.items():
+                self._dirty.discard(cell)
+                self.table.set_formula_result(cell[0], cell[1], result)
+                self._value_changed(cell)
@@ -0,0 +1,147 @@
+# project\comment\render_cache.py
+"""
+Reusable painting objects for the comment spreadsheet.
+
+Painting a cell used to build a QFont, QColor and QPen for it and lay out its
+text with drawText on every frame. The cells of a sheet share a handful of
+interned styles (see StyleTable in cell_store), and most of the visible text
+does not change from one frame to the next, so RenderCache keeps:
+
+- one CellStyle (font, pens and background color) per style tuple, its font
+  derived from the view font, and one pen and color per fixed grid color;
+- a bounded LRU of QStaticText, laid out once per display string and font.
+
+PaintStats records the time spent in paintEvent so frame times can be checked
+on large displays.
+"""
+
+import time
+
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QColor, QFont, QPen, QStaticText, QTransform
+
+from .lru_cache import LRUCache
+from services.table_codec import style_font
+
+
+class CellStyle:
+    """The painting objects of one interned (font_flags, text_color, bg_color) style."""
+
+    __slots__ = ('font', 'text_pen', 'background')
+
+    def __init__(self, font: QFont, text_pen: QPen, background: QColor):
+        self.font = font
+        self.text_pen = text_pen
+        self.background = background
+
+
+class RenderCache:
+    """Pooled styles, colors and prepared static texts of one spreadsheet viewport."""
+
+    def __init__(self, text_capacity: int, default_text_color: str, default_bg_color: str):
+        self.default_text_color = default_text_color
+        self.default_bg_color = default_bg_color
+        self.base_font = QFont()
+        self._styles = {}
+        self._colors = {}
+        self._pens = {}
+        self._texts = LRUCache(text_capacity)
+
+    def color(self, name: str) -> QColor:
+        color = self._colors.get(name)
+        if color is None:
+            color = self._colors[name] = QColor(name)
+        return color
+
+    def pen(self, name: str) -> QPen:
+        pen = self._pens.get(name)
+        if pen is None:
+            pen = self._pens[name] = QPen(self.color(name))
+        return pen
+
+    def style(self, key) -> CellStyle:
+        """Return the pooled CellStyle of a style tuple (see services.table_codec.style_key)."""
+        style = self._styles.get(key)
+        if style is None:
+            flags, text_color, bg_color = key
+            font_props = style_font(flags)
+            font = QFont(self.base_font)
+            font.setBold(font_props['bold'])
+            font.setItalic(font_props['italic'])
+            font.setUnderline(font_props['underline'])
+            style = self._styles[key] = CellStyle(
+                font,
+                self.pen(text_color or self.default_text_color),
+                self.color(bg_color or self.default_bg_color),
+            )
+        return style
+
+    def static_text(self, text: str, flags: int, font: QFont) -> QStaticText:
+        """Return a QStaticText for a display string, laid out for the font of the given flags."""
+        key = (text, flags)
+        static = self._texts.get(key)
+        if static is None:
+            static = QStaticText(text)
+            static.setTextFormat(Qt.TextFormat.PlainText)
+            static.prepare(QTransform(), font)
+            self._texts.put(key, static)
+        return static
+
+    def set_base_font(self, font: QFont):
+        """Derive the style fonts from font; drops the styles and texts laid out for the old one."""
+        self.base_font = QFont(font)
+        self._styles.clear()
+        self._texts.clear()
+
+    def resize(self, text_capacity: int):
+        self._texts.resize(text_capacity)
+
+    def clear(self):
+        """Drop every pooled object, e.g. after a change of theme colors."""
+        self._styles.clear()
+        self._colors.clear()
+        self._pens.clear()
+        self._texts.clear()
+
+    def stats(self) -> dict:
+        return {'styles': len(self._styles), 'texts': self._texts.stats()}
+
+
+class PaintStats:
+    """Frame time counters of paintEvent."""
+
+    def __init__(self, budget_ms: float):
+        self.budget_ms = budget_ms
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.cells = 0
+        self.total_ms = 0.0
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self.over_budget = 0
+
+    def start(self) -> float:
+        return time.perf_counter()
+
+    def finish(self, started: float, cells: int):
+        """Record one frame that began at started and painted cells cells."""
+        elapsed = (time.perf_counter() - started) * 1000.0
+        self.frames += 1
+        self.cells += cells
+        self.total_ms += elapsed
+        self.last_ms = elapsed
+        self.max_ms = max(self.max_ms, elapsed)
+        if elapsed > self.budget_ms:
+            self.over_budget += 1
+
+    def stats(self) -> dict:
+        return {
+            'frames': self.frames,
+            'cells': self.cells,
+            'last_ms': self.last_ms,
+            'max_ms': self.max_ms,
+            'avg_ms': self.total_ms / self.frames if self.frames else 0.0,
+            'over_budget': self.over_budget,
+        }
@@ -0,0 +1,237 @@
+# project\comment\spreadsheet_model.py
+"""
+Table model of the comment spreadsheet.
+
+SpreadsheetModel exposes a cell store (ColumnarDataStore or LazyDataStore,
+per PerformanceConfig.CELL_STORE_BACKEND) to a QTableView. Nothing is
+allocated per cell: the view asks for the cells it paints, and the model
+reads them from the store on demand, so memory and load time follow the
+stored cells and the viewport rather than rows x columns.
+
+Roles:
+    DisplayRole: the shown text, i.e. the evaluated result of a formula
+        (its text until the first result arrives) or the plain value.
+    EditRole: the raw value, formulas included.
+    UserRole: the full cell dict (value, font, text_color, bg_color), as
+        the delegate and the undo commands use it.
+"""
+
+import bisect
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+from .cell_store import CellData, ColumnarDataStore, LazyDataStore
+from .comment_utils import col_int_to_str, format_formula_result
+from .performance_config import PerformanceConfig
+
+
+class SpreadsheetModel(QAbstractTableModel):
+    """Cells of a comment table, read from a sparse cell store on demand."""
+
+    def __init__(self, rows=1000, cols=2, parent=None):
+        super().__init__(parent)
+        if PerformanceConfig.CELL_STORE_BACKEND == 'columnar':
+            self.data_store = ColumnarDataStore(initial_rows=rows, initial_cols=cols)
+        else:
+            self.data_store = LazyDataStore(initial_rows=rows, initial_cols=cols)
+        # Evaluated formula results by (row, col), already formatted for display
+        self._formula_results: Dict[Tuple[int, int], str] = {}
+        self._notify = True
+
+    # ----- QAbstractTableModel -----
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.data_store.row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.data_store.col_count
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.display_text(row, col)
+        if role == Qt.ItemDataRole.EditRole:
+            return self.data_store.get_cell(row, col).value
+        if role == Qt.ItemDataRole.UserRole:
+            return self.cell_data(row, col)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return col_int_to_str(section)
+        return str(section + 1)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEditable
+
+    # ----- cells -----
+
+    def cell_data(self, row: int, col: int) -> Dict:
+        """Return the cell dict of a cell (a fresh copy)."""
+        return self.data_store.get_cell(row, col).to_dict()
+
+    def cell_style(self, row: int, col: int) -> Tuple:
+        """Return the interned (font_flags, text_color, bg_color) style tuple of a cell."""
+        return self.data_store.get_styled_cells(((row, col),))[0][1]
+
+    def display_text(self, row: int, col: int) -> str:
+        value = self.data_store.get_cell(row, col).value
+        if value.startswith('='):
+            return self._formula_results.get((row, col), value)
+        return value
+
+    def set_cell_data(self, row: int, col: int, data: Dict):
+        """Store a cell dict; a cell that no longer holds a formula drops its result."""
+        cell = CellData.from_dict(data)
+        self.data_store.set_cell(row, col, cell)
+        if not cell.value.startswith('='):
+            self._formula_results.pop((row, col), None)
+        self._cell_changed(row, col)
+
+    def set_styled_cells(self, cells: Iterable[Tuple[int, int, str, Tuple]]):
+        """Set (row, col, value, style tuple) cells in one store write."""
+        cells = list(cells)
+        self.data_store.set_styled_cells(cells)
+        for row, col, value, _ in cells:
+            if not value.startswith('='):
+                self._formula_results.pop((row, col), None)
+            self._cell_changed(row, col)
+
+    def set_values(self, cells: Iterable[Tuple[int, int, str]]):
+        """Replace the values of (row, col, value) cells, keeping their styles; values must not be empty."""
+        cells = list(cells)
+        self.data_store.set_values(cells)
+        for row, col, value in cells:
+            if not value.startswith('='):
+                self._formula_results.pop((row, col), None)
+            self._cell_changed(row, col)
+
+    def set_formula_result(self, row: int, col: int, result):
+        self._formula_results[(row, col)] = format_formula_result(result)
+        self._cell_changed(row, col)
+
+    def formula_result(self, row: int, col: int):
+        """Return the displayed result of a formula cell, or None if it has none yet."""
+        return self._formula_results.get((row, col))
+
+    def iter_values(self):
+        """Yield (row, col, value) for every stored cell."""
+        return self.data_store.iter_values()
+
+    def _cell_changed(self, row, col):
+        if self._notify:
+            index = self.index(row, col)
+            self.dataChanged.emit(index, index)
+
+    @contextmanager
+    def batch(self):
+        """Collect the cell notifications of a bulk update into one dataChanged for the table."""
+        if not self._notify:
+            yield
+            return
+        self._notify = False
+        try:
+            yield
+        finally:
+            self._notify = True
+            if self.rowCount() and self.columnCount():
+                self.dataChanged.emit(self.index(0, 0),
+                                      self.index(self.rowCount() - 1, self.columnCount() - 1))
+
+    # ----- structure -----
+
+    def load(self, table_data):
+        """Replace every cell with table data in the sparse or the dense encoding."""
+        self.beginResetModel()
+        self.data_store.load_all_data(table_data)
+        self._formula_results.clear()
+        self.endResetModel()
+
+    def set_shape(self, rows: int, cols: int):
+        """Grow or shrink the table at its end."""
+        if cols > self.columnCount():
+            self.insert_columns(self.columnCount(), cols - self.columnCount())
+        elif cols < self.columnCount():
+            self.remove_columns(range(cols, self.columnCount()))
+        if rows > self.rowCount():
+            self.insert_rows(self.rowCount(), rows - self.rowCount())
+        elif rows < self.rowCount():
+            self.remove_rows(range(rows, self.rowCount()))
+
+    def insert_rows(self, index: int, count: int):
+        """Insert count empty rows before index."""
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), index, index + count - 1)
+        self.data_store.insert_rows(index, count)
+        self._remap_results(0, lambda r: r + count if r >= index else r)
+        self.endInsertRows()
+
+    def insert_columns(self, index: int, count: int):
+        """Insert count empty columns before index."""
+        if count <= 0:
+            return
+        self.beginInsertColumns(QModelIndex(), index, index + count - 1)
+        self.data_store.insert_columns(index, count)
+        self._remap_results(1, lambda c: c + count if c >= index else c)
+        self.endInsertColumns()
+
+    def remove_rows(self, rows: Iterable[int]) -> Dict[Tuple[int, int], CellData]:
+        """
+        Remove rows, one contiguous block at a time from the bottom.
+
+        Returns:
+            dict: The stored cells of the removed rows by their former (row, col).
+        """
+        return self._remove(0, rows, self.rowCount(), self.beginRemoveRows, self.endRemoveRows,
+                            self.data_store.remove_rows)
+
+    def remove_columns(self, cols: Iterable[int]) -> Dict[Tuple[int, int], CellData]:
+        """
+        Remove columns, one contiguous block at a time from the right.
+
+        Returns:
+            dict: The stored cells of the removed columns by their former (row, col).
+        """
+        return self._remove(1, cols, self.columnCount(), self.beginRemoveColumns, self.endRemoveColumns,
+                            self.data_store.remove_columns)
+
+    def _remove(self, axis, positions, limit, begin, end, remove):
+        removed = sorted({pos for pos in positions if 0 <= pos < limit})
+        saved = {}
+        # Blocks from the end, so the positions of the remaining blocks stay valid
+        blocks = []
+        for pos in removed:
+            if blocks and blocks[-1][1] == pos - 1:
+                blocks[-1][1] = pos
+            else:
+                blocks.append([pos, pos])
+        for first, last in reversed(blocks):
+            begin(QModelIndex(), first, last)
+            saved.update(remove(range(first, last + 1)))
+            end()
+        self._remap_results(axis, _position_after_removal(removed))
+        return saved
+
+    def _remap_results(self, axis: int, remap):
+        """Move formula results after a structural edit of rows (axis 0) or columns (axis 1)."""
+        results = {}
+        for key, value in self._formula_results.items():
+            pos = remap(key[axis])
+            if pos is not None:
+                results[(pos, key[1]) if axis == 0 else (key[0], pos)] = value
+        self._formula_results = results
+
+
+def _position_after_removal(removed):
+    """Return a mapping of old to new positions (None if removed) for sorted removed positions."""
+    removed_set = set(removed)
+    return lambda pos: None if pos in removed_set else pos - bisect.bisect_left(removed, pos)
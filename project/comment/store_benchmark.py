@@ -0,0 +1,76 @@
+# project\comment\store_benchmark.py
+"""
+Memory benchmark of the comment spreadsheet cell stores.
+
+Fills LazyDataStore and ColumnarDataStore with the same cells and reports
+the memory they retain, measured with tracemalloc, along with the time to
+fill them and to read a 60 x 10 viewport.
+
+Usage:
+    python -m project.comment.store_benchmark [cell_count ...]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from .cell_store import CellData, ColumnarDataStore, LazyDataStore
+
+DEFAULT_CELL_COUNTS = (10_000, 100_000, 1_000_000)
+COLUMNS = 20
+TEXT_COLORS = (None, None, None, '#c00000', '#0070c0')
+BG_COLORS = (None, None, None, None, '#ffff00', '#e2efda')
+
+
+def make_cells(cell_count, cols=COLUMNS):
+    """Yield (row, col, CellData) for a table of cell_count populated cells."""
+    for index in range(cell_count):
+        row, col = divmod(index, cols)
+        yield row, col, CellData(
+            value=f"=A{row + 1}*2" if col == cols - 1 else f"Item {index}",
+            font={'bold': row % 10 == 0, 'italic': False, 'underline': col == 0},
+            text_color=TEXT_COLORS[row % len(TEXT_COLORS)],
+            bg_color=BG_COLORS[col % len(BG_COLORS)],
+        )
+
+
+def measure(store_class, cell_count, cols=COLUMNS):
+    """
+    Fill a store of store_class and measure it.
+
+    Returns:
+        dict: 'memory' (bytes retained), 'fill' and 'viewport' (seconds).
+    """
+    rows = (cell_count + cols - 1) // cols
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    store = store_class(initial_rows=rows, initial_cols=cols)
+    for row, col, cell in make_cells(cell_count, cols):
+        store.set_cell(row, col, cell)
+    fill_time = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    top = rows // 2
+    store.get_visible_range(top, top + 59, 0, 9)
+    viewport_time = time.perf_counter() - started
+    return {'memory': memory, 'fill': fill_time, 'viewport': viewport_time}
+
+
+def run(cell_counts=DEFAULT_CELL_COUNTS):
+    """Run the benchmark and print one line per store and size."""
+    print(f"{'cells':>10}  {'store':<18} {'memory':>10} {'bytes/cell':>10} {'fill':>8} {'viewport':>9}")
+    for cell_count in cell_counts:
+        for store_class in (LazyDataStore, ColumnarDataStore):
+            result = measure(store_class, cell_count)
+            print(f"{cell_count:>10}  {store_class.__name__:<18} "
+                  f"{result['memory'] / 1024 / 1024:>8.1f}MB "
+                  f"{result['memory'] / cell_count:>10.0f} "
+                  f"{result['fill']:>7.2f}s "
+                  f"{result['viewport'] * 1000:>7.2f}ms")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_CELL_COUNTS)
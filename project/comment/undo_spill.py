@@ -0,0 +1,52 @@
+# project\comment\undo_spill.py
+"""
+Spillable cell diffs of comment table undo commands.
+
+The cell edits, pastes and row/column removals on a table's undo stack keep
+their cells as a compact CellDiff wrapped in a DiffRecord. When the undo
+history of the project exceeds its memory budget, EditService's
+UndoMemoryManager pickles the diffs of cold commands to its spill file
+through the record; a spilled diff is read back when its command is undone
+or redone. The record keeps its SpillBlock, which the manager releases when
+the command is deleted.
+"""
+import pickle
+
+from services.undo_memory import SpillFile
+
+
+class DiffRecord:
+    """The CellDiff of one undo command, held in memory or spilled to a SpillFile."""
+
+    def __init__(self, diff):
+        diff.compact()
+        self._diff = diff
+        self.nbytes = diff.nbytes()
+        self._spill_file = None
+        self._block = None
+
+    @property
+    def in_memory(self) -> bool:
+        return self._diff is not None
+
+    def get(self):
+        """Returns the diff, reading it back from the spill file if needed."""
+        if self._diff is None:
+            self._diff = pickle.loads(self._spill_file.read(self._block))
+        return self._diff
+
+    def spill(self, spill_file: SpillFile):
+        """
+        Drops the diff from memory; a diff spilled before is not written again.
+
+        Returns:
+            SpillBlock: The block written, or None.
+        """
+        if self._diff is None:
+            return None
+        written = None
+        if self._block is None:
+            written = self._block = spill_file.write(pickle.dumps(self._diff, pickle.HIGHEST_PROTOCOL))
+            self._spill_file = spill_file
+        self._diff = None
+        return written
@@ -13,6 +13,8 @@ from PySide6.QtCore import Qt, QMimeData, QDate, QTime, QDateTime
 from PySide6.QtGui import QAction, QUndoStack, QUndoCommand, QKeySequence, QColor, QBrush
 from main_window.services.icon_service import IconService
 from main_window.widgets.tree import CustomTreeWidget
+from services.edit_service import EditService
+from services.undo_memory import SpillableAttribute
 
 # Import optimization utilities
 try:
@@ -34,6 +36,19 @@ DATA_TYPE_RANGES = {
 
 # --- Undo Commands ---
 
+def _rows_record(table, removed=(), inserted=(), changed=()):
+    """
+    Autosave journal record of a tag list edit: the rows removed, in removal
+    order, then the rows inserted and changed, read from the saved tag list.
+    """
+    tags = table.tag_data.get('tags', [])
+    return {
+        'op': 'rows',
+        'remove': list(removed),
+        'insert': [[row, tags[row]] for row in inserted],
+        'set': [[row, tags[row]] for row in changed],
+    }
+
 class TagChangeCommand(QUndoCommand):
     """Command for changing a single cell's value."""
     def __init__(self, table, row, col, old_val, new_val, child_key=None, text="Edit Tag"):
@@ -57,8 +72,13 @@ class TagChangeCommand(QUndoCommand):
         self.table.block_signals(False)
         self.table.save_data()
 
+    def journal_changes(self, undone):
+        return _rows_record(self.table, changed=[self.row])
+
 class TagAddCommand(QUndoCommand):
     """Command for adding a new tag."""
+    tag_data = SpillableAttribute()
+
     def __init__(self, table, row_index, tag_data, text="Add Tag"):
         super().__init__(text)
         self.table = table
@@ -77,8 +97,15 @@ class TagAddCommand(QUndoCommand):
         self.table.block_signals(False)
         self.table.save_data()
 
+    def journal_changes(self, undone):
+        if undone:
+            return _rows_record(self.table, removed=[self.row_index])
+        return _rows_record(self.table, inserted=[self.row_index])
+
 class TagRemoveCommand(QUndoCommand):
     """Command for removing tags with optimized batch processing for large deletions."""
+    rows_data = SpillableAttribute()
+
     def __init__(self, table, rows_data, text="Remove Tag"):
         super().__init__(text)
         self.table = table
@@ -125,8 +152,16 @@ class TagRemoveCommand(QUndoCommand):
         self.table.block_signals(False)
         self.table.save_data()
 
+    def journal_changes(self, undone):
+        rows = [row for row, _ in self.rows_data]
+        if undone:
+            return _rows_record(self.table, inserted=reversed(rows))
+        return _rows_record(self.table, removed=rows)
+
 class TagCutCommand(QUndoCommand):
     """Command for cutting (removing) tags."""
+    rows_data = SpillableAttribute()
+
     def __init__(self, table, rows_data, text="Cut Tags"):
         super().__init__(text)
         self.table = table
@@ -146,8 +181,16 @@ class TagCutCommand(QUndoCommand):
         self.table.block_signals(False)
         self.table.save_data()
 
+    def journal_changes(self, undone):
+        rows = [row for row, _ in self.rows_data]
+        if undone:
+            return _rows_record(self.table, inserted=reversed(rows))
+        return _rows_record(self.table, removed=rows)
+
 class TagPasteCommand(QUndoCommand):
     """Command for pasting tags."""
+    tags_data = SpillableAttribute()
+
     def __init__(self, table, row_index, tags_data, text="Paste Tags"):
         super().__init__(text)
         self.table = table
@@ -168,6 +211,12 @@ class TagPasteCommand(QUndoCommand):
         self.table.block_signals(False)
         self.table.save_data()
 
+    def journal_changes(self, undone):
+        rows = range(self.row_index, self.row_index + len(self.tags_data))
+        if undone:
+            return _rows_record(self.table, removed=reversed(rows))
+        return _rows_record(self.table, inserted=rows)
+
 
 # --- Delegates ---
 
@@ -477,6 +526,9 @@ class TagTable(QWidget):
         self.main_window = main_window
         self.undo_stack = QUndoStack(self)
         self.undo_stack.setUndoLimit(100)  # Limit to 100 operations to prevent unbounded growth
+        self.edit_service = EditService()
+        self._stack_id = f"tag_{self.tag_data.get('number')}"
+        self.edit_service.register_undo_stack(self._stack_id, self.undo_stack)
         
         if 'tags' not in self.tag_data:
             self.tag_data['tags'] = []
@@ -1087,6 +1139,10 @@ class TagTable(QWidget):
         QMessageBox.information(self, "Paste", f"Pasted {len(tags_to_paste)} tag(s).")
 
 
+    def cleanup(self):
+        """Clean up resources when the tag table is closed."""
+        self.edit_service.unregister_undo_stack(self._stack_id)
+
     def save_data(self):
         tags = []
         for row in range(self.table.topLevelItemCount()):
@@ -1102,4 +1158,4 @@ class TagTable(QWidget):
                     self.main_window.project_service.project_data['tag_lists'] = {}
                 
                 self.main_window.project_service.project_data['tag_lists'][tag_number] = self.tag_data
-                self.main_window.project_service.mark_as_unsaved()
\ No newline at end of file
+                self.main_window.project_service.mark_as_unsaved('tag_lists', tag_number)
\ No newline at end of file
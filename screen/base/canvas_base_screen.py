@@ -228,7 +228,7 @@ class CanvasBaseScreen(QGraphicsView):
         
         # Drag/move undo tracking state
         self._drag_started = False
-        self._drag_initial_positions = {}  # {item_id: QPointF}
+        self._drag_initial_positions = {}  # {item id (str): QPointF}
         # Controls whether drag-resize object snapping applies position delta here.
         # Keep this True when BaseGraphicObject.itemChange handles only grid snapping.
         self._apply_object_snap_delta_during_drag = True
@@ -238,6 +238,15 @@ class CanvasBaseScreen(QGraphicsView):
         self.view_service.grid_size_changed.connect(lambda: self.canvas_widget.update())
         self.view_service.snapping_mode_changed.connect(lambda: self.canvas_widget.update())
 
+        # Graphic objects on the scene by their id (as a string), in stacking
+        # order; kept current by create_graphic_item_from_data and
+        # graphics_item_removed, read through item_by_id. _item_ranks holds
+        # the registration count of each id, to order a subset of the items
+        self._items_by_id = {}
+        self._item_ranks = {}
+        self._registrations = 0
+        self.graphics_item_removed.connect(self._unregister_item)
+
         # Restore items from screen data
         self._restore_items()
 
@@ -248,32 +257,54 @@ class CanvasBaseScreen(QGraphicsView):
                 # Pass is_restoring=True to prevent signal emission during restore
                 self.create_graphic_item_from_data(item_data, is_restoring=True)
 
+    def _serialize_item(self, item):
+        """Returns the data dict of a graphic item with its current geometry, or None."""
+        item_data = item.data(Qt.ItemDataRole.UserRole)
+        if not item_data:
+            return None
+        rect = item.boundingRect()
+        item_data['rect'] = [rect.x(), rect.y(), rect.width(), rect.height()]
+        item_data['pos'] = [item.pos().x(), item.pos().y()]
+
+        # Save corner radii for rectangles
+        if hasattr(item, 'corner_radii'):
+            item_data['corner_radii'] = item.corner_radii
+        if hasattr(item, 'rounded_enabled'):
+            item_data['rounded_enabled'] = item.rounded_enabled
+        return item_data
+
+    def items_data(self, item_ids=None):
+        """
+        Returns the serialized data of the graphic items on the canvas.
+
+        Args:
+            item_ids (iterable, optional): Only return items with these ids.
+
+        Returns:
+            list: Item data dicts, in scene order.
+        """
+        if item_ids is None:
+            items = [item for item in self.scene.items() if isinstance(item, BaseGraphicObject)]
+        else:
+            items = self.items_by_ids(dict.fromkeys(str(item_id) for item_id in item_ids))
+            # Topmost first like scene.items(): by z-value, then latest registered
+            items.sort(key=lambda item: (item.zValue(), self._item_ranks.get(self._item_id(item), 0)),
+                       reverse=True)
+        items_list = []
+        for item in items:
+            item_data = self._serialize_item(item)
+            if item_data:
+                items_list.append(item_data)
+        return items_list
+
     def save_items(self):
         """Saves current graphical items to screen data."""
         logger.debug("Saving items to screen data.")
-        items_list = []
         try:
-            for item in self.scene.items():
-                if not isinstance(item, BaseGraphicObject):
-                    continue
-
-                item_data = item.data(Qt.ItemDataRole.UserRole)
-                if item_data:
-                    rect = item.boundingRect()
-                    item_data['rect'] = [rect.x(), rect.y(), rect.width(), rect.height()]
-                    item_data['pos'] = [item.pos().x(), item.pos().y()]
-                    
-                    # Save corner radii for rectangles
-                    if hasattr(item, 'corner_radii'):
-                        item_data['corner_radii'] = item.corner_radii
-                    if hasattr(item, 'rounded_enabled'):
-                        item_data['rounded_enabled'] = item.rounded_enabled
-                    
-                    items_list.append(item_data)
-
+            items_list = self.items_data()
             self.screen_data['items'] = items_list
             logger.debug(f"Saved {len(items_list)} items.")
-            self.project_service.mark_as_unsaved()
+            self.project_service.mark_as_unsaved('screens', self.screen_data)
         except Exception as e:
             logger.error(f"CRITICAL: Error saving items: {e}", exc_info=True)
 
@@ -341,6 +372,7 @@ class CanvasBaseScreen(QGraphicsView):
                 item.setZValue(data['z_value'])
             
             self.scene.addItem(item)
+            self._register_item(item, data)
             self._add_overlays(item, data)
             
             # Only emit signal for newly created items, not restored ones
@@ -381,13 +413,55 @@ class CanvasBaseScreen(QGraphicsView):
         self.save_items()
         return new_item
 
+    def _register_item(self, item, data):
+        """Adds a graphic object to the id registry, on top of the stacking order."""
+        item_id = data.get('id')
+        if item_id is not None:
+            key = str(item_id)
+            self._items_by_id.pop(key, None)
+            self._items_by_id[key] = item
+            self._registrations += 1
+            self._item_ranks[key] = self._registrations
+
+    def _unregister_item(self, item):
+        """Drops a graphic object leaving the scene from the id registry."""
+        key = self._item_id(item)
+        if key is not None and self._items_by_id.get(key) is item:
+            del self._items_by_id[key]
+            del self._item_ranks[key]
+
+    @staticmethod
+    def _item_id(item):
+        """Returns the id of a graphic object as a registry key, or None."""
+        item_data = item.data(Qt.ItemDataRole.UserRole)
+        if isinstance(item_data, dict) and item_data.get('id') is not None:
+            return str(item_data['id'])
+        return None
+
+    def item_by_id(self, item_id):
+        """Returns the graphic object with an id, or None if it is not on the scene."""
+        key = str(item_id)
+        item = self._items_by_id.get(key)
+        if item is not None and item.scene() != self.scene:
+            # Taken off the scene without graphics_item_removed
+            del self._items_by_id[key]
+            del self._item_ranks[key]
+            return None
+        return item
+
+    def items_by_ids(self, item_ids):
+        """Returns the graphic objects with the given ids that are on the scene, in id order."""
+        items = (self.item_by_id(item_id) for item_id in item_ids)
+        return [item for item in items if item is not None]
+
+    def graphic_items(self):
+        """Returns the graphic objects on the scene; for equal z-values, topmost first as scene.items()."""
+        return [item for item in reversed(list(self._items_by_id.values())) if item.scene() == self.scene]
+
     def _generate_next_id(self):
         """Generates the next sequential numeric ID for an object."""
         max_id = 0
-        for item in self.scene.items():
-            if not isinstance(item, BaseGraphicObject):
-                continue
-                
+        for item in self.graphic_items():
             item_data = item.data(Qt.ItemDataRole.UserRole)
             if item_data and 'id' in item_data:
                 try:
@@ -622,16 +696,15 @@ class CanvasBaseScreen(QGraphicsView):
         new_positions = []
         
         for item_id, old_pos in self._drag_initial_positions.items():
-            # Find the item by checking scene items
-            for item in self.scene.items():
-                if isinstance(item, BaseGraphicObject) and id(item) == item_id:
-                    new_pos = item.pos()
-                    # Only include if position actually changed
-                    if old_pos != new_pos:
-                        items.append(item)
-                        old_positions.append(old_pos)
-                        new_positions.append(QPointF(new_pos))
-                    break
+            item = self.item_by_id(item_id)
+            if item is None:
+                continue
+            new_pos = item.pos()
+            # Only include if position actually changed
+            if old_pos != new_pos:
+                items.append(item)
+                old_positions.append(old_pos)
+                new_positions.append(QPointF(new_pos))
         
         if items and old_positions and new_positions:
             command = MoveItemsCommand(items, old_positions, new_positions, "Move Items", self)
@@ -754,10 +827,12 @@ class CanvasBaseScreen(QGraphicsView):
                 logger.debug("Interaction[%s] mode=drag tracked=%s", self._active_interaction_id, len(items_to_drag))
                 self._drag_initial_positions = {}
                 for item in items_to_drag:
-                    self._drag_initial_positions[id(item)] = QPointF(item.pos())
+                    item_id = self._item_id(item)
+                    if item_id is not None:
+                        self._drag_initial_positions[item_id] = QPointF(item.pos())
                 tracked_ids = set(self._drag_initial_positions.keys())
                 if clicking_on_selected and selected_items:
-                    selected_ids = {id(item) for item in selected_items}
+                    selected_ids = {self._item_id(item) for item in selected_items} - {None}
                     if tracked_ids != selected_ids:
                         logger.warning(
                             "Drag tracking mismatch: tracked=%s selected=%s",
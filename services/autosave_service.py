@@ -0,0 +1,787 @@
+# services\autosave_service.py
+"""
+Write-ahead journal for crash recovery.
+
+Every change to the open project is appended as a small JSON record to a
+journal next to the project file ('<file>.journal'), or in the temp directory
+for untitled projects. Records are derived from the undo stacks registered
+in EditService and from ProjectService change notifications, so the cost of
+an edit is proportional to the edit:
+
+    cells    comment cells set by a cell edit or bulk edit
+    resize   comment rows/columns inserted or removed, with the cells the
+             edit restored or whose formulas it rewrote
+    rows     tag list rows removed, inserted or changed, by index
+    items    canvas items touched by a command (put/drop by id)
+    payload  full payload of an entry, for commands without a cheaper record
+    entry    a new sectioned entry, with its payload
+    stub     entry metadata (everything except the payload)
+    delete   a removed entry
+    value    a non-sectioned project_data value
+
+Writes happen on a JournalWriterThread. After a successful save the records
+covered by it are dropped from the journal, and when the editor is idle the
+service emits fold_requested so the window can save into the main file.
+"""
+import copy
+import json
+import os
+import queue
+import tempfile
+import time
+import logging
+from functools import partial
+
+from PySide6.QtCore import QObject, QThread, QTimer, QLockFile, Signal
+
+from .project_container import PAYLOAD_KEYS
+from .project_writer import iter_section_entries
+from .table_codec import apply_cells, resize_table
+from .undo_commands import affected_item_ids
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_VERSION = 1
+JOURNAL_SUFFIX = '.journal'
+UNTITLED_JOURNAL_DIR = 'hmi_designer'
+IDLE_FOLD_INTERVAL_MS = 30000
+
+# project_data keys that are rebuilt on save and never journaled
+_UNJOURNALED_KEYS = ('content',)
+
+
+def journal_path_for(file_path, project_id):
+    """Returns the journal path for a project file, or for an untitled project."""
+    if file_path:
+        return file_path + JOURNAL_SUFFIX
+    return os.path.join(tempfile.gettempdir(), UNTITLED_JOURNAL_DIR,
+                        f"untitled-{project_id}{JOURNAL_SUFFIX}")
+
+
+def file_stamp(file_path):
+    """Returns [mtime_ns, size] of a file, or None if it does not exist."""
+    if not file_path:
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def read_journal(journal_path):
+    """
+    Reads a journal file.
+
+    A torn last line (the process died mid-write) is ignored.
+
+    Returns:
+        tuple: (header dict or None, list of record dicts)
+    """
+    header = None
+    records = []
+    with open(journal_path, 'r', encoding='utf-8') as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring unreadable journal line in {journal_path}")
+                break
+            if header is None:
+                if record.get('type') != 'header':
+                    logger.warning(f"Journal without header: {journal_path}")
+                    return None, []
+                header = record
+            else:
+                records.append(record)
+    return header, records
+
+
+def find_untitled_journals():
+    """Returns the journals of untitled projects, newest first."""
+    directory = os.path.join(tempfile.gettempdir(), UNTITLED_JOURNAL_DIR)
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(JOURNAL_SUFFIX)]
+    except OSError:
+        return []
+    paths = [os.path.join(directory, name) for name in names]
+    return sorted(paths, key=lambda path: os.path.getmtime(path), reverse=True)
+
+
+def lock_journal(journal_path):
+    """
+    Takes the lock that marks a journal as owned by a running session.
+
+    Returns:
+        QLockFile or None if another running instance owns the journal.
+    """
+    # The directory of untitled journals may not exist yet
+    os.makedirs(os.path.dirname(journal_path) or '.', exist_ok=True)
+    lock = QLockFile(journal_path + '.lock')
+    # Only treat the lock as stale when its owning process is gone
+    lock.setStaleLockTime(0)
+    if lock.tryLock(0):
+        return lock
+    return None
+
+
+# ========== Replay ==========
+
+def _get_entry(container, key):
+    for entry_key, entry in iter_section_entries(None, container):
+        if entry_key == key:
+            return entry
+    return None
+
+
+def _put_entry(container, key, entry):
+    if isinstance(container, dict):
+        container[key] = entry
+        return
+    for index, (entry_key, _) in enumerate(iter_section_entries(None, container)):
+        if entry_key == key:
+            container[index] = entry
+            return
+    container.append(entry)
+
+
+def _remove_entry(container, key):
+    if isinstance(container, dict):
+        container.pop(key, None)
+        return
+    for index, (entry_key, _) in enumerate(iter_section_entries(None, container)):
+        if entry_key == key:
+            del container[index]
+            return
+
+
+def _apply_items(items, put, drop):
+    items = list(items) if isinstance(items, list) else []
+    positions = {str(item.get('id')): index for index, item in enumerate(items)
+                 if isinstance(item, dict)}
+    for item_data in put:
+        index = positions.get(str(item_data.get('id')))
+        if index is None:
+            positions[str(item_data.get('id'))] = len(items)
+            items.append(item_data)
+        else:
+            items[index] = item_data
+    dropped = {str(item_id) for item_id in drop}
+    return [item for item in items
+            if not (isinstance(item, dict) and str(item.get('id')) in dropped)]
+
+
+def _apply_rows(rows, remove, insert, changed):
+    rows = list(rows) if isinstance(rows, list) else []
+    for index in remove:
+        if 0 <= index < len(rows):
+            del rows[index]
+    for index, row_data in insert:
+        rows.insert(index, row_data)
+    for index, row_data in changed:
+        if 0 <= index < len(rows):
+            rows[index] = row_data
+    return rows
+
+
+def apply_journal_record(project_service, record):
+    """
+    Applies one journal record to project_service.project_data and marks the
+    touched entry dirty.
+
+    Returns:
+        bool: False if the record could not be applied.
+    """
+    op = record.get('op')
+    section = record.get('s')
+    key = record.get('k')
+    project_data = project_service.project_data
+
+    if op == 'value':
+        project_data[section] = record.get('value')
+        project_service.mark_as_unsaved(section)
+        return True
+
+    payload_key = PAYLOAD_KEYS.get(section)
+    if payload_key is None or key is None:
+        return False
+    container = project_data.get(section)
+    if not isinstance(container, (dict, list)):
+        container = [] if section == 'screens' else {}
+        project_data[section] = container
+
+    if op == 'delete':
+        _remove_entry(container, key)
+        project_service.mark_as_unsaved(section, key)
+        return True
+
+    if op in ('entry', 'stub'):
+        entry = dict(record.get('entry') or {})
+        if op == 'entry' and 'payload' in record:
+            entry[payload_key] = record['payload']
+        elif _get_entry(container, key) is not None:
+            payload = project_service.load_entry_payload(section, key)
+            if payload is not None:
+                entry[payload_key] = payload
+        _put_entry(container, key, entry)
+        project_service.mark_as_unsaved(section, key)
+        return True
+
+    entry = _get_entry(container, key)
+    if not isinstance(entry, dict):
+        return False
+    payload = project_service.load_entry_payload(section, key)
+    if op == 'payload':
+        entry[payload_key] = record.get('payload')
+    elif op == 'cells':
+        entry[payload_key] = apply_cells(payload, record.get('cells', []))
+    elif op == 'items':
+        entry[payload_key] = _apply_items(payload, record.get('put', []), record.get('drop', []))
+    elif op == 'rows':
+        entry[payload_key] = _apply_rows(payload, record.get('remove', []), record.get('insert', []),
+                                         record.get('set', []))
+    elif op == 'resize':
+        resized = resize_table(payload, record['action'], record['index'], record['count'])
+        entry[payload_key] = apply_cells(resized, record.get('cells', []))
+    else:
+        return False
+    project_service.mark_as_unsaved(section, key)
+    return True
+
+
+# ========== Writer thread ==========
+
+def encode_record(record):
+    """Encodes a journal record as one line of JSON."""
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+
+class JournalWriterThread(QThread):
+    """
+    Appends journal records off the UI thread.
+
+    Operations are queued and processed in order; each batch of appends is
+    flushed and fsynced once. Records are queued already encoded, as they
+    refer to live project data the UI keeps changing.
+    """
+
+    failed = Signal(str)
+
+    def __init__(self, journal_path, header, resume=False):
+        super().__init__()
+        self._queue = queue.Queue()
+        self._path = journal_path
+        self._header = header
+        self._resume = resume
+        self._handle = None
+
+    def append(self, line):
+        """Queues an encoded record (see encode_record) for appending."""
+        self._queue.put(('append', line))
+
+    def compact(self, after_seq, journal_path, header):
+        """Drops records with seq <= after_seq and moves the journal to journal_path."""
+        self._queue.put(('compact', (after_seq, journal_path, header)))
+
+    def stop(self, remove=False):
+        self._queue.put(('stop', remove))
+
+    def run(self):
+        try:
+            self._open()
+        except OSError as e:
+            logger.error(f"Cannot open autosave journal {self._path}: {e}")
+            self.failed.emit(str(e))
+            return
+
+        running = True
+        while running:
+            operations = [self._queue.get()]
+            # Drain whatever else is already queued into the same batch
+            while True:
+                try:
+                    operations.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                pending_sync = False
+                for kind, argument in operations:
+                    if kind == 'append':
+                        self._handle.write(argument + '\n')
+                        pending_sync = True
+                    elif kind == 'compact':
+                        self._sync()
+                        pending_sync = False
+                        self._compact(*argument)
+                    elif kind == 'stop':
+                        if pending_sync:
+                            self._sync()
+                        self._close(remove=argument)
+                        running = False
+                        break
+                if running and pending_sync:
+                    self._sync()
+            except Exception as e:
+                logger.error(f"Autosave journal write failed: {e}", exc_info=True)
+                self.failed.emit(str(e))
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self._path) or '.', exist_ok=True)
+        if self._resume and os.path.exists(self._path):
+            self._handle = open(self._path, 'a', encoding='utf-8')
+        else:
+            self._handle = open(self._path, 'w', encoding='utf-8')
+            self._handle.write(json.dumps(self._header, ensure_ascii=False) + '\n')
+            self._sync()
+
+    def _sync(self):
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+
+    def _compact(self, after_seq, journal_path, header):
+        self._handle.close()
+        self._handle = None
+        _, records = read_journal(self._path)
+        kept = [record for record in records if record.get('seq', 0) > after_seq]
+
+        directory = os.path.dirname(journal_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix='.hmi-journal-', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as handle:
+                handle.write(json.dumps(header, ensure_ascii=False) + '\n')
+                for record in kept:
+                    handle.write(encode_record(record) + '\n')
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(tmp_path, journal_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            # Keep appending to the uncompacted journal
+            self._handle = open(self._path, 'a', encoding='utf-8')
+            raise
+
+        if journal_path != self._path:
+            self._remove_file(self._path)
+            self._path = journal_path
+        self._header = header
+        self._handle = open(self._path, 'a', encoding='utf-8')
+        logger.debug(f"Autosave journal compacted: {len(kept)} records kept")
+
+    def _close(self, remove):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        if remove:
+            self._remove_file(self._path)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove autosave journal {path}: {e}")
+
+
+# ========== Service ==========
+
+class _WatchedDocument:
+    """An open screen, comment table or tag list whose undo stack is journaled."""
+
+    def __init__(self, stack_id, section, key, payload_getter, items_getter):
+        self.stack_id = stack_id
+        self.section = section
+        self.key = key
+        self.payload_getter = payload_getter
+        self.items_getter = items_getter
+        self.stack = None
+        self.index = 0
+        # The command below the index, to tell a merge from a push at the undo limit
+        self.top = None
+        self.slot = None
+
+
+class AutosaveService(QObject):
+    """
+    Journals project changes for crash recovery.
+
+    Usage: start_session() after a project is created or opened, and
+    watch_document() for each opened editor tab. end_session() discards the
+    journal when the project is closed cleanly.
+    """
+
+    fold_requested = Signal()
+
+    def __init__(self, project_service, edit_service, parent=None):
+        super().__init__(parent)
+        self.project_service = project_service
+        self.edit_service = edit_service
+        self._writer = None
+        self._lock = None
+        self._journal_path = None
+        self._seq = 0
+        self._documents = {}
+        self._stubs = {}
+        self._pending_payloads = {}
+        self._replaying = False
+
+        self._idle_timer = QTimer(self)
+        self._idle_timer.setSingleShot(True)
+        self._idle_timer.setInterval(IDLE_FOLD_INTERVAL_MS)
+        self._idle_timer.timeout.connect(self.fold_requested.emit)
+
+        project_service.add_change_listener(self._on_project_changed)
+        edit_service.undo_stack_registered.connect(self._on_stack_registered)
+        edit_service.undo_stack_unregistered.connect(self._on_stack_unregistered)
+
+    @property
+    def journal_path(self):
+        return self._journal_path
+
+    @property
+    def is_active(self):
+        return self._writer is not None
+
+    # ---------- Session ----------
+
+    def _make_header(self):
+        return {
+            'type': 'header',
+            'version': JOURNAL_VERSION,
+            'project_id': self.project_service.project_id,
+            'file_path': self.project_service.file_path,
+            'base_stamp': file_stamp(self.project_service.file_path),
+            'created': time.time(),
+        }
+
+    def start_session(self, resume_records=None):
+        """
+        Starts journaling the current project.
+
+        Args:
+            resume_records (list, optional): Records already in the journal
+                (after a recovery); they are kept and numbering continues.
+        """
+        self.end_session(remove=resume_records is None)
+        journal_path = journal_path_for(self.project_service.file_path,
+                                        self.project_service.project_id)
+        lock = lock_journal(journal_path)
+        if lock is None:
+            logger.warning(f"Autosave disabled: {journal_path} is in use by another instance")
+            return
+
+        self._lock = lock
+        self._journal_path = journal_path
+        self._seq = max((record.get('seq', 0) for record in resume_records or []), default=0)
+        self._stubs = self._capture_stubs()
+        self._writer = JournalWriterThread(journal_path, self._make_header(),
+                                           resume=resume_records is not None)
+        self._writer.failed.connect(self._on_writer_failed)
+        self._writer.start()
+        logger.debug(f"Autosave journal started: {journal_path}")
+
+    def end_session(self, remove=True):
+        """Stops journaling; by default the journal file is deleted."""
+        self._idle_timer.stop()
+        self._pending_payloads.clear()
+        if self._writer is not None:
+            self._writer.stop(remove=remove)
+            self._writer.wait()
+            self._writer.deleteLater()
+            self._writer = None
+        if self._lock is not None:
+            self._lock.unlock()
+            self._lock = None
+        self._journal_path = None
+
+    def _on_writer_failed(self, message):
+        logger.error(f"Autosave journal disabled: {message}")
+        writer = self._writer
+        self._writer = None
+        if writer is not None:
+            writer.stop(remove=False)
+            writer.wait()
+            writer.deleteLater()
+
+    def current_seq(self):
+        """Flushes coalesced records and returns the last journaled sequence number."""
+        self.flush_pending()
+        return self._seq
+
+    def on_project_saved(self, saved_seq):
+        """
+        Drops the records covered by a save that was snapshotted at saved_seq.
+        The journal follows the project file if it was saved under a new name.
+        """
+        if self._writer is None:
+            return
+        journal_path = journal_path_for(self.project_service.file_path,
+                                        self.project_service.project_id)
+        if journal_path != self._journal_path:
+            lock = lock_journal(journal_path)
+            if lock is None:
+                logger.warning(f"Autosave journal {journal_path} is in use by another instance")
+                self.end_session(remove=True)
+                return
+            self._lock.unlock()
+            self._lock = lock
+            self._journal_path = journal_path
+        self._writer.compact(saved_seq, journal_path, self._make_header())
+        self._idle_timer.stop()
+
+    # ---------- Recovery ----------
+
+    def replay(self, records):
+        """
+        Applies journal records to the current project.
+
+        Returns:
+            int: The number of records applied.
+        """
+        applied = 0
+        self._replaying = True
+        try:
+            for record in sorted(records, key=lambda record: record.get('seq', 0)):
+                try:
+                    if apply_journal_record(self.project_service, record):
+                        applied += 1
+                except Exception as e:
+                    logger.warning(f"Skipping journal record {record.get('seq')}: {e}")
+        finally:
+            self._replaying = False
+        logger.info(f"Replayed {applied} of {len(records)} journal records")
+        return applied
+
+    # ---------- Documents ----------
+
+    def watch_document(self, stack_id, section, key, payload_getter, items_getter=None):
+        """
+        Journals the undo stack registered in EditService under stack_id.
+
+        Args:
+            stack_id (str): EditService stack id.
+            section (str): 'screens', 'comments' or 'tag_lists'.
+            key: Entry key of the document within the section.
+            payload_getter (callable): Returns the document's current payload;
+                used for commands without a cheaper record.
+            items_getter (callable, optional): For canvases, returns the
+                current data of the items with the given ids.
+        """
+        self.unwatch_document(stack_id)
+        document = _WatchedDocument(stack_id, section, str(key), payload_getter, items_getter)
+        self._documents[stack_id] = document
+        stack = self.edit_service.get_undo_stack(stack_id)
+        if stack is not None:
+            self._attach(document, stack)
+
+    def unwatch_document(self, stack_id):
+        document = self._documents.pop(stack_id, None)
+        if document is not None:
+            self._flush_document(document)
+            self._detach(document)
+
+    def _attach(self, document, stack):
+        self._detach(document)
+        document.stack = stack
+        document.index = stack.index()
+        document.top = stack.command(document.index - 1) if document.index else None
+        document.slot = partial(self._on_index_changed, document.stack_id)
+        stack.indexChanged.connect(document.slot)
+
+    def _detach(self, document):
+        if document.stack is not None and document.slot is not None:
+            try:
+                document.stack.indexChanged.disconnect(document.slot)
+            except (RuntimeError, TypeError):
+                # The stack was already destroyed
+                pass
+        document.stack = None
+        document.slot = None
+
+    def _on_stack_registered(self, stack_id, stack):
+        # A document that swaps its undo stack re-registers under the same id
+        document = self._documents.get(stack_id)
+        if document is not None:
+            self._attach(document, stack)
+
+    def _on_stack_unregistered(self, stack_id):
+        document = self._documents.get(stack_id)
+        if document is not None:
+            self._flush_document(document)
+            self._detach(document)
+
+    def _on_index_changed(self, stack_id, index):
+        document = self._documents.get(stack_id)
+        if document is None or document.stack is None:
+            return
+        stack = document.stack
+        previous, previous_top = document.index, document.top
+        document.index = index
+        document.top = stack.command(index - 1) if index else None
+        if self._writer is None or self._replaying:
+            return
+
+        if index > previous:
+            for position in range(previous, index):
+                self._journal_command(document, stack.command(position), undone=False)
+        elif index < previous:
+            for position in range(previous - 1, index - 1, -1):
+                self._journal_command(document, stack.command(position), undone=True)
+        elif index and stack.undoLimit() and stack.count() >= stack.undoLimit() \
+                and document.top is not previous_top:
+            # A push at the undo limit, which dropped the oldest command
+            self._journal_command(document, document.top, undone=False)
+        else:
+            # Merged command: the change is not addressable
+            self._schedule_payload(document)
+        self._idle_timer.start()
+
+    def _journal_command(self, document, command, undone):
+        if command is None:
+            self._schedule_payload(document)
+            return
+        if command.childCount():
+            children = [command.child(i) for i in range(command.childCount())]
+            for child in reversed(children) if undone else children:
+                self._journal_command(document, child, undone)
+            return
+
+        journal_changes = getattr(command, 'journal_changes', None)
+        if callable(journal_changes):
+            record = journal_changes(undone)
+            if record is not None:
+                self._append(document.section, document.key, record)
+                return
+
+        if document.items_getter is not None:
+            item_ids = affected_item_ids(command)
+            if item_ids:
+                items = document.items_getter(item_ids)
+                present = {str(item.get('id')) for item in items}
+                self._append(document.section, document.key, {
+                    'op': 'items',
+                    'put': items,
+                    'drop': sorted(item_ids - present),
+                })
+                return
+
+        self._schedule_payload(document)
+
+    def _schedule_payload(self, document):
+        # Several structural commands in one event loop turn produce one record
+        if not self._pending_payloads:
+            QTimer.singleShot(0, self.flush_pending)
+        self._pending_payloads[document.stack_id] = document
+
+    def flush_pending(self):
+        """Writes coalesced payload records now."""
+        pending = list(self._pending_payloads.values())
+        self._pending_payloads.clear()
+        for document in pending:
+            self._write_payload(document)
+
+    def _flush_document(self, document):
+        if self._pending_payloads.pop(document.stack_id, None) is not None:
+            self._write_payload(document)
+
+    def _write_payload(self, document):
+        if self._writer is None:
+            return
+        try:
+            payload = document.payload_getter()
+        except RuntimeError:
+            # The editor was deleted before the record was written
+            return
+        self._append(document.section, document.key, {'op': 'payload', 'payload': payload})
+
+    # ---------- Project changes ----------
+
+    def _capture_stubs(self):
+        stubs = {}
+        for section, payload_key in PAYLOAD_KEYS.items():
+            for entry_key, entry in iter_section_entries(section, self.project_service.project_data.get(section)):
+                if isinstance(entry, dict):
+                    stubs[(section, entry_key)] = self._entry_stub(entry, payload_key)
+        return stubs
+
+    @staticmethod
+    def _entry_stub(entry, payload_key):
+        # Copied so in-place edits of the live entry are detected later
+        return copy.deepcopy({k: v for k, v in entry.items() if k != payload_key})
+
+    def _on_project_changed(self, section, key):
+        if self._writer is None or self._replaying:
+            return
+        if section is None:
+            project_data = self.project_service.project_data
+            for top_key in list(project_data):
+                if top_key in PAYLOAD_KEYS:
+                    self._journal_section(top_key)
+                elif top_key not in _UNJOURNALED_KEYS:
+                    self._append(top_key, None, {'op': 'value',
+                                                 'value': copy.deepcopy(project_data[top_key])})
+        elif section not in PAYLOAD_KEYS:
+            if section not in _UNJOURNALED_KEYS:
+                value = self.project_service.project_data.get(section)
+                self._append(section, None, {'op': 'value', 'value': copy.deepcopy(value)})
+        elif key is None:
+            self._journal_section(section)
+        else:
+            entry = None
+            for entry_key, candidate in iter_section_entries(section, self.project_service.project_data.get(section)):
+                if entry_key == key:
+                    entry = candidate
+                    break
+            if self._journal_entry(section, key, entry) == 'entry':
+                # A new key may be a renamed entry; drop the one that vanished
+                self._journal_section(section)
+        self._idle_timer.start()
+
+    def _journal_section(self, section):
+        seen = set()
+        for entry_key, entry in iter_section_entries(section, self.project_service.project_data.get(section)):
+            seen.add(entry_key)
+            self._journal_entry(section, entry_key, entry)
+        for stub_section, entry_key in list(self._stubs):
+            if stub_section == section and entry_key not in seen:
+                self._journal_entry(section, entry_key, None)
+
+    def _journal_entry(self, section, key, entry):
+        """Journals the difference between an entry and its last journaled stub."""
+        previous = self._stubs.get((section, key))
+        if not isinstance(entry, dict):
+            if previous is not None:
+                del self._stubs[(section, key)]
+                self._append(section, key, {'op': 'delete'})
+                return 'delete'
+            return None
+
+        payload_key = PAYLOAD_KEYS[section]
+        stub = self._entry_stub(entry, payload_key)
+        if previous is None:
+            self._stubs[(section, key)] = stub
+            record = {'op': 'entry', 'entry': stub}
+            if payload_key in entry:
+                record['payload'] = entry[payload_key]
+            self._append(section, key, record)
+            return 'entry'
+        if stub != previous:
+            self._stubs[(section, key)] = stub
+            self._append(section, key, {'op': 'stub', 'entry': stub})
+            return 'stub'
+        return None
+
+    def _append(self, section, key, record):
+        if self._writer is None:
+            return
+        self._seq += 1
+        record['seq'] = self._seq
+        record['s'] = section
+        record['k'] = key
+        self._writer.append(encode_record(record))
@@ -0,0 +1,153 @@
+# services\batch_jobs.py
+"""
+Batch export and import of project tables.
+
+Exporting or importing many comment tables or tag lists is mostly JSON
+encoding and decoding, which is pure Python and holds the GIL. A
+BatchJobThread fans the per-table tasks out over a pool of worker processes
+(a thread pool for small batches, where starting processes would cost more
+than it saves) and reports aggregate progress, so the UI thread only
+gathers the tasks and merges the results.
+
+Tasks are module-level functions so that they can run in a spawned process.
+A table whose payload has not been loaded from the project file yet is
+passed as its (ContainerReader, member name) source and read by the worker
+itself, without loading it into the project first.
+"""
+import csv
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from PySide6.QtCore import QThread, Signal
+
+logger = logging.getLogger(__name__)
+
+# Batches of fewer tasks run on threads
+PROCESS_POOL_MIN_TASKS = 8
+
+# Worker processes or threads (None: one per CPU core)
+BATCH_JOB_WORKERS = None
+
+
+def batch_file_path(file_path, number):
+    """Returns the file of one table of a batch export, e.g. 'comments_12.json' for 'comments.json'."""
+    root, ext = os.path.splitext(file_path)
+    return f"{root}_{number}{ext}"
+
+
+def write_export_file(file_path, root_key, entry, payload_key, source, file_format):
+    """
+    Writes one exported table.
+
+    Args:
+        file_path (str): Destination file.
+        root_key (str): 'comments' or 'tags', the list the entry is written in.
+        entry (dict): The table's metadata, with its payload unless source is set.
+        payload_key (str): 'table_data' or 'tags'.
+        source (tuple): (ContainerReader, member name) of a payload still on
+            disk, or None.
+        file_format (str): 'json' or 'csv'.
+
+    Returns:
+        str: The file written.
+    """
+    if source is not None:
+        reader, name = source
+        payload = reader.read(name)
+        if payload:
+            entry = dict(entry, **{payload_key: payload})
+
+    if file_format == 'csv':
+        with open(file_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=sorted(entry.keys()))
+            writer.writeheader()
+            writer.writerow(entry)
+    else:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump({root_key: [entry]}, f, indent=2, ensure_ascii=False)
+    return file_path
+
+
+def read_import_file(file_path, root_key):
+    """
+    Reads the entries of an exported file: a list, a {root_key: [...]} dict
+    or a single entry in JSON, or one entry per row in CSV.
+
+    Returns:
+        list: The entries, in file order.
+    """
+    if file_path.endswith('.csv'):
+        entries = []
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                # Convert number to int if present
+                if 'number' in row:
+                    row['number'] = int(row['number'])
+                entries.append(row)
+        return entries
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        imported_data = json.load(f)
+    if isinstance(imported_data, list):
+        return imported_data
+    if isinstance(imported_data, dict) and root_key in imported_data:
+        return imported_data[root_key]
+    return [imported_data]
+
+
+class BatchJobThread(QThread):
+    """
+    Runs one function over a list of argument tuples on a worker pool.
+
+    Emits progress(done, total) as tasks complete, then
+    job_finished(results, errors): results in task order (None for a task
+    that failed or was cancelled) and a list of (task index, message).
+    """
+
+    progress = Signal(int, int)
+    job_finished = Signal(object, object)
+
+    def __init__(self, function, tasks, workers=None):
+        super().__init__()
+        self.function = function
+        self.tasks = list(tasks)
+        self.workers = workers or BATCH_JOB_WORKERS or os.cpu_count() or 1
+        self.cancelled = False
+        self._cancel_requested = False
+
+    def cancel(self):
+        """Requests cancellation; running tasks finish, queued ones are dropped."""
+        self._cancel_requested = True
+
+    def run(self):
+        total = len(self.tasks)
+        results = [None] * total
+        errors = []
+        workers = max(1, min(self.workers, total))
+        if workers > 1 and total >= PROCESS_POOL_MIN_TASKS:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers)
+
+        done = 0
+        with pool:
+            futures = {pool.submit(self.function, *args): index for index, args in enumerate(self.tasks)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    logger.error(f"Batch task {index} failed: {e}")
+                    errors.append((index, str(e)))
+                done += 1
+                self.progress.emit(done, total)
+                if self._cancel_requested:
+                    for pending in futures:
+                        pending.cancel()
+                    self.cancelled = True
+                    break
+        errors.sort()
+        self.job_finished.emit(results, errors)
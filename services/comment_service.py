@@ -10,6 +10,26 @@ class CommentService:
     """
     def __init__(self):
         self._comments_data = {}
+        self._table_data_loader = None
+        self._change_listener = None
+
+    def set_table_data_loader(self, loader):
+        """
+        Sets a callable `loader(comment_number)` that returns the table data of
+        a comment whose payload has not been read from the project file yet.
+        """
+        self._table_data_loader = loader
+
+    def set_change_listener(self, listener):
+        """
+        Sets a callable `listener(comment_number)` that is invoked whenever a
+        comment's table data or metadata changes.
+        """
+        self._change_listener = listener
+
+    def _notify_changed(self, comment_number_str):
+        if self._change_listener:
+            self._change_listener(comment_number_str)
 
     def load_data(self, data):
         """Loads all comment data from a project file."""
@@ -21,12 +41,17 @@ class CommentService:
 
     def get_comment(self, comment_number):
         """Gets the full comment object (metadata and table data)."""
-        return self._comments_data.get(str(comment_number))
+        comment = self._comments_data.get(str(comment_number))
+        if comment is not None and 'table_data' not in comment and self._table_data_loader:
+            table_data = self._table_data_loader(comment_number)
+            comment['table_data'] = table_data if table_data is not None else []
+        return comment
 
     def get_table_data(self, comment_number):
         """
         Retrieves the spreadsheet data for a specific comment table.
-        Returns a list of lists representing rows and columns.
+        Returns a sparse table (see table_codec), or the legacy list of lists
+        for tables that have not been re-saved since they were loaded.
         """
         comment = self.get_comment(comment_number)
         return comment.get('table_data', []) if comment else []
@@ -34,11 +59,12 @@ class CommentService:
     def update_table_data(self, comment_number, table_data):
         """
         Updates the spreadsheet data for a specific comment table.
-        `table_data` should be a list of lists.
+        `table_data` should be a sparse table (see table_codec) or a list of lists.
         """
         comment_number_str = str(comment_number)
         if comment_number_str in self._comments_data:
             self._comments_data[comment_number_str]['table_data'] = table_data
+            self._notify_changed(comment_number_str)
         else:
             logger.warning(f"Attempted to update data for non-existent comment {comment_number}")
 
@@ -53,6 +79,7 @@ class CommentService:
                 'metadata': comment_metadata,
                 'table_data': []  # Initialize with empty data
             }
+            self._notify_changed(number_str)
 
     def remove_comment(self, comment_number):
         """Removes a comment from the service."""
@@ -68,6 +95,7 @@ class CommentService:
         number_str = str(number)
         if number_str in self._comments_data:
             self._comments_data[number_str]['metadata'] = comment_metadata
+            self._notify_changed(number_str)
 
     def clear_data(self):
         """Clears all comment data, used when creating a new project."""
@@ -10,6 +10,7 @@ from enum import Enum, auto
 import copy
 
 from debug_utils import get_logger
+from .undo_memory import UNDO_MEMORY_BUDGET_MB, UndoMemoryManager
 
 logger = get_logger(__name__)
 
@@ -33,6 +34,7 @@ class EditService(QObject):
     - Singleton pattern for global access
     - QUndoGroup for managing multiple QUndoStack instances (one per document/widget)
     - Typed clipboard storage with discriminators
+    - Project-wide undo memory budget (UndoMemoryManager)
     - Unified edit operation dispatcher
     
     Signals:
@@ -48,6 +50,8 @@ class EditService(QObject):
     can_redo_changed = Signal(bool)
     undo_text_changed = Signal(str)
     redo_text_changed = Signal(str)
+    undo_stack_registered = Signal(str, object)
+    undo_stack_unregistered = Signal(str)
 
     def __new__(cls):
         if cls._instance is None:
@@ -78,7 +82,11 @@ class EditService(QObject):
         # Map of widget/document IDs to their undo stacks
         self._undo_stacks = {}
         
+        # Spills cold undo history to disk once all stacks exceed the budget
+        self.undo_memory = UndoMemoryManager(UNDO_MEMORY_BUDGET_MB * 1024 * 1024)
+        
         # Connect undo group signals
+        self.undo_group.activeStackChanged.connect(self.undo_memory.set_active_stack)
         self.undo_group.canUndoChanged.connect(self._on_can_undo_changed)
         self.undo_group.canRedoChanged.connect(self._on_can_redo_changed)
         self.undo_group.undoTextChanged.connect(self._on_undo_text_changed)
@@ -161,7 +169,9 @@ class EditService(QObject):
         
         self._undo_stacks[stack_id] = undo_stack
         self.undo_group.addStack(undo_stack)
+        self.undo_memory.add_stack(stack_id, undo_stack)
         logger.debug(f"Registered undo stack: {stack_id}")
+        self.undo_stack_registered.emit(stack_id, undo_stack)
     
     def unregister_undo_stack(self, stack_id):
         """
@@ -173,7 +183,9 @@ class EditService(QObject):
         if stack_id in self._undo_stacks:
             stack = self._undo_stacks.pop(stack_id)
             self.undo_group.removeStack(stack)
+            self.undo_memory.remove_stack(stack_id)
             logger.debug(f"Unregistered undo stack: {stack_id}")
+            self.undo_stack_unregistered.emit(stack_id)
     
     def get_undo_stack(self, stack_id):
         """
@@ -221,6 +233,17 @@ class EditService(QObject):
         self.register_undo_stack(stack_id, stack)
         return stack
 
+    def get_undo_memory_stats(self):
+        """
+        Returns the approximate memory held by the registered undo stacks.
+        
+        Returns:
+            dict: 'budget_bytes', 'in_memory_bytes', 'spill_file_bytes' and
+            'spill_file_dead_bytes' of all stacks, and 'stacks' mapping each stack ID to its 'commands',
+            'in_memory_bytes' and 'spilled_bytes'
+        """
+        return self.undo_memory.stats()
+
     # ========== Undo/Redo Operations ==========
     
     def undo(self):
@@ -0,0 +1,235 @@
+# services\project_container.py
+"""
+Indexed single-file container for .hmi projects.
+
+Layout:
+    header   MAGIC, offset and length of the table of contents
+    entries  zlib-compressed UTF-8 JSON blobs, one per member
+    toc      zlib-compressed JSON: {"format", "version", "project_id",
+             "file_path", "entries": {member_name: [offset, length]},
+             "digests": {member_name: content_hash}}
+
+The 'project' member holds project_data with the heavy payloads stripped:
+screen 'items', comment 'table_data' and tag list 'tags'. Each of those
+payloads is stored as its own member ("comments/3", "tag_lists/1",
+"screens/base:2") so it can be read on demand.
+"""
+import hashlib
+import json
+import os
+import struct
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'HMIPRJ\x00\x02'
+HEADER_FORMAT = '<8sQQ'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+CONTAINER_FORMAT = 'hmi-container'
+CONTAINER_VERSION = '2.0'
+PROJECT_MEMBER = 'project'
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# The key of each sectioned entry that is stored as a separate member.
+PAYLOAD_KEYS = {
+    'screens': 'items',
+    'comments': 'table_data',
+    'tag_lists': 'tags',
+}
+
+
+class ContainerError(Exception):
+    """Raised for unreadable or inconsistent container files."""
+
+
+def encode_value(value):
+    """Encodes a JSON-serializable value the way members are stored."""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def content_hash(value=None, encoded=None):
+    """
+    Returns a short digest of a value's stored encoding.
+
+    Pass `encoded` to hash bytes already produced by encode_value().
+    """
+    if encoded is None:
+        encoded = encode_value(value)
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def member_name(section, entry_key):
+    """Returns the container member name for a sectioned entry."""
+    return f"{section}/{entry_key}"
+
+
+def is_container_file(file_path):
+    """Returns True if the file starts with the container magic."""
+    try:
+        with open(file_path, 'rb') as handle:
+            return handle.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def read_toc(handle):
+    """Reads the table of contents from an open container file."""
+    handle.seek(0)
+    header = handle.read(HEADER_SIZE)
+    if len(header) != HEADER_SIZE:
+        raise ContainerError("Truncated project container header")
+    magic, toc_offset, toc_length = struct.unpack(HEADER_FORMAT, header)
+    if magic != MAGIC:
+        raise ContainerError("Not a project container")
+    handle.seek(toc_offset)
+    raw = handle.read(toc_length)
+    if len(raw) != toc_length:
+        raise ContainerError("Truncated project container table of contents")
+    toc = json.loads(zlib.decompress(raw).decode('utf-8'))
+    if toc.get('format') != CONTAINER_FORMAT:
+        raise ContainerError(f"Unknown container format: {toc.get('format')}")
+    return toc
+
+
+def read_member(handle, toc, name):
+    """Reads and decodes a member; raises KeyError if it does not exist."""
+    offset, length = toc['entries'][name]
+    handle.seek(offset)
+    raw = handle.read(length)
+    if len(raw) != length:
+        raise ContainerError(f"Truncated container member: {name}")
+    return json.loads(zlib.decompress(raw).decode('utf-8'))
+
+
+class ContainerReader:
+    """
+    Reads members from a container on disk.
+
+    The table of contents is cached and re-read only when the file changes,
+    so lazy loads stay valid after the file is replaced by a save.
+    """
+
+    def __init__(self, file_path, project_id=None):
+        self.file_path = file_path
+        self.project_id = project_id
+        self._toc = None
+        self._toc_stamp = None
+
+    def _stamp(self):
+        stat = os.stat(self.file_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def toc(self, handle=None):
+        stamp = self._stamp()
+        if self._toc is None or stamp != self._toc_stamp:
+            if handle is None:
+                with open(self.file_path, 'rb') as own_handle:
+                    toc = read_toc(own_handle)
+            else:
+                toc = read_toc(handle)
+            if self.project_id and toc.get('project_id') != self.project_id:
+                raise ContainerError("Project file was replaced by a different project")
+            self._toc = toc
+            self._toc_stamp = stamp
+        return self._toc
+
+    def has_member(self, name):
+        return name in self.toc()['entries']
+
+    def read(self, name):
+        with open(self.file_path, 'rb') as handle:
+            return read_member(handle, self.toc(handle), name)
+
+
+class ContainerWriter:
+    """Writes members sequentially to an open binary file handle."""
+
+    def __init__(self, handle):
+        self._handle = handle
+        self._entries = {}
+        self._digests = {}
+        handle.write(struct.pack(HEADER_FORMAT, MAGIC, 0, 0))
+
+    def write_member(self, name, value, compress_level=1):
+        """Encodes and writes a JSON-serializable value as a member."""
+        self.write_encoded(name, encode_value(value), compress_level)
+
+    def write_encoded(self, name, encoded, compress_level=1):
+        """Writes a member from bytes produced by encode_value()."""
+        self._digests[name] = content_hash(encoded=encoded)
+        compressor = zlib.compressobj(compress_level)
+        offset = self._handle.tell()
+        for start in range(0, len(encoded), COPY_BUFFER_SIZE):
+            self._handle.write(compressor.compress(encoded[start:start + COPY_BUFFER_SIZE]))
+        self._handle.write(compressor.flush())
+        self._entries[name] = [offset, self._handle.tell() - offset]
+
+    def copy_member(self, name, source_handle, source_toc, source_name=None):
+        """Copies a member's compressed bytes verbatim from another container, optionally renamed."""
+        source_name = source_name or name
+        source_offset, length = source_toc['entries'][source_name]
+        source_handle.seek(source_offset)
+        offset = self._handle.tell()
+        remaining = length
+        while remaining:
+            chunk = source_handle.read(min(remaining, COPY_BUFFER_SIZE))
+            if not chunk:
+                raise ContainerError(f"Truncated container member: {name}")
+            self._handle.write(chunk)
+            remaining -= len(chunk)
+        self._entries[name] = [offset, length]
+        digest = source_toc.get('digests', {}).get(source_name)
+        if digest is not None:
+            self._digests[name] = digest
+
+    def finish(self, project_id, file_path):
+        """Writes the table of contents and patches the header."""
+        toc = {
+            'format': CONTAINER_FORMAT,
+            'version': CONTAINER_VERSION,
+            'project_id': project_id,
+            'file_path': file_path,
+            'entries': self._entries,
+            'digests': self._digests,
+        }
+        raw = zlib.compress(json.dumps(toc, ensure_ascii=False).encode('utf-8'))
+        toc_offset = self._handle.tell()
+        self._handle.write(raw)
+        self._handle.seek(0)
+        self._handle.write(struct.pack(HEADER_FORMAT, MAGIC, toc_offset, len(raw)))
+        self._handle.seek(0, os.SEEK_END)
+        return toc
+
+
+def convert_legacy_project(source_path, target_path=None):
+    """
+    Converts a legacy single-JSON .hmi file to the container format.
+
+    Args:
+        source_path (str): Path of the legacy project file.
+        target_path (str, optional): Output path; defaults to converting in
+            place (the original is kept as '<file>.backup').
+
+    Returns:
+        str: The path of the written container.
+    """
+    # Imported here to avoid a circular import with project_writer.
+    import uuid
+    from .project_writer import ProjectSnapshot, ProjectWriter
+
+    if is_container_file(source_path):
+        raise ContainerError(f"Already a project container: {source_path}")
+
+    with open(source_path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    project_data = data.get('project_data', {})
+
+    target_path = target_path or source_path
+    snapshot = ProjectSnapshot(
+        project_data, target_path, uuid.uuid4().hex,
+        source_reader=None, deferred={}, is_entry_dirty=lambda section, key: True,
+    )
+    ProjectWriter(snapshot).write()
+    logger.info(f"Converted legacy project {source_path} -> {target_path}")
+    return target_path
@@ -1,21 +1,101 @@
 # services\project_service.py
 import json
 import os
+import uuid
 import logging
-import tempfile
-import shutil
 from PySide6.QtWidgets import QMessageBox
 
+from .project_container import (
+    ContainerReader, ContainerError, PAYLOAD_KEYS, PROJECT_MEMBER,
+    content_hash, is_container_file, member_name
+)
+from .project_writer import (
+    ProjectSnapshot, ProjectWriter, ProjectSaveThread, screen_entry_key,
+    iter_section_entries
+)
+
 logger = logging.getLogger(__name__)
 
 class ProjectService:
     """
     A service class to manage project-related data and operations.
+
+    Change tracking works in two steps. mark_as_unsaved() stamps the entries
+    that may have changed with a change serial; is_saved only looks at those
+    marks, so it is cheap enough to ask at any time. check_saved() and saves
+    compare the marked entries by content hash with the state last loaded or
+    saved, hashing each entry once per change, and drop the marks of entries
+    that match it again: editing an entry and undoing the edit leaves the
+    project saved.
     """
     def __init__(self):
         self.project_data = self.get_default_project_data()
         self.file_path = None
-        self.is_saved = True
+        self.project_id = uuid.uuid4().hex
+        # Reader for the container the current payloads are loaded from
+        self._container = None
+        # Entries whose payload has not been read yet, by id(entry):
+        # (entry, member name in _container). Keyed by the entry itself, as
+        # renumbering a screen or table changes its entry key
+        self._deferred = {}
+        self._change_listeners = []
+        # Incremented by every mark_as_unsaved(); marks carry the serial they were made at
+        self._serial = 0
+        self._reset_dirty_marks(all_dirty=False)
+        self._reset_saved_hashes()
+        self._capture_saved_hashes()
+
+    def add_change_listener(self, listener):
+        """
+        Registers a callable `listener(section, key)` that is invoked from
+        mark_as_unsaved() with the same (normalized) arguments.
+        """
+        self._change_listeners.append(listener)
+
+    def _reset_dirty_marks(self, all_dirty):
+        self._all_dirty = all_dirty
+        self._all_dirty_serial = self._serial
+        # Marked sections and (section, entry_key) ids, with their serials
+        self._dirty_sections = {}
+        self._dirty_entries = {}
+
+    def _reset_saved_hashes(self):
+        # Content hashes of the saved state: entry stubs (entry without its
+        # payload) and payloads keyed by (section, entry_key), and the other
+        # top-level values keyed by their key.
+        self._saved_stub_hashes = {}
+        self._saved_payload_hashes = {}
+        self._saved_value_hashes = {}
+        self._hash_cache = {}
+
+    def _capture_saved_hashes(self, payload_digests=None):
+        """
+        Records the current project_data as the saved state.
+
+        Args:
+            payload_digests (dict, optional): Member digests from a container's
+                table of contents, used for payloads that are not loaded.
+        """
+        self._reset_saved_hashes()
+        payload_digests = payload_digests or {}
+        for top_key, value in self.project_data.items():
+            if top_key not in PAYLOAD_KEYS:
+                self._saved_value_hashes[top_key] = content_hash(value)
+                continue
+            payload_key = PAYLOAD_KEYS[top_key]
+            for entry_key, entry in iter_section_entries(top_key, value):
+                entry_id = (top_key, entry_key)
+                self._saved_stub_hashes[entry_id] = self._stub_hash(entry, payload_key)
+                if isinstance(entry, dict) and payload_key in entry:
+                    self._saved_payload_hashes[entry_id] = content_hash(entry[payload_key])
+                elif member_name(top_key, entry_key) in payload_digests:
+                    self._saved_payload_hashes[entry_id] = payload_digests[member_name(top_key, entry_key)]
+
+    @staticmethod
+    def _stub_hash(entry, payload_key):
+        if isinstance(entry, dict):
+            return content_hash({k: v for k, v in entry.items() if k != payload_key})
+        return content_hash(entry)
 
     def get_default_project_data(self):
         """Returns the default structure for a new project."""
@@ -34,26 +114,54 @@ class ProjectService:
         """Resets the project to a new, unsaved state."""
         self.project_data = self.get_default_project_data()
         self.file_path = None
-        self.is_saved = False
+        self.project_id = uuid.uuid4().hex
+        self._container = None
+        self._deferred = {}
+        # Never saved: nothing to compare with
+        self._reset_dirty_marks(all_dirty=True)
+        self._reset_saved_hashes()
 
     def load_project(self, file_path):
-        """Loads a project from a file."""
+        """
+        Loads a project from a file.
+
+        Container files only load the project skeleton; screen items, comment
+        tables and tag lists are read on demand through load_entry_payload().
+        Legacy single-JSON files are loaded completely and are written back
+        in the container format on the next save.
+        """
         try:
             if not os.path.exists(file_path):
                 logger.error(f"Project file not found: {file_path}")
                 raise FileNotFoundError(f"Project file not found: {file_path}")
 
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
+            if is_container_file(file_path):
+                reader = ContainerReader(file_path)
+                toc = reader.toc()
+                project_data = reader.read(PROJECT_MEMBER)
+                reader.project_id = toc.get('project_id')
+                self.project_id = reader.project_id or uuid.uuid4().hex
+                self._container = reader
+                self._deferred = self._find_deferred_entries(project_data, toc)
+                payload_digests = toc.get('digests')
+            else:
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+                project_data = data.get('project_data', self.get_default_project_data())
+                self.project_id = uuid.uuid4().hex
+                self._container = None
+                self._deferred = {}
+                payload_digests = None
 
             self.file_path = file_path
-            self.project_data = data.get('project_data', self.get_default_project_data())
+            self.project_data = project_data
             # Ensure screen_design_template exists for older projects
             if 'screen_design_template' not in self.project_data:
                 self.project_data['screen_design_template'] = self.get_default_project_data()['screen_design_template']
             if 'comments' not in self.project_data:
                 self.project_data['comments'] = {}
-            self.is_saved = True
+            self._reset_dirty_marks(all_dirty=False)
+            self._capture_saved_hashes(payload_digests)
 
             logger.info(f"Project loaded successfully: {file_path}")
             return True, "Project loaded successfully"
@@ -64,59 +172,102 @@ class ProjectService:
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON format: {e}")
             return False, f"Invalid project file format: {str(e)}"
+        except ContainerError as e:
+            logger.error(f"Invalid project container: {e}")
+            return False, f"Invalid project file format: {str(e)}"
         except Exception as e:
             logger.error(f"Error loading project: {e}", exc_info=True)
             return False, f"Error loading project: {str(e)}"
 
-    def save_project(self, file_path=None):
-        """Saves the project to a file with atomic write and backup."""
-        try:
-            if file_path:
-                self.file_path = file_path
+    @staticmethod
+    def _find_deferred_entries(project_data, toc):
+        deferred = {}
+        for section, payload_key in PAYLOAD_KEYS.items():
+            for entry_key, entry in iter_section_entries(section, project_data.get(section)):
+                name = member_name(section, entry_key)
+                if isinstance(entry, dict) and payload_key not in entry and name in toc['entries']:
+                    deferred[id(entry)] = (entry, name)
+        return deferred
 
-            if not self.file_path:
-                return False, "No file path specified"
+    @staticmethod
+    def _entry_key(section, key):
+        if section == 'screens' and isinstance(key, dict):
+            return screen_entry_key(None, key)
+        return str(key)
 
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+    def _find_entry(self, section, key):
+        """Returns (entry_key, entry) for a sectioned entry, or (None, None)."""
+        key = self._entry_key(section, key)
+        for entry_key, entry in iter_section_entries(section, self.project_data.get(section)):
+            if entry_key == key:
+                return entry_key, entry
+        return None, None
 
-            # Prepare data to save
-            data_to_save = {
-                'project_data': self.project_data,
-                'file_path': self.file_path,
-                'version': '1.0'
-            }
+    def is_entry_loaded(self, section, key):
+        """Returns False while an entry's payload is still only on disk."""
+        _, entry = self._find_entry(section, key)
+        return id(entry) not in self._deferred
+
+    def deferred_payload_source(self, section, key):
+        """
+        Returns (reader, member name) of an entry whose payload is still only
+        in the project container, so that a worker can read it without
+        loading it into the project; None if the payload is in memory.
+        """
+        _, entry = self._find_entry(section, key)
+        if (not isinstance(entry, dict) or self._container is None
+                or id(entry) not in self._deferred or PAYLOAD_KEYS[section] in entry):
+            return None
+        return self._container, self._deferred[id(entry)][1]
+
+    def load_entry_payload(self, section, key):
+        """
+        Returns the payload of a sectioned entry, reading it from the project
+        container first if it has not been loaded yet.
 
-            # Write to temporary file first (atomic write)
-            temp_dir = os.path.dirname(self.file_path)
-            with tempfile.NamedTemporaryFile(
-                mode='w', 
-                delete=False, 
-                suffix='.json',
-                dir=temp_dir,
-                encoding='utf-8'
-            ) as tmp_file:
-                json.dump(data_to_save, tmp_file, indent=2, ensure_ascii=False)
-                tmp_path = tmp_file.name
-
-            # Create backup of existing file if it exists
-            if os.path.exists(self.file_path):
-                backup_path = self.file_path + '.backup'
-                try:
-                    shutil.copy2(self.file_path, backup_path)
-                    logger.info(f"Backup created: {backup_path}")
-                except Exception as e:
-                    logger.warning(f"Failed to create backup: {e}")
-
-            # Atomic move (replace original with temp file)
-            shutil.move(tmp_path, self.file_path)
-
-            self.is_saved = True
-            logger.info(f"Project saved successfully: {self.file_path}")
-            return True, "Project saved successfully"
+        Args:
+            section (str): 'screens', 'comments' or 'tag_lists'.
+            key: Comment or tag list number, or the screen dict for 'screens'.
 
+        Returns:
+            The payload ('items', 'table_data' or 'tags'), or None if the
+            entry does not exist.
+        """
+        entry_key, entry = self._find_entry(section, key)
+        if not isinstance(entry, dict):
+            return None
+
+        payload_key = PAYLOAD_KEYS[section]
+        deferred = self._deferred.pop(id(entry), None)
+        if deferred is not None:
+            if payload_key not in entry:
+                name = deferred[1]
+                if not self._container.has_member(name):
+                    # Renamed by a save that replaced the file meanwhile
+                    name = member_name(section, entry_key)
+                entry[payload_key] = self._container.read(name)
+                self._hash_cache.pop((section, entry_key), None)
+                logger.debug(f"Loaded {section}/{entry_key} on demand")
+                if (section, entry_key) not in self._saved_payload_hashes:
+                    # Written before digests were recorded; the payload is pristine
+                    self._saved_payload_hashes[(section, entry_key)] = content_hash(entry[payload_key])
+        return entry.get(payload_key)
+
+    def save_project(self, file_path=None):
+        """
+        Saves the project synchronously with atomic write and backup.
+
+        Only entries marked dirty since the last save are re-encoded; the
+        others are copied from the previous container file.
+        """
+        snapshot, dirty_token = self.create_save_snapshot(file_path)
+        if snapshot is None:
+            return False, "No file path specified"
+
+        try:
+            toc = ProjectWriter(snapshot).write()
         except PermissionError:
-            logger.error(f"Permission denied saving to {self.file_path}")
+            logger.error(f"Permission denied saving to {snapshot.file_path}")
             return False, "Permission denied. Cannot save to this location."
         except OSError as e:
             logger.error(f"File system error during save: {e}")
@@ -125,11 +276,227 @@ class ProjectService:
             logger.error(f"Error saving project: {e}", exc_info=True)
             return False, f"Error saving project: {str(e)}"
 
-    def mark_as_unsaved(self):
-        """Marks the current project as having unsaved changes."""
+        self.commit_save(snapshot.file_path, toc, dirty_token, snapshot)
+        return True, "Project saved successfully"
+
+    def create_save_thread(self, file_path=None):
+        """
+        Creates a ProjectSaveThread that writes the project off the UI thread.
+
+        The caller starts the thread and, once it reports success, passes it to
+        finish_save_thread() so the saved state is recorded.
+
+        Returns:
+            ProjectSaveThread or None if no file path is known.
+        """
+        snapshot, dirty_token = self.create_save_snapshot(file_path)
+        if snapshot is None:
+            return None
+        return ProjectSaveThread(snapshot, dirty_token)
+
+    def finish_save_thread(self, thread):
+        """Records the result of a completed ProjectSaveThread."""
+        if thread.toc is not None:
+            self.commit_save(thread.snapshot.file_path, thread.toc, thread.dirty_token, thread.snapshot)
+
+    def create_save_snapshot(self, file_path=None):
+        """
+        Captures the data needed for a save.
+
+        Returns:
+            tuple: (ProjectSnapshot, dirty_token), or (None, None) if no file
+                path is known.
+        """
+        target_path = file_path or self.file_path
+        if not target_path:
+            return None, None
+
+        # The marks made up to now are cleared once the save is committed
+        dirty_token = self._serial
+        # Unmarked entries are copied from the saved file; the snapshot
+        # compares the encoding of marked ones with the file's digests
+        candidates = self._candidate_entries()
+        snapshot = ProjectSnapshot(
+            self.project_data, target_path, self.project_id,
+            source_reader=self._container,
+            deferred={entry_id: name for entry_id, (_, name) in self._deferred.items()},
+            is_entry_dirty=lambda section, entry_key: (section, entry_key) in candidates,
+        )
+        return snapshot, dirty_token
+
+    def commit_save(self, file_path, toc, dirty_token, snapshot=None):
+        """
+        Marks the state captured in `dirty_token` and `snapshot` as saved to
+        `file_path`. Changes made while a background save was running stay
+        unsaved.
+        """
+        saved_serial = dirty_token
+        self.file_path = file_path
+        # Deferred payloads were copied into the new file; read them from there.
+        self._container = ContainerReader(file_path, self.project_id)
+        if self._all_dirty_serial <= saved_serial:
+            self._all_dirty = False
+        self._dirty_sections = {section: serial for section, serial in self._dirty_sections.items()
+                                if serial > saved_serial}
+        self._dirty_entries = {entry_id: serial for entry_id, serial in self._dirty_entries.items()
+                               if serial > saved_serial}
+        # Deferred payloads are now stored under their entries' current keys
+        for entry_id, name in (snapshot.deferred_members.items() if snapshot is not None else ()):
+            if entry_id in self._deferred:
+                self._deferred[entry_id] = (self._deferred[entry_id][0], name)
+
+        if snapshot is not None:
+            digests = toc.get('digests', {})
+            self._saved_stub_hashes = dict(snapshot.stub_hashes)
+            self._saved_value_hashes = dict(snapshot.value_hashes)
+            self._saved_payload_hashes = {
+                entry_id: digests[member_name(*entry_id)]
+                for entry_id in snapshot.stub_hashes
+                if member_name(*entry_id) in digests
+            }
+        logger.info(f"Project saved successfully: {file_path}")
+
+    # ========== Change Tracking ==========
+
+    def _candidate_entries(self):
+        """Returns the (section, entry_key) and (top_key, None) ids that may have changed."""
+        candidates = set()
+        if self._all_dirty:
+            sections = set(self.project_data) | set(self._saved_value_hashes)
+            sections |= {section for section, _ in self._saved_stub_hashes}
+        else:
+            sections = set(self._dirty_sections)
+        for section in sections:
+            if section not in PAYLOAD_KEYS:
+                candidates.add((section, None))
+                continue
+            for entry_key, _ in iter_section_entries(section, self.project_data.get(section)):
+                candidates.add((section, entry_key))
+            candidates.update(entry_id for entry_id in self._saved_stub_hashes if entry_id[0] == section)
+        candidates.update(self._dirty_entries)
+        return candidates
+
+    def _current_hashes(self, section, entry_key):
+        """Returns (stub_hash, payload_hash) of an entry, or None if it does not exist."""
+        cache_key = (section, entry_key)
+        if cache_key in self._hash_cache:
+            return self._hash_cache[cache_key]
+
+        if entry_key is None:
+            hashes = (content_hash(self.project_data[section]), None) if section in self.project_data else None
+        else:
+            found_key, entry = self._find_entry(section, entry_key)
+            if found_key is None:
+                hashes = None
+            else:
+                payload_key = PAYLOAD_KEYS[section]
+                payload_hash = None
+                if isinstance(entry, dict) and payload_key in entry:
+                    payload_hash = content_hash(entry[payload_key])
+                hashes = (self._stub_hash(entry, payload_key), payload_hash)
+        self._hash_cache[cache_key] = hashes
+        return hashes
+
+    def _is_modified(self, section, entry_key):
+        hashes = self._current_hashes(section, entry_key)
+        if entry_key is None:
+            saved = self._saved_value_hashes.get(section)
+            return (hashes[0] if hashes else None) != saved
+        entry_id = (section, entry_key)
+        if hashes is None:
+            return entry_id in self._saved_stub_hashes
+        stub_hash, payload_hash = hashes
+        if self._saved_stub_hashes.get(entry_id) != stub_hash:
+            return True
+        if payload_hash is None:
+            # Payload not loaded (still on disk) or the entry has none
+            return self.is_entry_loaded(section, entry_key) and entry_id in self._saved_payload_hashes
+        return self._saved_payload_hashes.get(entry_id) != payload_hash
+
+    def modified_entries(self):
+        """
+        Returns what differs from the last saved state.
+
+        Returns:
+            set: (section, entry_key) for changed, added or removed screens,
+                comment tables and tag lists, and (top_key, None) for other
+                changed project_data values.
+        """
+        return {entry_id for entry_id in self._candidate_entries() if self._is_modified(*entry_id)}
+
+    def is_entry_modified(self, section, key=None):
+        """
+        Returns True if a section or entry differs from the last saved state.
+
+        Args:
+            section (str): Top-level project_data key.
+            key (optional): Entry within a sectioned key (comment or tag list
+                number, or a screen dict); without it the whole section is
+                checked.
+        """
+        if key is not None:
+            return self._is_modified(section, self._entry_key(section, key))
+        if section not in PAYLOAD_KEYS:
+            return self._is_modified(section, None)
+        return any(entry_id[0] == section for entry_id in self.modified_entries())
+
+    @property
+    def is_saved(self):
+        """
+        True when nothing was marked unsaved since the last save or
+        check_saved(). Hashes nothing; an edit that was undone still counts
+        until check_saved() runs.
+        """
+        return not (self._all_dirty or self._dirty_sections or self._dirty_entries)
+
+    def check_saved(self):
+        """
+        Compares the marked entries with the saved state and drops the marks
+        of those that match it. Only entries marked since their last
+        comparison are hashed.
+
+        Returns:
+            bool: is_saved after the comparison.
+        """
         if self.is_saved:
-            self.is_saved = False
-            # self.main_window.update_window_title() # This should be handled by the main window
+            return True
+        modified = self.modified_entries()
+        modified_sections = {section for section, _ in modified}
+        if not modified:
+            self._all_dirty = False
+        self._dirty_sections = {section: serial for section, serial in self._dirty_sections.items()
+                                if section in modified_sections}
+        self._dirty_entries = {entry_id: serial for entry_id, serial in self._dirty_entries.items()
+                               if entry_id in modified}
+        return self.is_saved
+
+    def mark_as_unsaved(self, section=None, key=None):
+        """
+        Marks the current project as having unsaved changes.
+
+        Args:
+            section (str, optional): Top-level project_data key that changed,
+                e.g. 'comments' or 'tag_lists'. Without it every entry is
+                re-encoded on the next save.
+            key (optional): Entry within the section (comment number, tag list
+                number, or a screen dict for 'screens'). Without it the whole
+                section is re-encoded.
+        """
+        self._serial += 1
+        if section is None:
+            self._all_dirty = True
+            self._all_dirty_serial = self._serial
+            self._hash_cache.clear()
+        elif key is None:
+            self._dirty_sections[section] = self._serial
+            for cache_key in [cache_key for cache_key in self._hash_cache if cache_key[0] == section]:
+                del self._hash_cache[cache_key]
+        else:
+            key = self._entry_key(section, key)
+            self._dirty_entries[(section, key)] = self._serial
+            self._hash_cache.pop((section, key), None)
+        for listener in self._change_listeners:
+            listener(section, key)
 
     def get_screen_design_template(self):
         """Returns the project-wide screen design template."""
@@ -138,4 +505,4 @@ class ProjectService:
     def set_screen_design_template(self, template_data):
         """Sets the project-wide screen design template."""
         self.project_data['screen_design_template'] = template_data
-        self.mark_as_unsaved()
+        self.mark_as_unsaved('screen_design_template')
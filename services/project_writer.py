@@ -0,0 +1,285 @@
+# services\project_writer.py
+"""
+Streaming, section-wise serialization of project files.
+
+Projects are written as an indexed container (see project_container): the
+project skeleton plus one member per screen, comment table and tag list.
+Members that were not changed since the previous save, or were never loaded
+from it, are copied verbatim from the previous file instead of re-encoded.
+The others are encoded on the UI thread when the ProjectSnapshot is taken;
+the save thread only compresses, copies and writes.
+"""
+import os
+import shutil
+import tempfile
+import logging
+
+from PySide6.QtCore import QThread, Signal
+
+from .project_container import (
+    ContainerError, ContainerWriter, PAYLOAD_KEYS, PROJECT_MEMBER, content_hash, encode_value,
+    member_name, read_toc
+)
+
+logger = logging.getLogger(__name__)
+
+# Top-level sections of project_data that are serialized entry by entry.
+SECTIONED_KEYS = tuple(PAYLOAD_KEYS)
+
+
+class SaveCancelled(Exception):
+    """Raised inside the writer when the user cancels a running save."""
+
+
+def screen_entry_key(index, screen):
+    """Returns a stable key for an entry of the 'screens' list."""
+    if isinstance(screen, dict) and screen.get('type') and screen.get('number') is not None:
+        return f"{screen['type']}:{screen['number']}"
+    return f"#{index}"
+
+
+def iter_section_entries(section, value):
+    """Yields (entry_key, entry) for a sectioned project_data value."""
+    if isinstance(value, dict):
+        for key, entry in value.items():
+            yield str(key), entry
+    elif isinstance(value, list):
+        for index, entry in enumerate(value):
+            yield screen_entry_key(index, entry), entry
+
+
+class ProjectSnapshot:
+    """
+    The bytes of a save, encoded from project_data on the UI thread.
+
+    The editors change table rows, tag rows and screen items in place, so
+    nothing the save thread reads may be shared with them: the skeleton
+    (project_data without payloads) and every payload that is not copied
+    from the previous file are encoded here.
+    """
+
+    def __init__(self, project_data, file_path, project_id,
+                 source_reader, deferred, is_entry_dirty):
+        """
+        Args:
+            deferred (dict): Member names in source_reader's file of the
+                payloads not loaded yet, by id(entry).
+            is_entry_dirty (callable): is_entry_dirty(section, entry_key)
+                returns False for entries known to match the previous file.
+        """
+        self.file_path = file_path
+        self.project_id = project_id
+        self.source_path = source_reader.file_path if source_reader else None
+        source_toc = self._source_toc(source_reader, project_id)
+        source_entries = source_toc['entries'] if source_toc else {}
+        source_digests = source_toc.get('digests', {}) if source_toc else {}
+        skeleton = {}
+        # (member_name, encoded payload or None, name of the member to copy
+        # from the previous file if there is no encoded payload)
+        self.members = []
+        # Member names of the payloads still not loaded, by id(entry)
+        self.deferred_members = {}
+        # Content hashes of what is written, recorded as the saved state
+        self.stub_hashes = {}
+        self.value_hashes = {}
+
+        for top_key, value in list(project_data.items()):
+            if top_key not in SECTIONED_KEYS or not isinstance(value, (dict, list)):
+                skeleton[top_key] = value
+                self.value_hashes[top_key] = content_hash(value)
+                continue
+
+            payload_key = PAYLOAD_KEYS[top_key]
+            stubs = {} if isinstance(value, dict) else []
+            for entry_key, entry in iter_section_entries(top_key, value):
+                if isinstance(entry, dict):
+                    stub = {k: v for k, v in entry.items() if k != payload_key}
+                    name = member_name(top_key, entry_key)
+                    if payload_key in entry:
+                        encoded = None
+                        if name not in source_entries or is_entry_dirty(top_key, entry_key):
+                            encoded = encode_value(entry[payload_key])
+                            if source_digests.get(name) == content_hash(encoded=encoded):
+                                # Changed and changed back
+                                encoded = None
+                        self.members.append((name, encoded, name))
+                    elif id(entry) in deferred:
+                        # Stored under its old key if the entry was renumbered
+                        self.members.append((name, None, deferred[id(entry)]))
+                        self.deferred_members[id(entry)] = name
+                else:
+                    stub = entry
+                self.stub_hashes[(top_key, entry_key)] = content_hash(stub)
+                if isinstance(stubs, dict):
+                    stubs[entry_key] = stub
+                else:
+                    stubs.append(stub)
+            skeleton[top_key] = stubs
+
+        self.project_member = encode_value(skeleton)
+        self.total_units = len(self.members) + 1
+
+    @staticmethod
+    def _source_toc(source_reader, project_id):
+        """Returns the previous file's table of contents if its members can be copied, else None."""
+        if source_reader is None:
+            return None
+        try:
+            toc = source_reader.toc()
+        except (OSError, ContainerError) as e:
+            logger.warning(f"Cannot copy members from {source_reader.file_path}: {e}")
+            return None
+        if toc.get('project_id') != project_id:
+            logger.warning(f"{source_reader.file_path} belongs to a different project; "
+                           f"re-encoding all members")
+            return None
+        return toc
+
+
+class ProjectWriter:
+    """
+    Writes a ProjectSnapshot to disk.
+
+    The container is streamed into a temporary file in the target directory,
+    flushed to disk and then atomically swapped in with os.replace(), after
+    copying the previous file to '<file>.backup'.
+    """
+
+    def __init__(self, snapshot, progress_callback=None, is_cancelled=None):
+        self.snapshot = snapshot
+        self._progress_callback = progress_callback
+        self._is_cancelled = is_cancelled or (lambda: False)
+        self.encoded_count = 0
+        self.copied_count = 0
+
+    def write(self):
+        """
+        Writes the snapshot to its file path.
+
+        Returns:
+            dict: The table of contents of the written container.
+        """
+        file_path = self.snapshot.file_path
+        target_dir = os.path.dirname(file_path) or '.'
+        os.makedirs(target_dir, exist_ok=True)
+
+        source_handle = None
+        source_toc = None
+        if self.snapshot.source_path and os.path.exists(self.snapshot.source_path):
+            source_handle = open(self.snapshot.source_path, 'rb')
+
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix='.hmi-save-', dir=target_dir)
+        try:
+            if source_handle is not None:
+                source_toc = read_toc(source_handle)
+                if source_toc.get('project_id') != self.snapshot.project_id:
+                    logger.warning(f"{self.snapshot.source_path} belongs to a different project; "
+                                   f"re-encoding all members")
+                    source_toc = None
+            with os.fdopen(fd, 'wb') as handle:
+                toc = self._write_container(handle, source_handle, source_toc)
+                handle.flush()
+                os.fsync(handle.fileno())
+            if source_handle is not None:
+                source_handle.close()
+                source_handle = None
+
+            self._check_cancelled()
+
+            if os.path.exists(file_path):
+                backup_path = file_path + '.backup'
+                try:
+                    shutil.copy2(file_path, backup_path)
+                    logger.info(f"Backup created: {backup_path}")
+                except Exception as e:
+                    logger.warning(f"Failed to create backup: {e}")
+
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if source_handle is not None:
+                source_handle.close()
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            raise
+
+        logger.debug(f"Project written: {self.encoded_count} members encoded, "
+                     f"{self.copied_count} copied from the previous file")
+        return toc
+
+    def _write_container(self, handle, source_handle, source_toc):
+        writer = ContainerWriter(handle)
+        total = self.snapshot.total_units
+        done = 0
+        source_entries = source_toc['entries'] if source_toc else {}
+
+        for name, encoded, source_name in self.snapshot.members:
+            self._check_cancelled()
+            if encoded is not None:
+                writer.write_encoded(name, encoded)
+                self.encoded_count += 1
+            elif source_name in source_entries:
+                writer.copy_member(name, source_handle, source_toc, source_name)
+                self.copied_count += 1
+            else:
+                raise RuntimeError(f"Project entry '{source_name}' is not loaded and missing from "
+                                   f"{self.snapshot.source_path}")
+            done += 1
+            self._report(done, total)
+
+        self._check_cancelled()
+        writer.write_encoded(PROJECT_MEMBER, self.snapshot.project_member)
+        self._report(total, total)
+        return writer.finish(self.snapshot.project_id, self.snapshot.file_path)
+
+    def _check_cancelled(self):
+        if self._is_cancelled():
+            raise SaveCancelled()
+
+    def _report(self, done, total):
+        if self._progress_callback:
+            self._progress_callback(done, total)
+
+
+class ProjectSaveThread(QThread):
+    """Runs a ProjectWriter off the UI thread."""
+
+    progress = Signal(int, int)
+    save_finished = Signal(bool, str)
+
+    def __init__(self, snapshot, dirty_token):
+        super().__init__()
+        self.snapshot = snapshot
+        self.dirty_token = dirty_token
+        self.toc = None
+        self.cancelled = False
+        self._cancel_requested = False
+
+    def cancel(self):
+        """Requests cancellation; the original file is left untouched."""
+        self._cancel_requested = True
+
+    def run(self):
+        writer = ProjectWriter(
+            self.snapshot,
+            progress_callback=self.progress.emit,
+            is_cancelled=lambda: self._cancel_requested,
+        )
+        try:
+            self.toc = writer.write()
+            self.save_finished.emit(True, "Project saved successfully")
+        except SaveCancelled:
+            self.cancelled = True
+            logger.info("Project save cancelled")
+            self.save_finished.emit(False, "Save cancelled")
+        except PermissionError:
+            logger.error(f"Permission denied saving to {self.snapshot.file_path}")
+            self.save_finished.emit(False, "Permission denied. Cannot save to this location.")
+        except OSError as e:
+            logger.error(f"File system error during save: {e}")
+            self.save_finished.emit(False, f"File system error: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error saving project: {e}", exc_info=True)
+            self.save_finished.emit(False, f"Error saving project: {str(e)}")
@@ -0,0 +1,240 @@
+# services\table_codec.py
+"""
+Sparse encoding of comment table data.
+
+Comment tables are mostly empty, so instead of a dense list of rows of cell
+dicts the table is stored as a coordinate list of the non-empty cells plus an
+interned style table:
+
+    {
+        "format": "sparse-table",
+        "version": 1,
+        "rows": 100000,
+        "cols": 30,
+        "styles": [[0, null, null], [1, "#ff0000", null]],
+        "cells": [[0, 0, "Name"], [0, 1, "=A1", 1], ...]
+    }
+
+Each style is [font_flags, text_color, bg_color] where font_flags is a bit
+mask of FONT_FLAGS. Style 0 is always the plain style and is omitted from
+the cells that use it. Cells are sorted by (row, column) so that equal tables
+encode to equal bytes.
+
+The legacy dense format (a list of rows of cell dicts) is still accepted by
+every reader in this module.
+"""
+
+SPARSE_FORMAT = 'sparse-table'
+SPARSE_VERSION = 1
+
+FONT_FLAGS = (('bold', 1), ('italic', 2), ('underline', 4))
+PLAIN_STYLE = (0, None, None)
+
+
+def is_sparse_table(table_data):
+    """Returns True if table_data uses the sparse encoding."""
+    return isinstance(table_data, dict) and table_data.get('format') == SPARSE_FORMAT
+
+
+def style_key(cell_data):
+    """Returns the interned style tuple (font_flags, text_color, bg_color) of a cell dict."""
+    font = cell_data.get('font') or {}
+    flags = 0
+    for name, bit in FONT_FLAGS:
+        if font.get(name):
+            flags |= bit
+    return (flags, cell_data.get('text_color') or None, cell_data.get('bg_color') or None)
+
+
+def style_font(flags):
+    """Expands a font flag mask into the font dict used by the cell dicts."""
+    return {name: bool(flags & bit) for name, bit in FONT_FLAGS}
+
+
+def make_cell(value, style=PLAIN_STYLE):
+    """Builds a full cell dict from a value and a style tuple."""
+    flags, text_color, bg_color = style
+    return {
+        'value': value,
+        'font': style_font(flags),
+        'text_color': text_color,
+        'bg_color': bg_color,
+    }
+
+
+def _normalize_cell(cell_data):
+    if isinstance(cell_data, dict):
+        return cell_data
+    if cell_data is None:
+        return {}
+    return {'value': str(cell_data)}
+
+
+def is_empty_cell(cell_data):
+    """Returns True if a cell dict has neither a value nor any styling."""
+    cell_data = _normalize_cell(cell_data)
+    value = cell_data.get('value', '')
+    return (value == '' or value is None) and style_key(cell_data) == PLAIN_STYLE
+
+
+class SparseTableEncoder:
+    """
+    Builds a sparse table from individual cells.
+
+    Cells may be added in any order; empty cells are skipped.
+    """
+
+    def __init__(self, rows=0, cols=0):
+        self.rows = rows
+        self.cols = cols
+        self._styles = [list(PLAIN_STYLE)]
+        self._style_ids = {PLAIN_STYLE: 0}
+        self._cells = []
+
+    def style_id(self, style):
+        """Returns the id of a style tuple, interning it if needed."""
+        style_id = self._style_ids.get(style)
+        if style_id is None:
+            style_id = len(self._styles)
+            self._style_ids[style] = style_id
+            self._styles.append(list(style))
+        return style_id
+
+    def add(self, row, col, value, style=PLAIN_STYLE):
+        """Adds a cell given its value and style tuple."""
+        if (value == '' or value is None) and style == PLAIN_STYLE:
+            return
+        style_id = self.style_id(style)
+        self._cells.append([row, col, value, style_id] if style_id else [row, col, value])
+        self.rows = max(self.rows, row + 1)
+        self.cols = max(self.cols, col + 1)
+
+    def add_cell(self, row, col, cell_data):
+        """Adds a cell given as a cell dict."""
+        cell_data = _normalize_cell(cell_data)
+        self.add(row, col, cell_data.get('value', ''), style_key(cell_data))
+
+    def result(self):
+        """Returns the encoded table."""
+        self._cells.sort(key=lambda cell: (cell[0], cell[1]))
+        # Number the styles by first use so equal tables encode identically
+        # regardless of the order the cells were added in
+        styles = [self._styles[0]]
+        renumbered = {0: 0}
+        for cell in self._cells:
+            if len(cell) > 3:
+                style_id = renumbered.get(cell[3])
+                if style_id is None:
+                    style_id = renumbered[cell[3]] = len(styles)
+                    styles.append(self._styles[cell[3]])
+                cell[3] = style_id
+        return {
+            'format': SPARSE_FORMAT,
+            'version': SPARSE_VERSION,
+            'rows': self.rows,
+            'cols': self.cols,
+            'styles': styles,
+            'cells': self._cells,
+        }
+
+
+def encode_table(table_data):
+    """Encodes table data of either format as a sparse table."""
+    if is_sparse_table(table_data):
+        return table_data
+    rows, cols = table_shape(table_data)
+    encoder = SparseTableEncoder(rows, cols)
+    for row, col, cell_data in iter_cells(table_data):
+        encoder.add_cell(row, col, cell_data)
+    return encoder.result()
+
+
+def table_shape(table_data):
+    """Returns (rows, cols) of table data of either format."""
+    if is_sparse_table(table_data):
+        return int(table_data.get('rows', 0)), int(table_data.get('cols', 0))
+    if not table_data:
+        return 0, 0
+    # The widgets size the table from the first row of the dense format
+    first_row = table_data[0]
+    return len(table_data), len(first_row) if isinstance(first_row, list) else 0
+
+
+def iter_sparse_cells(table_data):
+    """
+    Yields (row, col, value, style) for the stored cells of a sparse table.
+
+    The style tuples are shared between cells; callers must not mutate them.
+    """
+    styles = [tuple(style) for style in table_data.get('styles') or [PLAIN_STYLE]]
+    for cell in table_data.get('cells', ()):
+        style = styles[cell[3]] if len(cell) > 3 else PLAIN_STYLE
+        yield cell[0], cell[1], cell[2], style
+
+
+def iter_cells(table_data):
+    """Yields (row, col, cell_dict) for the non-empty cells of either format."""
+    if is_sparse_table(table_data):
+        for row, col, value, style in iter_sparse_cells(table_data):
+            yield row, col, make_cell(value, style)
+        return
+    for row, row_data in enumerate(table_data or ()):
+        if not isinstance(row_data, list):
+            continue
+        for col, cell_data in enumerate(row_data):
+            if not is_empty_cell(cell_data):
+                yield row, col, _normalize_cell(cell_data)
+
+
+def to_dense(table_data):
+    """Expands table data of either format into the legacy dense format."""
+    if not is_sparse_table(table_data):
+        return table_data or []
+    rows, cols = table_shape(table_data)
+    dense = [[make_cell('') for _ in range(cols)] for _ in range(rows)]
+    for row, col, cell_data in iter_cells(table_data):
+        if row < rows and col < cols:
+            dense[row][col] = cell_data
+    return dense
+
+
+def apply_cells(table_data, cells):
+    """
+    Returns a sparse copy of table_data with the given cells replaced.
+
+    Args:
+        table_data: Table data of either format.
+        cells (list): [row, col, cell_dict] entries; the table grows to fit them.
+    """
+    rows, cols = table_shape(table_data)
+    merged = {(row, col): cell_data for row, col, cell_data in iter_cells(table_data)}
+    for row, col, cell_data in cells:
+        merged[(row, col)] = cell_data
+    encoder = SparseTableEncoder(rows, cols)
+    for (row, col), cell_data in merged.items():
+        encoder.add_cell(row, col, cell_data)
+    return encoder.result()
+
+
+def resize_table(table_data, action, index, count):
+    """
+    Returns a sparse copy of table_data with count rows or columns inserted
+    before index ('add_row', 'add_col') or removed from index on
+    ('remove_row', 'remove_col'). Cell values are moved, not rewritten.
+    """
+    rows, cols = table_shape(table_data)
+    axis = 0 if action.endswith('_row') else 1
+    step = count if action.startswith('add') else -count
+    if axis == 0:
+        rows = max(rows + step, 0)
+    else:
+        cols = max(cols + step, 0)
+    encoder = SparseTableEncoder(rows, cols)
+    for row, col, cell_data in iter_cells(table_data):
+        position = [row, col]
+        if position[axis] >= index:
+            if step < 0 and position[axis] < index + count:
+                continue
+            position[axis] += step
+        encoder.add_cell(position[0], position[1], cell_data)
+    return encoder.result()
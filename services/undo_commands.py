@@ -8,6 +8,8 @@ from PySide6.QtGui import QUndoCommand, QPen, QBrush, QColor, QTransform, QGradi
 from PySide6.QtCore import QPointF, QRectF, Qt
 import copy
 
+from .undo_memory import SpillableAttribute
+
 
 class TransformItemsCommand(QUndoCommand):
     """
@@ -15,6 +17,9 @@ class TransformItemsCommand(QUndoCommand):
     Captures complete state before and after transformation.
     Supports single and multiple items.
     """
+    old_states = SpillableAttribute()
+    new_states = SpillableAttribute()
+
     def __init__(self, items, old_states, new_states, description="Transform Items", canvas=None):
         super().__init__(description)
         items_list = items if isinstance(items, list) else [items]
@@ -33,18 +38,10 @@ class TransformItemsCommand(QUndoCommand):
                     self.item_ids.append(item_id)
     
     def _get_items_by_id(self):
-        """Retrieve current items from the scene by their stored IDs."""
-        items = []
+        """Retrieve current items from the canvas by their stored IDs (None for an item no longer there)."""
         if not self.canvas:
-            return items
-            
-        for item_id in self.item_ids:
-            for item in self.canvas.scene.items():
-                data = item.data(Qt.ItemDataRole.UserRole)
-                if data and data.get('id') == item_id:
-                    items.append(item)
-                    break
-        return items
+            return []
+        return [self.canvas.item_by_id(item_id) for item_id in self.item_ids]
         
     def redo(self):
         """Apply new transform states."""
@@ -169,6 +166,8 @@ class AddItemCommand(QUndoCommand):
     Command for adding a graphic item to the canvas.
     Undo removes the item, redo adds it back.
     """
+    item_data = SpillableAttribute()
+
     def __init__(self, canvas, item_data, description="Add Item"):
         super().__init__(description)
         self.canvas = canvas
@@ -195,6 +194,8 @@ class RemoveItemCommand(QUndoCommand):
     Command for removing graphic items from the canvas.
     Supports removing single or multiple items.
     """
+    items_data = SpillableAttribute()
+
     def __init__(self, canvas, items, description="Delete Items"):
         super().__init__(description)
         self.canvas = canvas
@@ -276,17 +277,11 @@ class RemoveItemCommand(QUndoCommand):
         """Remove all items from the canvas."""
         # Find and remove items by their ID
         for item_data in self.items_data:
-            item_id = item_data.get('id')
-            # Get a fresh list of scene items for each iteration
-            for item in list(self.canvas.scene.items()):
-                data = item.data(Qt.ItemDataRole.UserRole)
-                if data and data.get('id') == item_id:
-                    # Only remove if the item is actually in the scene
-                    if item.scene() == self.canvas.scene:
-                        self.canvas._previous_selection.discard(item)
-                        self.canvas.graphics_item_removed.emit(item)
-                        self.canvas.scene.removeItem(item)
-                    break
+            item = self.canvas.item_by_id(item_data.get('id'))
+            if item is not None:
+                self.canvas._previous_selection.discard(item)
+                self.canvas.graphics_item_removed.emit(item)
+                self.canvas.scene.removeItem(item)
         self.canvas.clear_transform_handler()
         self.canvas.save_items()
         
@@ -305,6 +300,9 @@ class MoveItemsCommand(QUndoCommand):
     Command for moving graphic items on the canvas.
     Supports moving single or multiple items.
     """
+    old_positions = SpillableAttribute()
+    new_positions = SpillableAttribute()
+
     def __init__(self, items, old_positions, new_positions, description="Move Items", canvas=None):
         super().__init__(description)
         self.canvas = canvas  # Reference to canvas for updating transform handler
@@ -324,18 +322,10 @@ class MoveItemsCommand(QUndoCommand):
                     self.new_positions.append(new_pos)
         
     def _get_items_by_id(self):
-        """Retrieve current items from the scene by their stored IDs."""
-        items = []
+        """Retrieve current items from the canvas by their stored IDs (None for an item no longer there)."""
         if not self.canvas:
-            return items
-            
-        for item_id in self.item_ids:
-            for item in self.canvas.scene.items():
-                data = item.data(Qt.ItemDataRole.UserRole)
-                if data and data.get('id') == item_id:
-                    items.append(item)
-                    break
-        return items
+            return []
+        return [self.canvas.item_by_id(item_id) for item_id in self.item_ids]
         
     def redo(self):
         """Move items to new positions."""
@@ -548,13 +538,7 @@ class GroupItemsCommand(QUndoCommand):
         self.new_group_id = new_group_id
 
     def _resolve_items(self):
-        resolved = []
-        item_id_set = set(self.item_ids)
-        for item in self.canvas.scene.items():
-            data = item.data(Qt.ItemDataRole.UserRole)
-            if data and data.get('id') in item_id_set:
-                resolved.append(item)
-        return resolved
+        return self.canvas.items_by_ids(self.item_ids)
 
     def _apply_group_mapping(self, mapping):
         for item in self._resolve_items():
@@ -590,13 +574,7 @@ class UngroupItemsCommand(QUndoCommand):
         self.old_group_ids = dict(old_group_ids)
 
     def _resolve_items(self):
-        resolved = []
-        item_id_set = set(self.item_ids)
-        for item in self.canvas.scene.items():
-            data = item.data(Qt.ItemDataRole.UserRole)
-            if data and data.get('id') in item_id_set:
-                resolved.append(item)
-        return resolved
+        return self.canvas.items_by_ids(self.item_ids)
 
     def _apply_group_mapping(self, mapping):
         for item in self._resolve_items():
@@ -626,6 +604,8 @@ class PasteItemsCommand(QUndoCommand):
     Command for pasting items from clipboard.
     Handles multiple items with position offset.
     """
+    original_items_data = SpillableAttribute()
+
     def __init__(self, canvas, items_data, offset=None, anchor=None, description="Paste Items"):
         super().__init__(description)
         self.canvas = canvas
@@ -686,6 +666,8 @@ class DuplicateItemsCommand(QUndoCommand):
     """
     Command for duplicating items on the canvas.
     """
+    original_items_data = SpillableAttribute()
+
     def __init__(self, canvas, items, offset=None, description="Duplicate Items"):
         super().__init__(description)
         self.canvas = canvas
@@ -748,3 +730,43 @@ class DuplicateItemsCommand(QUndoCommand):
         self.canvas.clear_transform_handler()
         self.canvas.save_items()
         self.created_items = []
+
+
+# Attributes the commands above use to remember which items they touch.
+_ITEM_REFERENCE_ATTRS = (
+    'item_ids', 'assigned_ids', 'item_data', 'items_data', 'original_items_data',
+    'item', 'items', 'created_items', 'removed_items',
+)
+
+
+def _collect_item_ids(value, ids):
+    if value is None:
+        return
+    if isinstance(value, (str, int)):
+        ids.add(str(value))
+    elif isinstance(value, dict):
+        if value.get('id') is not None:
+            ids.add(str(value['id']))
+    elif isinstance(value, (list, tuple, set)):
+        for element in value:
+            _collect_item_ids(element, ids)
+    elif isinstance(value, QGraphicsItem):
+        try:
+            data = value.data(Qt.ItemDataRole.UserRole)
+        except RuntimeError:
+            # The underlying C++ item was already deleted
+            return
+        _collect_item_ids(data if isinstance(data, dict) else None, ids)
+
+
+def affected_item_ids(command):
+    """
+    Returns the ids (as strings) of the canvas items a command touches.
+
+    Used by the autosave journal to record only the changed items. Returns an
+    empty set for commands that keep no item references.
+    """
+    ids = set()
+    for attr in _ITEM_REFERENCE_ATTRS:
+        _collect_item_ids(getattr(command, attr, None), ids)
+    return ids
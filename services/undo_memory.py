@@ -0,0 +1,453 @@
+# services\undo_memory.py
+"""
+Project-wide memory budget for the undo stacks registered in EditService.
+
+QUndoStack has no memory limit and cannot drop its oldest commands once it
+holds any, so the snapshots kept by removals, pastes and transforms would
+otherwise live for the whole session. UndoMemoryManager estimates the memory
+each command holds and, when all stacks together exceed the budget, pickles
+the cold payloads to an anonymous temporary file: first the whole history
+of the stacks used least recently, then the oldest commands of the active
+stack. A spilled payload is read back the first time the command touches it.
+
+Commands opt in by declaring their payload attributes as SpillableAttribute;
+a command with a diff_record (the comment tables' CellDiffs) is spilled
+through the record. Payloads that do not pickle stay in memory, and the
+command remembers not to try them again.
+
+The manager keeps a running size per stack: only the commands an index
+change pushed, undid or redid are measured again.
+
+The spill file hands out SpillBlocks and counts the bytes of released ones:
+a payload read back, the commands of a removed stack, and the commands a
+stack deletes (redo commands dropped by a push, the oldest command dropped
+at the undo limit). Once the dead bytes pass SPILL_COMPACT_MB and outnumber
+the live ones, the live blocks are copied to a fresh file and moved in place.
+"""
+import logging
+import pickle
+import sys
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Memory all undo stacks together may hold before cold history is spilled (megabytes)
+UNDO_MEMORY_BUDGET_MB = 256
+
+# Dead bytes in the spill file that trigger its compaction, once they also
+# outnumber the live bytes (megabytes)
+SPILL_COMPACT_MB = 16
+
+# Deepest nesting of containers measured by estimate_size
+_MAX_DEPTH = 32
+
+_SCALARS = (str, bytes, int, float, bool, type(None))
+
+
+class SpillBlock:
+    """The location of one payload in a SpillFile; compaction moves its offset."""
+
+    __slots__ = ('offset', 'length', 'released')
+
+    def __init__(self, offset, length):
+        self.offset = offset
+        self.length = length
+        self.released = False
+
+
+class SpillFile:
+    """An anonymous temporary file of pickled undo payloads, created on first write."""
+
+    def __init__(self, prefix='undo_', compact_bytes=SPILL_COMPACT_MB * 1024 * 1024):
+        self.prefix = prefix
+        self.compact_bytes = compact_bytes
+        self._file = None
+        self._blocks = set()
+        self.size = 0
+        self.live_bytes = 0
+
+    @property
+    def dead_bytes(self) -> int:
+        return self.size - self.live_bytes
+
+    def write(self, data: bytes) -> SpillBlock:
+        """Appends data and returns its block."""
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix=self.prefix)
+        block = SpillBlock(self.size, len(data))
+        self._file.seek(block.offset)
+        self._file.write(data)
+        self.size += block.length
+        self.live_bytes += block.length
+        self._blocks.add(block)
+        return block
+
+    def read(self, block: SpillBlock) -> bytes:
+        self._file.seek(block.offset)
+        return self._file.read(block.length)
+
+    def release(self, blocks):
+        """Marks blocks as no longer read, compacting the file once enough of it is dead."""
+        for block in blocks:
+            if block in self._blocks:
+                self._blocks.remove(block)
+                block.released = True
+                self.live_bytes -= block.length
+        if self.dead_bytes >= self.compact_bytes and self.dead_bytes >= self.live_bytes:
+            self.compact()
+
+    def compact(self):
+        """Copies the live blocks to a new file, in their order, and drops the old one."""
+        if not self._blocks:
+            self.close()
+            return
+        new_file = tempfile.TemporaryFile(prefix=self.prefix)
+        offset = 0
+        for block in sorted(self._blocks, key=lambda block: block.offset):
+            self._file.seek(block.offset)
+            new_file.write(self._file.read(block.length))
+            block.offset = offset
+            offset += block.length
+        self._file.close()
+        self._file = new_file
+        logger.debug(f"Compacted the undo spill file from {self.size} to {offset} bytes")
+        self.size = self.live_bytes = offset
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        for block in self._blocks:
+            block.released = True
+        self._blocks.clear()
+        self.size = self.live_bytes = 0
+
+
+class SpilledValue:
+    """Placeholder for an attribute value pickled to a SpillFile."""
+
+    __slots__ = ('spill_file', 'block')
+
+    def __init__(self, spill_file, block):
+        self.spill_file = spill_file
+        self.block = block
+
+    @property
+    def length(self) -> int:
+        return self.block.length
+
+    def load(self):
+        """Reads the value back and releases its block; the caller keeps the value in memory."""
+        data = self.spill_file.read(self.block)
+        self.spill_file.release((self.block,))
+        return pickle.loads(data)
+
+
+class SpillableAttribute:
+    """
+    Declares a command attribute as cold payload the UndoMemoryManager may
+    spill. Reading a spilled attribute loads it back transparently.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, command, owner=None):
+        if command is None:
+            return self
+        try:
+            value = command.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name) from None
+        if isinstance(value, SpilledValue):
+            value = value.load()
+            command.__dict__[self.name] = value
+            command.__dict__.pop('_undo_nbytes', None)
+        return value
+
+    def __set__(self, command, value):
+        old = command.__dict__.get(self.name)
+        if isinstance(old, SpilledValue):
+            old.spill_file.release((old.block,))
+        command.__dict__[self.name] = value
+        command.__dict__.pop('_undo_nbytes', None)
+
+
+def estimate_size(value, seen=None, depth=0):
+    """
+    Approximate memory held by plain data: containers, strings and numbers,
+    each object counted once. Other objects (items, widgets, Qt values) count
+    only their own wrapper, as they are owned elsewhere.
+    """
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value, 64)
+    if isinstance(value, _SCALARS) or depth >= _MAX_DEPTH:
+        return size
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key, seen, depth + 1) + estimate_size(item, seen, depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item, seen, depth + 1)
+    return size
+
+
+def _spillable_names(cls):
+    names = cls.__dict__.get('_spillable_names')
+    if names is None:
+        names = tuple(name for klass in reversed(cls.__mro__)
+                      for name, attr in vars(klass).items() if isinstance(attr, SpillableAttribute))
+        cls._spillable_names = names
+    return names
+
+
+def _children(command):
+    return [command.child(i) for i in range(command.childCount())]
+
+
+def _state(command):
+    # Wrappers of commands created on the C++ side (macro parents) may have no __dict__
+    try:
+        return vars(command)
+    except TypeError:
+        return {}
+
+
+def command_nbytes(command):
+    """Approximate memory held by a command and the children of a macro, not counting spilled payloads."""
+    state = _state(command)
+    nbytes = state.get('_undo_nbytes')
+    if nbytes is None:
+        seen = set()
+        nbytes = sum(estimate_size(value, seen) for name, value in state.items()
+                     if name != 'diff_record' and not name.startswith('_undo_')
+                     and not isinstance(value, SpilledValue))
+        state['_undo_nbytes'] = nbytes
+    record = state.get('diff_record')
+    if record is not None and record.in_memory:
+        nbytes += record.nbytes
+    return nbytes + sum(command_nbytes(child) for child in _children(command))
+
+
+def command_spilled_bytes(command):
+    """Bytes of a command's payloads, and its children's, held in the spill file."""
+    state = _state(command)
+    nbytes = sum(value.length for value in state.values() if isinstance(value, SpilledValue))
+    record = state.get('diff_record')
+    if record is not None and not record.in_memory:
+        nbytes += record.nbytes
+    return nbytes + sum(command_spilled_bytes(child) for child in _children(command))
+
+
+def spill_command(command, spill_file, blocks=None):
+    """
+    Moves the spillable payloads of a command and its children to spill_file.
+
+    Returns:
+        list: The SpillBlocks written.
+    """
+    if blocks is None:
+        blocks = []
+    state = _state(command)
+    for name in _spillable_names(type(command)):
+        value = state.get(name)
+        if value is None or isinstance(value, SpilledValue):
+            continue
+        unpicklable = state.get('_undo_unpicklable')
+        if unpicklable is not None and name in unpicklable:
+            continue
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.debug(f"Undo payload {type(command).__name__}.{name} stays in memory: {e}")
+            state.setdefault('_undo_unpicklable', set()).add(name)
+            continue
+        block = spill_file.write(data)
+        blocks.append(block)
+        state[name] = SpilledValue(spill_file, block)
+        state.pop('_undo_nbytes', None)
+    record = state.get('diff_record')
+    if record is not None:
+        block = record.spill(spill_file)
+        if block is not None:
+            blocks.append(block)
+    for child in _children(command):
+        spill_command(child, spill_file, blocks)
+    return blocks
+
+
+class _StackEntry:
+    def __init__(self, stack):
+        self.stack = stack
+        self.index = 0
+        self.commands = []  # By position: the command, to notice the ones the stack deleted
+        self.sizes = []     # command_nbytes by stack position
+        self.settled = []   # By position: spilled as far as it goes
+        self.blocks = []    # By position: SpillBlocks written for the command
+        self.nbytes = 0     # sum(self.sizes)
+        self.last_active = 0
+        self.on_index_changed = None
+
+    def add_blocks(self, position, blocks):
+        self.blocks[position] = [block for block in self.blocks[position] if not block.released] + blocks
+
+    def all_blocks(self):
+        return [block for blocks in self.blocks for block in blocks]
+
+    def measure(self, position):
+        """Measures the command at a position again and updates the total."""
+        nbytes = command_nbytes(self.stack.command(position))
+        self.nbytes += nbytes - self.sizes[position]
+        self.sizes[position] = nbytes
+        self.settled[position] = False
+        return nbytes
+
+    def _remove(self, start, end):
+        """Forgets the positions start:end and returns their SpillBlocks."""
+        self.nbytes -= sum(self.sizes[start:end])
+        blocks = [block for blocks in self.blocks[start:end] for block in blocks]
+        for values in (self.commands, self.sizes, self.settled, self.blocks):
+            del values[start:end]
+        return blocks
+
+    def update(self, index):
+        """
+        Follows an index change: drops removed positions, measures new and touched ones.
+
+        Returns:
+            list: The SpillBlocks of the commands the stack deleted.
+        """
+        stack = self.stack
+        count = stack.count()
+        previous, self.index = self.index, index
+        dropped = []
+        if self.commands and count and stack.command(0) is not self.commands[0]:
+            # A push at the undo limit deleted the oldest command; all positions move down
+            dropped.extend(self._remove(0, 1))
+            previous -= 1
+        # A push after undos deleted the redo commands, from the old index on
+        position = max(0, previous)
+        if position < min(len(self.commands), count) and stack.command(position) is not self.commands[position]:
+            dropped.extend(self._remove(position, len(self.commands)))
+        if len(self.commands) > count:
+            dropped.extend(self._remove(count, len(self.commands)))
+        first = len(self.commands)
+        self.commands.extend(stack.command(i) for i in range(first, count))
+        self.sizes.extend([0] * (count - first))
+        self.settled.extend([False] * (count - first))
+        self.blocks.extend([] for _ in range(count - first))
+        # A push, undo or redo touches the commands between the two indexes;
+        # an unchanged index means a merge into the command before it
+        touched = set(range(min(previous, index), max(previous, index))) or {index - 1}
+        touched.update(range(first, count))
+        for position in touched:
+            if 0 <= position < count:
+                self.measure(position)
+        return dropped
+
+
+class UndoMemoryManager:
+    """
+    Keeps the undo stacks registered in EditService within budget_bytes.
+
+    enforce() runs when a stack's index changes. The commands next to the
+    active stack's index, its next undo and next redo, always stay in memory.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.spill_file = SpillFile()
+        self._stacks = {}
+        self._activations = 0
+
+    def add_stack(self, stack_id, stack):
+        entry = _StackEntry(stack)
+        entry.update(stack.index())
+        self._stacks[stack_id] = entry
+        entry.on_index_changed = lambda index: self._stack_changed(entry, index)
+        stack.indexChanged.connect(entry.on_index_changed)
+
+    def remove_stack(self, stack_id):
+        entry = self._stacks.pop(stack_id, None)
+        if entry is None:
+            return
+        try:
+            entry.stack.indexChanged.disconnect(entry.on_index_changed)
+        except (RuntimeError, TypeError):
+            pass
+        if self._stacks:
+            self.spill_file.release(entry.all_blocks())
+        else:
+            # No command refers to the spilled payloads any more
+            self.spill_file.close()
+
+    def set_active_stack(self, stack):
+        self._activations += 1
+        for entry in self._stacks.values():
+            if entry.stack is stack:
+                entry.last_active = self._activations
+
+    def _stack_changed(self, entry, index):
+        dropped = entry.update(index)
+        if dropped:
+            self.spill_file.release(dropped)
+        self.enforce()
+
+    def total_bytes(self) -> int:
+        """Approximate memory held by all registered stacks."""
+        return sum(entry.nbytes for entry in self._stacks.values())
+
+    def _cold_commands(self):
+        """Yields (entry, position) from coldest to warmest, skipping settled commands."""
+        entries = sorted(self._stacks.values(), key=lambda entry: entry.last_active)
+        for entry in entries:
+            stack = entry.stack
+            index = stack.index()
+            if entry is entries[-1] and entry.last_active:
+                # The active stack: oldest history first, then the farthest redo commands
+                positions = list(range(index - 1)) + list(range(stack.count() - 1, index, -1))
+            else:
+                positions = range(stack.count())
+            for i in positions:
+                if not entry.settled[i]:
+                    yield entry, i
+
+    def enforce(self):
+        total = self.total_bytes()
+        if total <= self.budget_bytes:
+            return
+        spilled = 0
+        for entry, position in self._cold_commands():
+            before = entry.sizes[position]
+            entry.add_blocks(position, spill_command(entry.stack.command(position), self.spill_file))
+            after = entry.measure(position)
+            entry.settled[position] = True
+            if after < before:
+                total -= before - after
+                spilled += 1
+                if total <= self.budget_bytes:
+                    break
+        logger.debug(f"Spilled {spilled} undo commands, about {total} bytes left in memory")
+
+    def stats(self) -> dict:
+        """Returns per-stack memory statistics by stack id, plus the budget and the spill file's total and dead bytes."""
+        stacks = {}
+        for stack_id, entry in self._stacks.items():
+            stack = entry.stack
+            commands = [stack.command(i) for i in range(stack.count())]
+            stacks[stack_id] = {
+                'commands': len(commands),
+                'in_memory_bytes': entry.nbytes,
+                'spilled_bytes': sum(command_spilled_bytes(command) for command in commands),
+            }
+        return {
+            'budget_bytes': self.budget_bytes,
+            'in_memory_bytes': sum(stats['in_memory_bytes'] for stats in stacks.values()),
+            'spill_file_bytes': self.spill_file.size,
+            'spill_file_dead_bytes': self.spill_file.dead_bytes,
+            'stacks': stacks,
+        }
@@ -0,0 +1,15 @@
+# tests\conftest.py
+import os
+import sys
+
+import pytest
+
+# The application runs from the repository root and imports its packages from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    from PySide6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
@@ -0,0 +1,89 @@
+# tests\test_autosave_replay.py
+import pytest
+
+from services.autosave_service import apply_journal_record
+from services.project_service import ProjectService
+from services.table_codec import SparseTableEncoder, iter_cells, make_cell, table_shape
+
+
+@pytest.fixture
+def service():
+    service = ProjectService()
+    encoder = SparseTableEncoder(2, 2)
+    encoder.add(0, 0, 'a')
+    encoder.add(1, 1, 'd')
+    service.project_data['screens'] = [
+        {'type': 'base', 'number': 1, 'name': 'Main', 'items': [{'id': 1, 'x': 0}, {'id': 2, 'x': 5}]},
+    ]
+    service.project_data['comments'] = {'1': {'number': 1, 'name': 'Notes', 'table_data': encoder.result()}}
+    service.project_data['tag_lists'] = {'1': {'number': 1, 'tags': [['T1'], ['T2'], ['T3']]}}
+    return service
+
+
+def replay(service, record):
+    assert apply_journal_record(service, record)
+    assert not service.is_saved
+
+
+def values(table_data):
+    return {(row, col): cell['value'] for row, col, cell in iter_cells(table_data)}
+
+
+def test_value(service):
+    replay(service, {'op': 'value', 's': 'screen_design_template', 'value': {'width': 640}})
+    assert service.project_data['screen_design_template'] == {'width': 640}
+
+
+def test_delete(service):
+    replay(service, {'op': 'delete', 's': 'screens', 'k': 'base:1'})
+    assert service.project_data['screens'] == []
+
+
+def test_entry_with_payload(service):
+    replay(service, {'op': 'entry', 's': 'comments', 'k': '2', 'entry': {'number': 2}, 'payload': {'x': 1}})
+    assert service.project_data['comments']['2'] == {'number': 2, 'table_data': {'x': 1}}
+
+
+def test_stub_keeps_the_payload(service):
+    replay(service, {'op': 'stub', 's': 'screens', 'k': 'base:1', 'entry': {'type': 'base', 'number': 1,
+                                                                          'name': 'Renamed'}})
+    screen = service.project_data['screens'][0]
+    assert screen['name'] == 'Renamed'
+    assert [item['id'] for item in screen['items']] == [1, 2]
+
+
+def test_payload(service):
+    replay(service, {'op': 'payload', 's': 'tag_lists', 'k': '1', 'payload': [['X']]})
+    assert service.project_data['tag_lists']['1']['tags'] == [['X']]
+
+
+def test_cells(service):
+    replay(service, {'op': 'cells', 's': 'comments', 'k': '1',
+                     'cells': [[0, 1, make_cell('b')], [1, 1, make_cell('')]]})
+    assert values(service.project_data['comments']['1']['table_data']) == {(0, 0): 'a', (0, 1): 'b'}
+
+
+def test_items(service):
+    replay(service, {'op': 'items', 's': 'screens', 'k': 'base:1',
+                     'put': [{'id': 2, 'x': 9}, {'id': 3, 'x': 1}], 'drop': [1]})
+    assert service.project_data['screens'][0]['items'] == [{'id': 2, 'x': 9}, {'id': 3, 'x': 1}]
+
+
+def test_rows(service):
+    replay(service, {'op': 'rows', 's': 'tag_lists', 'k': '1',
+                     'remove': [0], 'insert': [[1, ['N']]], 'set': [[0, ['T2b']]]})
+    assert service.project_data['tag_lists']['1']['tags'] == [['T2b'], ['N'], ['T3']]
+
+
+def test_resize(service):
+    replay(service, {'op': 'resize', 's': 'comments', 'k': '1', 'action': 'add_row', 'index': 0, 'count': 1,
+                     'cells': [[0, 0, make_cell('new')]]})
+    table_data = service.project_data['comments']['1']['table_data']
+    assert table_shape(table_data) == (3, 2)
+    assert values(table_data) == {(0, 0): 'new', (1, 0): 'a', (2, 1): 'd'}
+
+
+def test_unknown_records_are_rejected(service):
+    assert not apply_journal_record(service, {'op': 'bogus', 's': 'screens', 'k': 'base:1'})
+    assert not apply_journal_record(service, {'op': 'payload', 's': 'screens', 'k': 'base:9', 'payload': []})
+    assert not apply_journal_record(service, {'op': 'payload', 's': 'unknown', 'k': '1', 'payload': []})
@@ -0,0 +1,73 @@
+# tests\test_project_container.py
+import json
+
+import pytest
+
+from services.project_container import (
+    PROJECT_MEMBER, ContainerError, ContainerReader, ContainerWriter, content_hash, convert_legacy_project,
+    is_container_file, read_toc
+)
+
+
+def write_container(path, members, project_id='p1'):
+    with open(path, 'wb') as handle:
+        writer = ContainerWriter(handle)
+        for name, value in members.items():
+            writer.write_member(name, value)
+        return writer.finish(project_id, str(path))
+
+
+def test_members_round_trip_with_digests(tmp_path):
+    path = tmp_path / 'project.hmi'
+    members = {PROJECT_MEMBER: {'name': 'Plant'}, 'comments/1': {'cells': [[0, 0, 'ü']]}}
+    toc = write_container(path, members)
+    assert is_container_file(path)
+    assert toc['digests'] == {name: content_hash(value) for name, value in members.items()}
+
+    reader = ContainerReader(str(path), project_id='p1')
+    assert reader.has_member('comments/1')
+    assert not reader.has_member('comments/2')
+    for name, value in members.items():
+        assert reader.read(name) == value
+
+
+def test_copied_members_keep_bytes_and_digest(tmp_path):
+    source, target = tmp_path / 'old.hmi', tmp_path / 'new.hmi'
+    write_container(source, {'screens/base:1': [{'id': 1}]})
+    with open(source, 'rb') as source_handle, open(target, 'wb') as handle:
+        source_toc = read_toc(source_handle)
+        writer = ContainerWriter(handle)
+        writer.copy_member('screens/base:7', source_handle, source_toc, 'screens/base:1')
+        toc = writer.finish('p1', str(target))
+    assert toc['digests']['screens/base:7'] == source_toc['digests']['screens/base:1']
+    assert ContainerReader(str(target)).read('screens/base:7') == [{'id': 1}]
+
+
+def test_reader_rejects_another_project(tmp_path):
+    path = tmp_path / 'project.hmi'
+    write_container(path, {PROJECT_MEMBER: {}}, project_id='other')
+    with pytest.raises(ContainerError):
+        ContainerReader(str(path), project_id='p1').toc()
+
+
+def test_legacy_project_is_converted(tmp_path):
+    legacy = tmp_path / 'legacy.hmi'
+    project_data = {
+        'screens': [{'type': 'base', 'number': 1, 'name': 'Main', 'items': [{'id': 3}]}],
+        'comments': {'2': {'number': 2, 'table_data': [[{'value': 'x'}]]}},
+        'screen_design_template': {'width': 800},
+    }
+    legacy.write_text(json.dumps({'project_data': project_data}), encoding='utf-8')
+    target = tmp_path / 'converted.hmi'
+    assert convert_legacy_project(str(legacy), str(target)) == str(target)
+
+    reader = ContainerReader(str(target))
+    skeleton = reader.read(PROJECT_MEMBER)
+    assert 'items' not in skeleton['screens'][0]
+    assert skeleton['screen_design_template'] == {'width': 800}
+    assert reader.read('screens/base:1') == [{'id': 3}]
+    assert reader.read('comments/2') == [[{'value': 'x'}]]
+    assert set(reader.toc()['digests']) == set(reader.toc()['entries'])
+
+    with pytest.raises(ContainerError):
+        convert_legacy_project(str(target))
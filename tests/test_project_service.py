@@ -0,0 +1,98 @@
+# tests\test_project_service.py
+import pytest
+
+from services.project_service import ProjectService
+from services.project_writer import ProjectWriter
+
+
+@pytest.fixture
+def saved_project(tmp_path):
+    """A project with two screens and a comment table, saved as a container."""
+    path = str(tmp_path / 'project.hmi')
+    service = ProjectService()
+    service.project_data['screens'] = [
+        {'type': 'base', 'number': 1, 'name': 'Main', 'items': [{'id': 1, 'type': 'rectangle'}]},
+        {'type': 'base', 'number': 2, 'name': 'Alarms', 'items': [{'id': 2, 'type': 'ellipse'}]},
+    ]
+    service.project_data['comments'] = {
+        '1': {'number': 1, 'name': 'Messages', 'table_data': {'rows': 2, 'cols': 2, 'cells': [[0, 0, 'x', 0]]}},
+    }
+    assert service.save_project(path)[0]
+    return path
+
+
+def load(path):
+    service = ProjectService()
+    assert service.load_project(path)[0]
+    return service
+
+
+def test_payloads_load_on_demand(saved_project):
+    service = load(saved_project)
+    screen = service.project_data['screens'][1]
+    assert 'items' not in screen
+    assert not service.is_entry_loaded('screens', screen)
+    assert service.load_entry_payload('screens', screen) == [{'id': 2, 'type': 'ellipse'}]
+    assert service.is_entry_loaded('screens', screen)
+    assert service.is_saved
+
+
+def test_renumbering_an_unopened_screen_keeps_its_items(saved_project):
+    service = load(saved_project)
+    screen = service.project_data['screens'][0]
+    screen['number'] = 7
+    service.mark_as_unsaved('screens')
+    assert service.save_project()[0]
+    # Renumbered again while still deferred, now stored under 'screens/base:7'
+    screen['number'] = 9
+    service.mark_as_unsaved('screens')
+    assert service.save_project()[0]
+
+    reloaded = load(saved_project)
+    assert reloaded.load_entry_payload('screens', {'type': 'base', 'number': 9}) == [{'id': 1, 'type': 'rectangle'}]
+    assert reloaded.load_entry_payload('screens', {'type': 'base', 'number': 1}) is None
+    assert service.load_entry_payload('screens', screen) == [{'id': 1, 'type': 'rectangle'}]
+
+
+def test_edited_payload_is_saved(saved_project):
+    service = load(saved_project)
+    table_data = service.load_entry_payload('comments', 1)
+    table_data['cells'].append([1, 1, 'y', 0])
+    service.mark_as_unsaved('comments', 1)
+    assert not service.is_saved
+    assert service.save_project()[0]
+    assert service.is_saved
+
+    reloaded = load(saved_project)
+    assert reloaded.load_entry_payload('comments', 1)['cells'] == [[0, 0, 'x', 0], [1, 1, 'y', 0]]
+    assert reloaded.load_entry_payload('screens', {'type': 'base', 'number': 2}) == [{'id': 2, 'type': 'ellipse'}]
+
+
+def test_undoing_back_to_the_saved_state_clears_the_mark(saved_project):
+    service = load(saved_project)
+    table_data = service.load_entry_payload('comments', 1)
+    table_data['cells'][0][2] = 'changed'
+    service.mark_as_unsaved('comments', 1)
+    assert not service.is_saved
+    assert not service.check_saved()
+    assert service.modified_entries() == {('comments', '1')}
+
+    table_data['cells'][0][2] = 'x'
+    service.mark_as_unsaved('comments', 1)
+    # Marks only; the comparison waits for check_saved()
+    assert not service.is_saved
+    assert service.check_saved()
+    assert service.is_saved
+
+
+def test_changes_made_during_a_save_stay_unsaved(saved_project):
+    service = load(saved_project)
+    service.load_entry_payload('comments', 1)['cells'].append([1, 0, 'a', 0])
+    service.mark_as_unsaved('comments', 1)
+    snapshot, dirty_token = service.create_save_snapshot()
+
+    service.load_entry_payload('comments', 1)['cells'].append([1, 1, 'b', 0])
+    service.mark_as_unsaved('comments', 1)
+    service.commit_save(snapshot.file_path, ProjectWriter(snapshot).write(), dirty_token, snapshot)
+    assert not service.check_saved()
+    assert service.modified_entries() == {('comments', '1')}
@@ -0,0 +1,76 @@
+# tests\test_recalc_engine.py
+from project.comment.comment_utils import format_formula_result
+from project.comment.recalc_engine import CIRCULAR, RecalcEngine
+
+A1, B1, C1, D1 = (0, 0), (0, 1), (0, 2), (0, 3)
+
+
+class Table:
+    """Host table: plain values and results by (row, col), with the order results arrived in."""
+
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.order = []
+
+    def get_cell_value(self, row, col):
+        return self.values.get((row, col), 0)
+
+    def set_formula_result(self, row, col, result):
+        self.order.append((row, col))
+        text = format_formula_result(result)
+        try:
+            self.values[(row, col)] = float(text)
+        except ValueError:
+            self.values[(row, col)] = text
+
+    def set_value(self, engine, cell, value):
+        self.values[cell] = value
+        engine.set_formula(cell, None)
+
+
+def test_formulas_evaluate_after_their_precedents():
+    table = Table({A1: 2.0})
+    engine = RecalcEngine(table)
+    engine.set_formulas([(D1, 'B1+C1'), (C1, 'B1*10'), (B1, 'A1+1')])
+    assert engine.recalculate() == 3
+    assert table.order == [B1, C1, D1]
+    assert table.values[D1] == 33.0
+    assert not engine.has_dirty()
+
+
+def test_a_changed_value_recalculates_only_its_dependents():
+    table = Table({A1: 2.0, (1, 0): 5.0})
+    engine = RecalcEngine(table)
+    engine.set_formulas([(B1, 'A1+1'), (C1, 'B1*2'), ((1, 1), 'A2*2')])
+    engine.recalculate()
+    table.order.clear()
+    table.set_value(engine, A1, 4.0)
+    assert engine.recalculate() == 2
+    assert table.order == [B1, C1]
+    assert table.values[C1] == 10.0
+
+
+def test_ranges_depend_on_every_cell_inside():
+    table = Table({(row, 0): float(row) for row in range(5)})
+    engine = RecalcEngine(table)
+    engine.set_formula(B1, 'SUM(A1:A5)')
+    engine.recalculate()
+    assert table.values[B1] == 10.0
+    table.set_value(engine, (3, 0), 13.0)
+    assert engine.dirty_count() == 1
+    engine.recalculate()
+    assert table.values[B1] == 20.0
+
+
+def test_cycles_and_their_dependents_show_circ():
+    table = Table({A1: 1.0})
+    engine = RecalcEngine(table)
+    engine.set_formulas([(B1, 'C1+A1'), (C1, 'B1+1'), (D1, 'C1*2'), ((1, 0), 'A1*2')])
+    engine.recalculate()
+    assert table.values[B1] == table.values[C1] == table.values[D1] == CIRCULAR
+    assert table.values[(1, 0)] == 2.0
+
+    # Breaking the cycle makes the cells evaluate again
+    engine.set_formula(C1, 'A1+1')
+    engine.recalculate()
+    assert (table.values[C1], table.values[B1], table.values[D1]) == (2.0, 3.0, 4.0)
@@ -0,0 +1,71 @@
+# tests\test_spreadsheet.py
+import pytest
+from PySide6.QtCore import Qt
+
+from project.comment.cell_store import ColumnarDataStore, LazyDataStore
+from project.comment.comment_table import Spreadsheet
+from project.comment.performance_config import PerformanceConfig
+from project.comment.spreadsheet_model import SpreadsheetModel
+from services.table_codec import SparseTableEncoder
+
+BOLD_RED = (1, '#ff0000', None)
+
+
+@pytest.fixture(params=['columnar', 'dict'])
+def backend(request, monkeypatch):
+    """Runs a test once over each cell store backend."""
+    monkeypatch.setattr(PerformanceConfig, 'CELL_STORE_BACKEND', request.param)
+    return {'columnar': ColumnarDataStore, 'dict': LazyDataStore}[request.param]
+
+
+def sample_table():
+    encoder = SparseTableEncoder(5, 3)
+    encoder.add(0, 0, '2')
+    encoder.add(1, 0, '=A1*3')
+    encoder.add(3, 2, 'note', BOLD_RED)
+    return encoder.result()
+
+
+def test_model_reads_cells_from_the_store(qapp, backend):
+    model = SpreadsheetModel(rows=1, cols=1)
+    assert isinstance(model.data_store, backend)
+    model.load(sample_table())
+    assert (model.rowCount(), model.columnCount()) == (5, 3)
+    assert model.data(model.index(1, 0), Qt.ItemDataRole.EditRole) == '=A1*3'
+    # A formula shows its text until a result arrives
+    assert model.data(model.index(1, 0)) == '=A1*3'
+    model.set_formula_result(1, 0, 6.0)
+    assert model.data(model.index(1, 0)) == '6'
+    assert model.cell_style(3, 2) == BOLD_RED
+    assert model.data(model.index(3, 2), Qt.ItemDataRole.UserRole)['font']['bold']
+    assert model.data_store.get_sparse_data() == sample_table()
+
+
+def test_removing_rows_returns_their_cells_and_moves_results(qapp, backend):
+    model = SpreadsheetModel(rows=1, cols=1)
+    model.load(sample_table())
+    model.set_formula_result(1, 0, 6.0)
+    model.insert_rows(0, 2)
+    assert model.formula_result(3, 0) == '6'
+    saved = model.remove_rows([2, 3])
+    assert {key: cell.value for key, cell in saved.items()} == {(2, 0): '2', (3, 0): '=A1*3'}
+    assert model.formula_result(3, 0) is None
+    assert model.rowCount() == 5
+    assert model.data_store.get_cell(3, 2).value == 'note'
+
+
+def test_spreadsheet_evaluates_and_paints_cells(qapp, backend):
+    sheet = Spreadsheet()
+    sheet.load_table_data(sample_table())
+    assert sheet.model().display_text(1, 0) == '6'
+    sheet.set_cell_data(0, 0, {'value': '5'})
+    sheet._run_scheduled_recalc()
+    assert sheet.model().display_text(1, 0) == '15'
+
+    sheet.resize(400, 300)
+    sheet.reset_paint_stats()
+    sheet.grab()
+    stats = sheet.paint_stats()
+    assert stats['frames'] == 1 and stats['cells'] > 0
+    # Painting pools one style per style tuple and lays each text out once
+    assert sheet.cache_stats()['render']['styles'] == 2
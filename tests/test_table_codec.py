@@ -0,0 +1,72 @@
+# tests\test_table_codec.py
+from services.table_codec import (
+    PLAIN_STYLE, SparseTableEncoder, apply_cells, encode_table, is_sparse_table, iter_cells, make_cell,
+    resize_table, style_key, table_shape, to_dense
+)
+
+BOLD_RED = (1, '#ff0000', None)
+
+
+def sparse_values(table_data):
+    return {(row, col): cell['value'] for row, col, cell in iter_cells(table_data)}
+
+
+def grid():
+    """A 3 x 3 table whose cells hold their own reference, e.g. 'B3'."""
+    encoder = SparseTableEncoder(3, 3)
+    for row in range(3):
+        for col in range(3):
+            encoder.add(row, col, f"{'ABC'[col]}{row + 1}")
+    return encoder.result()
+
+
+def test_dense_round_trip():
+    dense = [[make_cell('a'), make_cell('')], [make_cell(''), make_cell('b', BOLD_RED)]]
+    sparse = encode_table(dense)
+    assert is_sparse_table(sparse)
+    assert table_shape(sparse) == (2, 2)
+    assert sparse['cells'] == [[0, 0, 'a'], [1, 1, 'b', 1]]
+    assert sparse['styles'] == [list(PLAIN_STYLE), list(BOLD_RED)]
+    assert to_dense(sparse) == dense
+    assert style_key(to_dense(sparse)[1][1]) == BOLD_RED
+
+
+def test_encoding_does_not_depend_on_cell_order():
+    forward, backward = SparseTableEncoder(), SparseTableEncoder()
+    cells = [(0, 0, 'x', BOLD_RED), (2, 1, 'y', (2, None, '#00ff00')), (1, 0, 'z', PLAIN_STYLE)]
+    for cell in cells:
+        forward.add(*cell)
+    for cell in reversed(cells):
+        backward.add(*cell)
+    assert forward.result() == backward.result()
+    assert table_shape(forward.result()) == (3, 2)
+
+
+def test_apply_cells_replaces_and_grows():
+    table = apply_cells(grid(), [[0, 0, make_cell('new')], [1, 1, make_cell('')], [4, 0, make_cell('far')]])
+    values = sparse_values(table)
+    assert values[(0, 0)] == 'new'
+    assert (1, 1) not in values
+    assert values[(4, 0)] == 'far'
+    assert table_shape(table) == (5, 3)
+
+
+def test_resize_table_inserts_and_removes_rows():
+    inserted = resize_table(grid(), 'add_row', 1, 2)
+    assert table_shape(inserted) == (5, 3)
+    assert sparse_values(inserted)[(3, 0)] == 'A2'
+    assert (1, 0) not in sparse_values(inserted)
+
+    removed = resize_table(grid(), 'remove_row', 0, 2)
+    assert table_shape(removed) == (1, 3)
+    assert sparse_values(removed) == {(0, 0): 'A3', (0, 1): 'B3', (0, 2): 'C3'}
+
+
+def test_resize_table_inserts_and_removes_columns():
+    inserted = resize_table(grid(), 'add_col', 0, 1)
+    assert table_shape(inserted) == (3, 4)
+    assert sparse_values(inserted)[(2, 3)] == 'C3'
+
+    removed = resize_table(grid(), 'remove_col', 1, 1)
+    assert table_shape(removed) == (3, 2)
+    assert sparse_values(removed)[(0, 1)] == 'C1'
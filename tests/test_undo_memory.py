@@ -0,0 +1,96 @@
+# tests\test_undo_memory.py
+import pytest
+from PySide6.QtGui import QUndoCommand, QUndoStack
+
+from services.undo_memory import SpillableAttribute, SpilledValue, SpillFile, UndoMemoryManager
+
+
+class PayloadCommand(QUndoCommand):
+    payload = SpillableAttribute()
+
+    def __init__(self, payload):
+        super().__init__('payload')
+        self.payload = payload
+        self.seen = None
+
+    def redo(self):
+        self.seen = self.payload
+
+    def undo(self):
+        self.seen = self.payload
+
+
+def payload(n):
+    return [f'{n}:{i}' for i in range(200)]
+
+
+@pytest.fixture
+def manager(qapp):
+    # A budget of one byte spills every command but the ones next to the index
+    manager = UndoMemoryManager(1)
+    manager.spill_file.compact_bytes = 1
+    return manager
+
+
+def spilled(command):
+    return isinstance(vars(command)['payload'], SpilledValue)
+
+
+def live_bytes(stats):
+    return stats['spill_file_bytes'] - stats['spill_file_dead_bytes']
+
+
+def test_compaction_moves_live_blocks():
+    spill_file = SpillFile(compact_bytes=10)
+    blocks = [spill_file.write(bytes([n]) * 8) for n in range(4)]
+    spill_file.release(blocks[:2])
+    assert spill_file.size == 16 and spill_file.dead_bytes == 0
+    assert [block.offset for block in blocks[2:]] == [0, 8]
+    assert spill_file.read(blocks[3]) == bytes([3]) * 8
+    spill_file.release(blocks[2:])
+    assert spill_file.size == 0
+    spill_file.close()
+
+
+def test_payloads_read_back_release_their_blocks(manager):
+    stack = QUndoStack()
+    manager.add_stack('a', stack)
+    for n in range(4):
+        stack.push(PayloadCommand(payload(n)))
+    assert spilled(stack.command(0)) and manager.spill_file.live_bytes
+    stack.setIndex(0)
+    assert [stack.command(i).seen for i in range(4)] == [payload(n) for n in range(4)]
+    stack.setIndex(4)
+    assert stack.command(0).payload == payload(0)
+
+
+def test_removed_stack_releases_its_blocks(manager):
+    kept, closed = QUndoStack(), QUndoStack()
+    manager.add_stack('kept', kept)
+    manager.add_stack('closed', closed)
+    for n in range(3):
+        kept.push(PayloadCommand(payload(n)))
+        closed.push(PayloadCommand(payload(n + 10)))
+    manager.remove_stack('closed')
+    stats = manager.stats()
+    assert live_bytes(stats) == stats['stacks']['kept']['spilled_bytes']
+    assert kept.command(0).payload == payload(0)
+
+
+def test_deleted_commands_release_their_blocks(manager):
+    stack = QUndoStack()
+    stack.setUndoLimit(3)
+    manager.add_stack('a', stack)
+    for n in range(6):
+        # Past the limit every push deletes the oldest command
+        stack.push(PayloadCommand(payload(n)))
+    stats = manager.stats()
+    assert live_bytes(stats) == stats['stacks']['a']['spilled_bytes']
+
+    # Pushing after undos deletes the redo commands
+    stack.setIndex(1)
+    stack.push(PayloadCommand(payload(9)))
+    stats = manager.stats()
+    assert stats['stacks']['a']['commands'] == 2
+    assert live_bytes(stats) == stats['stacks']['a']['spilled_bytes']
+    assert [stack.command(i).payload for i in range(2)] == [payload(3), payload(9)]